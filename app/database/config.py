@@ -19,6 +19,95 @@ class Settings(BaseSettings):
     node_env: str = Field("development", env="NODE_ENV")  # Ensure development mode
     NODE_ENV: str = "development"  # add default
 
+    # Listing total counts cache (seconds)
+    COUNT_CACHE_TTL_SEC: int = 30
+    COUNT_CACHE_APPROX_MAX_AGE_SEC: int = 600
+
+    # Query engine for /getAll: "multi" (count + page + departments + PDFs) or
+    # "json" (one statement with FOR JSON PATH subqueries)
+    BOOK_LIST_ENGINE: str = "multi"
+
+    # PDF uploads: threads that copy uploads to disk, and copy chunk size (bytes)
+    UPLOAD_WORKERS: int = 4
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+
+    # PDF storage layout: "flat" (one timestamped file per upload in PDF_UPLOAD_PATH) or
+    # "cas" (content-addressed, stored once under PDF_UPLOAD_PATH/ab/cd/<sha256>.pdf)
+    PDF_STORAGE_MODE: str = "flat"
+
+    # pdf_id -> file location cache used by GET /pdf/file/{pdf_id}
+    PDF_PATH_CACHE_SIZE: int = 10000
+    PDF_PATH_CACHE_TTL_SEC: int = 3600
+
+    # In-memory autocomplete index: reload in the background once older than this
+    # (picks up writes made by other workers; 0 = never)
+    AUTOCOMPLETE_MAX_AGE_SEC: int = 300
+
+    # In-memory full-text index behind /search: same background reload rule
+    SEARCH_INDEX_MAX_AGE_SEC: int = 900
+    # Reloads reuse the PDF text already indexed and read the rest this many texts at a time
+    PDF_TEXT_LOAD_BATCH: int = 500
+
+    # Text extraction from uploaded PDFs (worker processes, stored text cap in characters)
+    PDF_TEXT_WORKERS: int = 2
+    PDF_TEXT_MAX_CHARS: int = 1_000_000
+
+    # Rows fetched per round trip when reports are streamed (format=ndjson|csv)
+    REPORT_STREAM_BATCH_SIZE: int = 500
+
+    # Worker processes that build .xlsx report exports
+    XLSX_EXPORT_WORKERS: int = 2
+
+    # /dashboard/summary snapshot: dropped on every committed book change, and rebuilt
+    # at least this often (picks up writes made by other workers)
+    DASHBOARD_SUMMARY_TTL_SEC: int = 120
+
+    # Maintain book_counters on every book write. Production: create the table (the
+    # book_counters statement of SCHEMA_UPGRADES in app.database.database), run
+    # "python -m app.services.book_counters" once, then switch this on. If the table
+    # is missing anyway, maintenance turns itself off with a warning.
+    BOOK_COUNTERS_ENABLED: bool = False
+    # Scheduled reconciliation of book_counters (hours; 0 = only on demand). Every worker
+    # schedules it, but an application lock and the last run time let one process run it
+    BOOK_COUNTERS_RECONCILE_HOURS: int = 24
+
+    # In-memory /lateBooks snapshot: reloaded by the scheduler every LATE_BOOKS_REFRESH_SEC;
+    # older than LATE_BOOKS_SNAPSHOT_MAX_AGE_SEC (scheduler stopped) -> query the database.
+    # Each worker has its own snapshot and only sees its own writes in between, so a write
+    # handled by another worker shows up at that worker's next reload at the latest
+    LATE_BOOKS_REFRESH_SEC: int = 60
+    LATE_BOOKS_SNAPSHOT_MAX_AGE_SEC: int = 900
+
+    # bcrypt verify/hash threads; jobs waiting beyond PASSWORD_HASH_QUEUE_LIMIT get 503
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_QUEUE_LIMIT: int = 32
+
+    # Verified JWTs kept in memory (by token hash, until they expire)
+    JWT_CACHE_SIZE: int = 4096
+    # Reject /api/bookFollowUp requests without a valid jwt_cookies_auth_token cookie (401)
+    AUTH_ENFORCE: bool = False
+
+    # /auth/login attempts allowed per sliding window, per username and per client IP
+    # (0 = no limit); LOGIN_THROTTLE_MAX_KEYS bounds the in-memory windows (LRU)
+    LOGIN_THROTTLE_WINDOW_SEC: int = 300
+    LOGIN_THROTTLE_USER_LIMIT: int = 10
+    LOGIN_THROTTLE_IP_LIMIT: int = 50
+    LOGIN_THROTTLE_MAX_KEYS: int = 10000
+    # Reverse proxies in front of the API (comma-separated addresses or CIDR ranges).
+    # X-Forwarded-For is only believed when the connection comes from one of them;
+    # empty = the connecting address is the client (don't combine with uvicorn
+    # --proxy-headers, which already rewrites it)
+    TRUSTED_PROXIES: str = ""
+
+    # Per-request timing and SQL statistics (histograms at /api/monitoring/timing);
+    # SERVER_TIMING_HEADER also sends them to the client as a Server-Timing header
+    REQUEST_TIMING_ENABLED: bool = True
+    SERVER_TIMING_HEADER: bool = True
+
+    # Event loop lag probe for /metrics (seconds between probes; 0 = off). Multi-worker
+    # metrics need the PROMETHEUS_MULTIPROC_DIR environment variable (see app.helper.metrics)
+    EVENT_LOOP_LAG_INTERVAL_SEC: float = 0.5
+
  
 
     class Config:
@@ -1,3 +1,4 @@
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.exc import OperationalError
@@ -28,6 +29,38 @@ AsyncSessionLocal = sessionmaker(
 # Base class for ORM models
 Base = declarative_base()
 
+
+# create_all() only creates missing tables, so columns/indexes added to existing
+# models are applied here (DEVELOPMENT mode; run the same statements by hand in production).
+SCHEMA_UPGRADES = [
+    "IF COL_LENGTH('PDFTable', 'sha256') IS NULL ALTER TABLE PDFTable ADD sha256 VARCHAR(64) NULL",
+    "IF COL_LENGTH('PDFTable', 'fileName') IS NULL ALTER TABLE PDFTable ADD fileName NVARCHAR(255) NULL",
+    "IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'ix_PDFTable_sha256') "
+    "CREATE INDEX ix_PDFTable_sha256 ON PDFTable (sha256)",
+    "IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'ix_bookFollowUpTable_currentDate_id') "
+    "CREATE INDEX ix_bookFollowUpTable_currentDate_id ON bookFollowUpTable (currentDate, id)",
+    "IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'ix_bookFollowUpTable_userID_ageDates') "
+    "CREATE INDEX ix_bookFollowUpTable_userID_ageDates ON bookFollowUpTable (userID, incomingDate, bookDate)",
+    # app.services.pdf_text (then run: python -m app.services.pdf_text to extract the archive)
+    "IF OBJECT_ID(N'PDFTextTable', N'U') IS NULL "
+    "CREATE TABLE PDFTextTable (pdfID INT NOT NULL PRIMARY KEY, bookID INT NULL, sha256 VARCHAR(64) NULL, "
+    "status VARCHAR(20) NOT NULL, pageCount INT NULL, text NVARCHAR(MAX) NULL, error NVARCHAR(500) NULL, "
+    "extractedAt DATETIME NULL)",
+    "IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'ix_PDFTextTable_bookID') "
+    "CREATE INDEX ix_PDFTextTable_bookID ON PDFTextTable (bookID)",
+    "IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'ix_PDFTextTable_sha256') "
+    "CREATE INDEX ix_PDFTextTable_sha256 ON PDFTextTable (sha256)",
+    # app.services.book_counters (then run: python -m app.services.book_counters)
+    "IF OBJECT_ID(N'book_counters', N'U') IS NULL "
+    "CREATE TABLE book_counters (dim NVARCHAR(20) NOT NULL, dimKey NVARCHAR(100) NOT NULL, "
+    "cnt BIGINT NOT NULL, CONSTRAINT PK_book_counters PRIMARY KEY (dim, dimKey))",
+]
+
+
+async def upgrade_schema(conn) -> None:
+    for statement in SCHEMA_UPGRADES:
+        await conn.execute(text(statement))
+
 # The async with statement automatically closes the session after the response is sent, even if an exception occurs inside the route. 
 # FastAPI handles the generator behind the scenes using contextlib.aclosing().
 async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
@@ -0,0 +1,31 @@
+import re
+
+
+# Spelling variants that users type interchangeably in Arabic free text.
+# Normalized forms are only used for matching; stored and returned values keep
+# their original spelling.
+
+_ALEF_VARIANTS = "أإآٱ"        # hamza above/below, madda, wasla -> bare alef
+_TATWEEL = "ـ"
+# Harakat and the other combining marks of the Arabic block (fathatan .. wavy hamza
+# below), superscript alef and Quranic annotation marks
+_DIACRITICS = re.compile("[\u064B-\u065F\u0670\u06D6-\u06ED]")
+
+_CHAR_MAP = str.maketrans(
+    {
+        **{char: "ا" for char in _ALEF_VARIANTS},
+        "ة": "ه",   # taa marbuta
+        "ى": "ي",   # alef maqsura
+        _TATWEEL: None,
+    }
+)
+
+
+def normalize_arabic(text: str) -> str:
+    """
+    Matching key for Arabic text: unify alef variants, ة -> ه, ى -> ي and drop
+    tatweel and diacritics. Non-Arabic characters are left unchanged.
+    """
+    if not text:
+        return text
+    return _DIACRITICS.sub("", text).translate(_CHAR_MAP)
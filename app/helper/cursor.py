@@ -0,0 +1,36 @@
+import base64
+import json
+from datetime import date, datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+
+
+# Opaque keyset cursor used by the listing endpoints.
+# It carries the (currentDate, id) of the last row that was served plus how many
+# rows were served so far (only used to keep serialNo running across pages).
+
+def encode_cursor(current_date: Optional[date], book_id: int, served: int) -> str:
+    payload = {
+        "d": current_date.strftime('%Y-%m-%d') if current_date else None,
+        "id": int(book_id),
+        "n": int(served),
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[date], int, int]:
+    """
+    Decode a cursor produced by encode_cursor.
+    Raises HTTPException(400) if the cursor was tampered with or is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        current_date = (
+            datetime.strptime(payload["d"], '%Y-%m-%d').date() if payload.get("d") else None
+        )
+        return current_date, int(payload["id"]), int(payload.get("n", 0))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
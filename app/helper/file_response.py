@@ -0,0 +1,113 @@
+import os
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Callable, Optional
+
+import anyio
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+
+from app.helper import metrics
+
+
+# Browsers may keep the file but must revalidate (cheap 304) before reusing it,
+# since a record can be deleted or replaced.
+PDF_CACHE_CONTROL = "private, no-cache"
+
+
+class _PdfFileResponse(FileResponse):
+    """FileResponse that reports a file that vanished after the stat (stale cached location)."""
+
+    def __init__(self, *args, on_missing: Optional[Callable[[], None]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_missing = on_missing
+
+    async def __call__(self, scope, receive, send) -> None:
+        started = time.perf_counter()
+
+        async def counting_send(message):
+            if message["type"] == "http.response.body":
+                metrics.pdf_served_bytes.inc(len(message.get("body", b"")))
+            await send(message)
+
+        try:
+            await super().__call__(scope, receive, counting_send)
+        except FileNotFoundError:
+            if self.on_missing is not None:
+                self.on_missing()
+            raise
+        finally:
+            metrics.pdf_served_seconds.inc(time.perf_counter() - started)
+
+
+def pdf_etag(sha256: Optional[str], stat_result: os.stat_result) -> str:
+    """Strong ETag: the content hash when known, else size + mtime (ns)."""
+    if sha256:
+        return f'"{sha256}"'
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+def is_not_modified(request: Request, etag: str, mtime: float) -> bool:
+    """
+    Conditional GET check (RFC 9110 13.1), GET/HEAD only: If-None-Match wins over
+    If-Modified-Since. If-None-Match uses weak comparison, so W/"x" matches "x".
+    Range requests are only answered with 304 on a matching If-None-Match; with
+    If-Modified-Since alone they go on to FileResponse (206 or, via If-Range, 200).
+    """
+    if request.method not in ("GET", "HEAD"):
+        return False
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+    if "range" in request.headers or "if-range" in request.headers:
+        return False
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(mtime) <= int(since)
+    return False
+
+
+async def pdf_file_response(
+    request: Request,
+    path: str,
+    sha256: Optional[str] = None,
+    file_name: Optional[str] = None,
+    stat_result: Optional[os.stat_result] = None,
+    on_missing: Optional[Callable[[], None]] = None,
+) -> Response:
+    """
+    Serve a stored PDF with a strong ETag and Last-Modified. Returns 304 when the
+    client's copy is current; otherwise a FileResponse, which answers Range /
+    If-Range requests with 206 (or 416) so PDF.js can load pages incrementally.
+    on_missing is called if the file cannot be opened while streaming.
+    """
+    if stat_result is None:
+        stat_result = await anyio.to_thread.run_sync(os.stat, path)  # may be a network share
+
+    etag = pdf_etag(sha256, stat_result)
+    headers = {
+        "etag": etag,
+        "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "cache-control": PDF_CACHE_CONTROL,
+    }
+
+    if is_not_modified(request, etag, stat_result.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    return _PdfFileResponse(
+        path,
+        media_type="application/pdf",
+        headers=headers,
+        stat_result=stat_result,
+        filename=file_name,
+        content_disposition_type="inline",
+        on_missing=on_missing,
+    )
@@ -0,0 +1,214 @@
+import asyncio
+import os
+import time
+from typing import Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+try:  # optional: without it every metric below is a no-op and /metrics answers 503
+    from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+    from prometheus_client import multiprocess
+except ImportError:  # pragma: no cover - depends on the installation
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+    Counter = Gauge = Histogram = None
+
+
+# Prometheus metrics of this API. Under several uvicorn workers, start the server with
+# PROMETHEUS_MULTIPROC_DIR pointing to an empty directory (it must be set before
+# prometheus_client is imported): each worker then writes its values there and
+# /metrics, answered by any worker, aggregates all of them. Gauges say how they are
+# combined across workers (multiprocess_mode).
+
+PREFIX = "bookfollowup_"
+MULTIPROC_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+
+class _NoopMetric:
+    def labels(self, *args, **kwargs) -> "_NoopMetric":
+        return self
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+    def dec(self, amount: float = 1) -> None:
+        pass
+
+    def set(self, value: float) -> None:
+        pass
+
+    def observe(self, value: float) -> None:
+        pass
+
+
+def metrics_available() -> bool:
+    return Counter is not None
+
+
+def _counter(name: str, documentation: str, labels: Tuple[str, ...] = ()):
+    return Counter(PREFIX + name, documentation, labels) if Counter else _NoopMetric()
+
+
+def _gauge(name: str, documentation: str, mode: str, labels: Tuple[str, ...] = ()):
+    return Gauge(PREFIX + name, documentation, labels, multiprocess_mode=mode) if Gauge else _NoopMetric()
+
+
+def _histogram(name: str, documentation: str, buckets: Tuple[float, ...], labels: Tuple[str, ...] = ()):
+    return Histogram(PREFIX + name, documentation, labels, buckets=buckets) if Histogram else _NoopMetric()
+
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# ---------- HTTP (fed by RequestTimingMiddleware) ----------
+
+http_requests = _counter("http_requests_total", "HTTP requests", ("method", "route", "status"))
+http_request_duration = _histogram(
+    "http_request_duration_seconds", "Wall time per request", SECONDS_BUCKETS, ("method", "route")
+)
+http_request_db_seconds = _histogram(
+    "http_request_db_seconds", "SQL time per request", SECONDS_BUCKETS, ("method", "route")
+)
+http_request_statements = _histogram(
+    "http_request_sql_statements", "SQL statements per request", STATEMENT_BUCKETS, ("method", "route")
+)
+http_in_flight = _gauge("http_requests_in_flight", "Requests being handled", "livesum", ("method",))
+
+# ---------- connection pool ----------
+
+db_pool_size = _gauge("db_pool_size", "Pool size (pool_size, summed over workers)", "livesum")
+db_pool_checked_out = _gauge("db_pool_checked_out", "Connections in use", "livesum")
+db_pool_checked_in = _gauge("db_pool_checked_in", "Idle connections in the pool", "livesum")
+db_pool_overflow = _gauge("db_pool_overflow", "Connections open beyond pool_size (max_overflow)", "livesum")
+db_pool_connect_wait = _histogram(
+    "db_pool_connect_wait_seconds", "Time to get a connection from the pool (includes opening one)", SECONDS_BUCKETS
+)
+db_pool_timeouts = _counter("db_pool_timeouts_total", "Pool checkouts that gave up after pool_timeout")
+
+# ---------- PDF uploads / file serving (rate(bytes) / rate(seconds) = throughput) ----------
+
+pdf_upload_bytes = _counter("pdf_upload_bytes_total", "Bytes of uploaded PDFs written to disk")
+pdf_upload_seconds = _counter("pdf_upload_seconds_total", "Time spent writing uploaded PDFs")
+pdf_served_bytes = _counter("pdf_served_bytes_total", "Bytes of PDF files sent to clients")
+pdf_served_seconds = _counter("pdf_served_seconds_total", "Time spent sending PDF files")
+
+# ---------- caches (hit ratio = hits / (hits + misses)) ----------
+
+cache_lookups = _counter("cache_lookups_total", "Cache lookups", ("cache", "result"))
+
+# ---------- event loop / workers ----------
+
+event_loop_lag = _histogram(
+    "event_loop_lag_seconds", "How late the event loop woke up a sleeping task", SECONDS_BUCKETS
+)
+event_loop_lag_last = _gauge("event_loop_lag_last_seconds", "Last measured event loop lag (worst worker)", "livemax")
+password_hash_wait = _histogram(
+    "password_hash_wait_seconds", "Time bcrypt jobs waited for a worker thread", SECONDS_BUCKETS
+)
+password_hash_rejected = _counter("password_hash_rejected_total", "Logins/registrations refused by a full bcrypt pool")
+login_throttled = _counter("login_throttled_total", "Login attempts refused by the throttle")
+
+
+def cache_hit(cache: str, hit: bool) -> None:
+    cache_lookups.labels(cache, "hit" if hit else "miss").inc()
+
+
+def observe_request(method: str, route: str, status: int, elapsed: float, db_seconds: float, statements: int) -> None:
+    http_requests.labels(method, route, str(status)).inc()
+    http_request_duration.labels(method, route).observe(elapsed)
+    http_request_db_seconds.labels(method, route).observe(db_seconds)
+    http_request_statements.labels(method, route).observe(statements)
+
+
+# ---------- pool instrumentation ----------
+
+_pools = []  # instrumented pools, sampled again by the event loop lag monitor
+
+
+def _update_pool_gauges(pool, returning: int = 0) -> None:
+    db_pool_size.set(pool.size())
+    db_pool_checked_out.set(pool.checkedout() - returning)
+    db_pool_checked_in.set(pool.checkedin() + returning)
+    db_pool_overflow.set(max(pool.overflow(), 0))  # counts up from -pool_size
+
+
+def sample_pools() -> None:
+    for pool in _pools:
+        _update_pool_gauges(pool)
+
+
+def instrument_pool(engine: Engine) -> None:
+    """Pool gauges on every checkout/checkin, and the time pool.connect() blocks (sync engine)."""
+    pool = engine.pool
+    if pool in _pools:
+        return
+
+    def on_checkout(*args):
+        _update_pool_gauges(pool)
+
+    def on_checkin(*args):
+        _update_pool_gauges(pool, returning=1)  # fired before the connection is back in the pool
+
+    event.listen(pool, "checkout", on_checkout)
+    event.listen(pool, "checkin", on_checkin)
+
+    connect = pool.connect
+
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        except PoolTimeoutError:
+            db_pool_timeouts.inc()
+            raise
+        finally:
+            db_pool_connect_wait.observe(time.perf_counter() - started)
+
+    pool.connect = timed_connect  # Engine checks out through pool.connect()
+    _pools.append(pool)
+    _update_pool_gauges(pool)
+
+
+# ---------- event loop lag ----------
+
+async def monitor_event_loop_lag(interval: float) -> None:
+    """
+    Sleep interval seconds over and over; oversleeping = time the loop was blocked.
+    Also re-samples the pool gauges (overflow connections closed on checkin).
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(loop.time() - started - interval, 0.0)
+        event_loop_lag.observe(lag)
+        event_loop_lag_last.set(lag)
+        sample_pools()
+
+
+def start_loop_lag_monitor(interval: Optional[float]) -> Optional[asyncio.Task]:
+    if not interval:
+        return None
+    return asyncio.create_task(monitor_event_loop_lag(interval))
+
+
+# ---------- exposition ----------
+
+def multiprocess_mode() -> bool:
+    return bool(os.environ.get(MULTIPROC_DIR_ENV))
+
+
+def render_metrics() -> bytes:
+    """Prometheus text format; in multiprocess mode the values of every worker."""
+    if multiprocess_mode():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
+
+
+def mark_worker_dead() -> None:
+    """On shutdown: drop this worker's live gauges from the multiprocess directory."""
+    if metrics_available() and multiprocess_mode():
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from passlib.context import CryptContext
+
+from app.database.config import settings
+from app.helper import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# Password hashing context
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+class PasswordPoolBusy(Exception):
+    """More hashing jobs are running or queued than PASSWORD_HASH_QUEUE_LIMIT allows."""
+
+
+class PasswordHashPool:
+    """
+    bcrypt verify/hash on a small thread pool instead of the event loop thread
+    (bcrypt releases the GIL while it works, so threads run in parallel).
+    Jobs beyond PASSWORD_HASH_WORKERS wait in the executor queue; once
+    PASSWORD_HASH_QUEUE_LIMIT jobs are waiting, new ones are refused with
+    PasswordPoolBusy instead of piling up. Counters are only touched on the
+    event loop thread.
+    """
+
+    def __init__(self):
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.in_flight = 0          # running + queued
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0   # submit -> a worker picks the job up
+        self.wait_seconds_max = 0.0
+        self.run_seconds_total = 0.0
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+            )
+        return self._executor
+
+    @staticmethod
+    def _timed(submitted: float, fn: Callable, args: Tuple) -> Tuple[float, float, Any]:
+        started = time.perf_counter()
+        result = fn(*args)
+        return started - submitted, time.perf_counter() - started, result
+
+    def _release(self, waited: float, ran: float) -> None:
+        self.in_flight -= 1
+        self.completed += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        metrics.password_hash_wait.observe(waited)
+        self.run_seconds_total += ran
+
+    async def run(self, fn: Callable, *args: Any) -> Any:
+        if self.in_flight >= settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE_LIMIT:
+            self.rejected += 1
+            metrics.password_hash_rejected.inc()
+            logger.warning(f"Password hashing pool saturated ({self.in_flight} jobs); request refused")
+            raise PasswordPoolBusy()
+
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        future = self._pool().submit(self._timed, time.perf_counter(), fn, args)
+
+        def done(f):
+            # Runs on the worker thread; the job is over even if the caller was cancelled
+            waited, ran = (0.0, 0.0) if f.cancelled() or f.exception() else f.result()[:2]
+            # A job still running at shutdown (wait=False) can outlive the event loop
+            if loop.is_closed():
+                return
+            try:
+                loop.call_soon_threadsafe(self._release, waited, ran)
+            except RuntimeError:  # closed between the check and the call
+                pass
+
+        future.add_done_callback(done)
+        return (await asyncio.wrap_future(future))[2]
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self.run(pwd_context.verify, password, hashed)
+
+    async def hash(self, password: str) -> str:
+        return await self.run(pwd_context.hash, password)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": settings.PASSWORD_HASH_WORKERS,
+            "queueLimit": settings.PASSWORD_HASH_QUEUE_LIMIT,
+            "inFlight": self.in_flight,
+            "queued": max(self.in_flight - settings.PASSWORD_HASH_WORKERS, 0),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "waitSecondsTotal": round(self.wait_seconds_total, 6),
+            "waitSecondsMax": round(self.wait_seconds_max, 6),
+            "waitSecondsAvg": round(self.wait_seconds_total / self.completed, 6) if self.completed else 0.0,
+            "runSecondsTotal": round(self.run_seconds_total, 6),
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_pool = PasswordHashPool()
@@ -0,0 +1,76 @@
+import asyncio
+import logging
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple, Optional
+
+from app.database.config import settings
+
+try:  # optional: without pypdf uploads still work, their text just is not extracted
+    from pypdf import PdfReader
+except ImportError:  # pragma: no cover - depends on the installation
+    PdfReader = None
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractedText(NamedTuple):
+    status: str          # "done" | "empty" (no text layer, e.g. a plain scan) | "failed" | "unavailable"
+    text: str
+    page_count: int
+    error: Optional[str] = None
+
+
+_WHITESPACE = re.compile(r"[ \t\r\f\v]+")
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+
+
+def extraction_available() -> bool:
+    return PdfReader is not None
+
+
+def extract_pdf_text(path: str, max_chars: int) -> ExtractedText:
+    """
+    Text layer of a PDF (pure Python, pypdf). Runs in a worker process: parsing
+    is CPU-bound and a malformed file must not take the server down with it.
+    """
+    if PdfReader is None:
+        return ExtractedText("unavailable", "", 0, "pypdf is not installed")
+    try:
+        reader = PdfReader(path, strict=False)
+        parts = []
+        size = 0
+        for page in reader.pages:
+            page_text = page.extract_text() or ""
+            parts.append(page_text)
+            size += len(page_text)
+            if size >= max_chars:
+                break
+        text = _BLANK_LINES.sub("\n", _WHITESPACE.sub(" ", "\n".join(parts).replace("\x00", ""))).strip()
+        return ExtractedText("done" if text else "empty", text[:max_chars], len(reader.pages))
+    except Exception as e:
+        return ExtractedText("failed", "", 0, f"{type(e).__name__}: {str(e)}"[:500])
+
+
+# Separate processes (not threads): extraction holds the GIL for the whole document.
+# Created on first use so importing the app does not fork.
+_text_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _executor() -> ProcessPoolExecutor:
+    global _text_executor
+    if _text_executor is None:
+        _text_executor = ProcessPoolExecutor(max_workers=settings.PDF_TEXT_WORKERS)
+    return _text_executor
+
+
+async def extract_pdf_text_async(path: str) -> ExtractedText:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor(), extract_pdf_text, path, settings.PDF_TEXT_MAX_CHARS)
+
+
+def shutdown_text_executor() -> None:
+    global _text_executor
+    if _text_executor is not None:
+        _text_executor.shutdown(wait=False, cancel_futures=True)
+        _text_executor = None
@@ -0,0 +1,111 @@
+import ipaddress
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from functools import lru_cache
+from typing import Deque, Optional, Tuple, Union
+
+from starlette.requests import Request
+
+from app.database.config import settings
+
+
+class RateLimitStore(ABC):
+    """
+    Where sliding windows live. The in-memory store below is per process; a shared
+    store (e.g. Redis sorted sets) implements the same two methods so every worker
+    sees the same windows.
+    """
+
+    @abstractmethod
+    async def hit(self, key: str, limit: int, window_sec: float) -> Optional[float]:
+        """Record one attempt for key unless limit attempts already happened in the
+        last window_sec; then return the seconds until the next one is allowed."""
+
+    @abstractmethod
+    async def reset(self, key: str) -> None:
+        """Forget every attempt recorded for key."""
+
+
+class MemoryRateLimitStore(RateLimitStore):
+    """
+    Sliding-window log per key: the times of the last `limit` attempts. At most
+    max_keys keys are kept; the least recently used one is dropped first. Meant
+    to be used from the event loop thread only, so there is no locking.
+    """
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self._windows: "OrderedDict[str, Deque[float]]" = OrderedDict()
+
+    async def hit(self, key: str, limit: int, window_sec: float) -> Optional[float]:
+        now = time.monotonic()
+        attempts = self._windows.get(key)
+        if attempts is None or attempts.maxlen != limit:
+            attempts = deque(attempts or (), maxlen=limit)
+            self._windows[key] = attempts
+        self._windows.move_to_end(key)
+
+        while attempts and attempts[0] <= now - window_sec:
+            attempts.popleft()
+        if len(attempts) >= limit:
+            return max(attempts[0] + window_sec - now, 0.0)
+
+        attempts.append(now)
+        while len(self._windows) > self.max_keys:
+            self._windows.popitem(last=False)
+        return None
+
+    async def reset(self, key: str) -> None:
+        self._windows.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(math.ceil(seconds), 1))
+
+
+# ---------- client address ----------
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+@lru_cache(maxsize=8)
+def _trusted_networks(trusted_proxies: str) -> Tuple[Network, ...]:
+    return tuple(
+        ipaddress.ip_network(item.strip(), strict=False) for item in trusted_proxies.split(",") if item.strip()
+    )
+
+
+def _is_trusted(address: str, networks: Tuple[Network, ...]) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in networks)
+
+
+def client_ip(request: Request) -> Optional[str]:
+    """
+    Address of the client a rate limit applies to. Behind proxies listed in
+    TRUSTED_PROXIES, X-Forwarded-For is read from the right (entries appended by
+    our own proxies) to the first address that is not one of them; anything left
+    of it was supplied by the client and is ignored.
+    """
+    peer = request.client.host if request.client else None
+    networks = _trusted_networks(settings.TRUSTED_PROXIES)
+    if peer is None or not networks or not _is_trusted(peer, networks):
+        return peer
+    forwarded = [
+        item.strip()
+        for header in request.headers.getlist("x-forwarded-for")
+        for item in header.split(",")
+        if item.strip()
+    ]
+    for address in reversed(forwarded):
+        if not _is_trusted(address, networks):
+            return address
+    return forwarded[0] if forwarded else peer
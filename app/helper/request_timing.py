@@ -0,0 +1,200 @@
+import bisect
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.helper import metrics
+
+
+# Per-request wall time and SQL statistics. RequestTimingMiddleware opens a
+# RequestStats for every HTTP request in a ContextVar; cursor events on the
+# engine add each statement to it (statements run outside a request, such as
+# scheduler jobs, are not counted). Totals go out as a Server-Timing header and
+# into per-route histograms (timing_registry).
+
+class RequestStats:
+    __slots__ = ("started", "sql_count", "sql_seconds", "rows")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.rows = 0
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+
+current_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("current_request_stats", default=None)
+
+
+# ---------- SQL ----------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("request_timing_starts", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("request_timing_starts")
+    if not starts:
+        return
+    started = starts.pop()
+    stats = current_request_stats.get()
+    if stats is None:
+        return
+    stats.sql_count += 1
+    stats.sql_seconds += time.perf_counter() - started
+    # The async adapters (aioodbc, aiosqlite) buffer the whole result during execute,
+    # so the rows are countable here; otherwise fall back to rowcount (DML).
+    rows = getattr(cursor, "_rows", None)
+    if rows is not None:
+        stats.rows += len(rows)
+    elif getattr(cursor, "rowcount", -1) > 0:
+        stats.rows += cursor.rowcount
+
+
+def install_sql_timing(engine: Engine) -> None:
+    """Listen to cursor executions of a (sync) engine; for AsyncEngine pass engine.sync_engine."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# ---------- histograms ----------
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+
+class Histogram:
+    """Per-bucket counts (value <= bound, not cumulative), plus count and sum."""
+
+    __slots__ = ("bounds", "counts", "count", "sum")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # last one: above every bound
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def to_dict(self) -> Dict[str, Any]:
+        buckets = {str(bound): n for bound, n in zip(self.bounds, self.counts)}
+        buckets["+Inf"] = self.counts[-1]
+        return {"count": self.count, "sum": round(self.sum, 6), "buckets": buckets}
+
+
+class RouteTiming:
+    __slots__ = ("duration", "db_seconds", "statements", "rows", "statuses")
+
+    def __init__(self):
+        self.duration = Histogram(SECONDS_BUCKETS)
+        self.db_seconds = Histogram(SECONDS_BUCKETS)
+        self.statements = Histogram(STATEMENT_BUCKETS)
+        self.rows = Histogram(ROW_BUCKETS)
+        self.statuses: Dict[int, int] = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        count = self.duration.count
+        return {
+            "requests": count,
+            "avgSeconds": round(self.duration.sum / count, 6) if count else 0.0,
+            "avgStatements": round(self.statements.sum / count, 2) if count else 0.0,
+            "avgDbSeconds": round(self.db_seconds.sum / count, 6) if count else 0.0,
+            "statuses": {str(status): n for status, n in sorted(self.statuses.items())},
+            "duration": self.duration.to_dict(),
+            "dbSeconds": self.db_seconds.to_dict(),
+            "statements": self.statements.to_dict(),
+            "rows": self.rows.to_dict(),
+        }
+
+
+class TimingRegistry:
+    """Histograms per (method, route template) of this worker process."""
+
+    def __init__(self):
+        self.routes: Dict[Tuple[str, str], RouteTiming] = {}
+
+    def record(self, method: str, route: str, status: int, stats: RequestStats, elapsed: float) -> None:
+        timing = self.routes.get((method, route))
+        if timing is None:
+            timing = self.routes[(method, route)] = RouteTiming()
+        timing.duration.observe(elapsed)
+        timing.db_seconds.observe(stats.sql_seconds)
+        timing.statements.observe(stats.sql_count)
+        timing.rows.observe(stats.rows)
+        timing.statuses[status] = timing.statuses.get(status, 0) + 1
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        items = [
+            {"method": method, "route": route, **timing.to_dict()}
+            for (method, route), timing in self.routes.items()
+        ]
+        items.sort(key=lambda item: -item["duration"]["sum"])  # where the time goes first
+        return items
+
+    def clear(self) -> None:
+        self.routes.clear()
+
+
+timing_registry = TimingRegistry()
+
+UNMATCHED_ROUTE = "<unmatched>"  # 404s and CORS preflights: one label, whatever the path
+
+
+def server_timing_header(stats: RequestStats, elapsed: float) -> str:
+    return (
+        f'app;dur={elapsed * 1000:.1f}, '
+        f'db;dur={stats.sql_seconds * 1000:.1f};desc="{stats.sql_count} statements", '
+        f'rows;desc="{stats.rows}"'
+    )
+
+
+# ---------- middleware ----------
+
+class RequestTimingMiddleware:
+    """Pure ASGI middleware (no extra task per request, streaming responses untouched)."""
+
+    def __init__(self, app, server_timing: bool = True):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        status = 500
+        method = scope["method"]
+        metrics.http_in_flight.labels(method).inc()
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", server_timing_header(stats, stats.elapsed()).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_request_stats.reset(token)
+            metrics.http_in_flight.labels(method).dec()
+            route = scope.get("route")
+            route_path = getattr(route, "path_format", None) or getattr(route, "path", None) or UNMATCHED_ROUTE
+            elapsed = stats.elapsed()
+            timing_registry.record(method, route_path, status, stats, elapsed)
+            metrics.observe_request(method, route_path, status, elapsed, stats.sql_seconds, stats.sql_count)
@@ -1,10 +1,42 @@
 import os  # For path operations like join, exists
 import shutil  # For copying file-like objects efficiently
-from datetime import datetime  # For getting current timestamp
-from typing import BinaryIO  # Type hint for file-like object
+import hashlib  # SHA-256 of the uploaded content
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime  # For getting current timestamp
+from typing import BinaryIO, NamedTuple, Union  # Type hint for file-like object
 from pathlib import Path
 import threading
 import asyncio
+import time
+
+from app.database.config import settings
+from app.helper import metrics
+
+
+class SavedPdf(NamedTuple):
+    path: str            # final path (stored in PDFTable.pdf)
+    sha256: str          # hex digest of the content
+    size: int            # bytes written
+    file_name: str       # logical name: bookNo.year.count-timestamp.pdf (PDFTable.fileName)
+    deduplicated: bool   # True if identical content was already stored (cas mode)
+
+
+# Dedicated, bounded pool for upload copies so large scans never run on the event
+# loop and cannot starve the default executor used by other blocking calls.
+_upload_executor = ThreadPoolExecutor(
+    max_workers=settings.UPLOAD_WORKERS, thread_name_prefix="pdf-upload"
+)
+
+
+def build_pdf_filename(book_no: str, book_date: Union[str, date], count: int) -> str:
+    """bookNo.year.count+1-timestamp.pdf (book_date is 'YYYY-MM-DD' or a date)."""
+    if isinstance(book_date, date):
+        year = book_date.year
+    else:
+        year = datetime.strptime(book_date, "%Y-%m-%d").year
+    timestamp = datetime.now().strftime("%Y-%m-%d_%I-%M-%S-%p")  # Example: 2025-05-27_11-30-15-AM
+    return f"{book_no}.{year}.{count + 1}-{timestamp}.pdf"
 
 def save_pdf_to_server(source_file: BinaryIO, book_no: str, book_date: str, count: int, dest_dir: str) -> str:
     #  Get current datetime to include in filename
@@ -37,6 +69,114 @@ def save_pdf_to_server(source_file: BinaryIO, book_no: str, book_date: str, coun
 
 
 
+def cas_path(dest_dir, sha256: str) -> Path:
+    """Content-addressed location: dest_dir/ab/cd/<sha256>.pdf"""
+    return Path(dest_dir) / sha256[:2] / sha256[2:4] / f"{sha256}.pdf"
+
+
+def _write_part(source_file: BinaryIO, buffer: BinaryIO, chunk_size: int):
+    """Copy source_file to buffer in chunks, hashing in the same pass. Returns (sha256, size)."""
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = source_file.read(chunk_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+        buffer.write(chunk)
+        size += len(chunk)
+    buffer.flush()
+    os.fsync(buffer.fileno())
+    return digest.hexdigest(), size
+
+
+def _link_into_place(tmp_path: Path, dest_path: Path) -> bool:
+    """
+    Give the finished .part file its final name unless that name is taken (then
+    False): a hard link fails on an existing target, where a rename would overwrite it.
+    """
+    try:
+        os.link(tmp_path, dest_path)
+    except FileExistsError:
+        return False
+    except OSError:
+        if os.name != "nt":
+            raise
+        # No hard links on this volume; on Windows a rename refuses existing targets too
+        try:
+            os.rename(tmp_path, dest_path)
+        except FileExistsError:
+            return False
+        return True
+    tmp_path.unlink()
+    return True
+
+
+def _stream_to_disk(source_file: BinaryIO, dest_dir: Path, file_name: str, mode: str, chunk_size: int) -> SavedPdf:
+    """
+    The data goes to a uniquely named .part file first and gets its final name only
+    once it is complete, so readers never see a half-written PDF and concurrent
+    uploads never share a temporary file. In "cas" mode the final name is the content
+    hash; if that file already exists the copy is simply dropped.
+    """
+    tmp_path = dest_dir / f".upload-{uuid.uuid4().hex}.part"
+    with open(tmp_path, "xb") as buffer:  # created here: from now on it is ours to remove
+        try:
+            sha256, size = _write_part(source_file, buffer, chunk_size)
+        except BaseException:
+            buffer.close()
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    try:
+        if mode == "cas":
+            dest_path = cas_path(dest_dir, sha256)
+            dest_path.parent.mkdir(parents=True, exist_ok=True)
+            if not _link_into_place(tmp_path, dest_path):
+                tmp_path.unlink()
+                return SavedPdf(str(dest_path), sha256, size, file_name, True)
+        else:
+            dest_path = dest_dir / file_name
+            if not _link_into_place(tmp_path, dest_path):
+                raise FileExistsError("PDF already exists.")
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    return SavedPdf(str(dest_path), sha256, size, file_name, False)
+
+
+async def save_upload_to_server(
+    source_file: BinaryIO, book_no: str, book_date: Union[str, date], count: int, dest_dir
+) -> SavedPdf:
+    """
+    Async counterpart of save_pdf_to_server for route handlers: same filename scheme,
+    but the copy runs on the upload thread pool and the result carries the SHA-256.
+    With PDF_STORAGE_MODE=cas the file is stored once per content hash.
+    """
+    dest_dir = Path(dest_dir)
+    file_name = build_pdf_filename(book_no, book_date, count)
+    mode = settings.PDF_STORAGE_MODE.lower()
+
+    if mode != "cas" and (dest_dir / file_name).exists():
+        raise FileExistsError("PDF already exists.")
+
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    saved = await loop.run_in_executor(
+        _upload_executor, _stream_to_disk, source_file, dest_dir, file_name, mode, settings.UPLOAD_CHUNK_SIZE
+    )
+    metrics.pdf_upload_seconds.inc(time.perf_counter() - started)
+    metrics.pdf_upload_bytes.inc(saved.size)
+    if saved.deduplicated:
+        print(f"Identical PDF already stored at {saved.path}; only the record is added")
+    else:
+        print(f"Saved {saved.size} bytes to {saved.path} (sha256={saved.sha256})")
+    return saved
+
+
+
+
 async def async_delayed_delete(file_path: str, delay_sec: int = 3):
     await asyncio.sleep(delay_sec)
     try:
@@ -0,0 +1,54 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from app.helper.metrics import cache_hit
+
+
+class TTLCache:
+    """
+    Small process-local cache with per-entry expiry and LRU eviction.
+
+    Entries are not dropped when they expire: get() simply stops returning them
+    unless the caller asks for an older max_age (used for "approximate" reads).
+    The size bound keeps memory in check. Meant to be used from the event loop
+    thread only, so there is no locking.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_sec: Optional[float] = 60, name: str = "cache"):
+        self.name = name
+        self.max_size = max_size
+        self.ttl_sec = ttl_sec
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (value, stored_at)
+
+    def get(self, key: Hashable, default: Any = None, max_age: Optional[float] = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            cache_hit(self.name, False)
+            return default
+
+        value, stored_at = entry
+        limit = max_age if max_age is not None else self.ttl_sec
+        if limit is not None and time.monotonic() - stored_at > limit:
+            cache_hit(self.name, False)
+            return default
+
+        self._data.move_to_end(key)
+        cache_hit(self.name, True)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (value, time.monotonic())
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, None)
+        return entry[0] if entry is not None else default
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
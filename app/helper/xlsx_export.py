@@ -0,0 +1,111 @@
+import asyncio
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from app.database.config import settings
+
+try:  # optional: the xlsx endpoints answer 503 without it
+    import xlsxwriter
+except ImportError:  # pragma: no cover - depends on the installation
+    xlsxwriter = None
+
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# (record key, Arabic column header) in sheet order (the sheet is right-to-left)
+XlsxColumns = Sequence[Tuple[str, str]]
+
+# Widths for the free-text columns; everything else gets DEFAULT_WIDTH
+_WIDTHS = {"subject": 60, "notes": 40, "bookAction": 30, "directoryName": 30, "destination": 30,
+           "department_names": 40, "departmentName": 25, "Com": 25}
+DEFAULT_WIDTH = 14
+
+
+def xlsx_available() -> bool:
+    return xlsxwriter is not None
+
+
+def write_xlsx(spool_path: str, xlsx_path: str, columns: XlsxColumns, sheet_name: str) -> int:
+    """
+    Build the workbook from an NDJSON spool file (runs in a worker process).
+    constant_memory flushes each row to disk as it is written, so memory does not
+    depend on the number of rows. Returns the number of data rows.
+    """
+    workbook = xlsxwriter.Workbook(xlsx_path, {"constant_memory": True, "strings_to_numbers": False})
+    try:
+        sheet = workbook.add_worksheet(sheet_name[:31])
+        sheet.right_to_left()
+        header = workbook.add_format({"bold": True, "bg_color": "#D9E1F2", "border": 1,
+                                      "align": "center", "valign": "vcenter", "reading_order": 2})
+        cell = workbook.add_format({"reading_order": 2, "valign": "top"})
+
+        for col, (key, _) in enumerate(columns):
+            sheet.set_column(col, col, _WIDTHS.get(key, DEFAULT_WIDTH), cell)
+        sheet.write_row(0, 0, [title for _, title in columns], header)
+        sheet.freeze_panes(1, 0)
+
+        rows = 0
+        with open(spool_path, encoding="utf-8") as spool:
+            for line in spool:
+                record = json.loads(line)
+                rows += 1
+                sheet.write_row(rows, 0, ["" if record.get(key) is None else record.get(key) for key, _ in columns])
+        if rows:
+            sheet.autofilter(0, 0, rows, len(columns) - 1)
+        return rows
+    finally:
+        workbook.close()
+
+
+# Worker processes: writing xlsx is CPU-bound (XML + zip) and would hold the GIL.
+_xlsx_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _executor() -> ProcessPoolExecutor:
+    global _xlsx_executor
+    if _xlsx_executor is None:
+        _xlsx_executor = ProcessPoolExecutor(max_workers=settings.XLSX_EXPORT_WORKERS)
+    return _xlsx_executor
+
+
+def shutdown_xlsx_executor() -> None:
+    global _xlsx_executor
+    if _xlsx_executor is not None:
+        _xlsx_executor.shutdown(wait=False, cancel_futures=True)
+        _xlsx_executor = None
+
+
+def remove_files(*paths: str) -> None:
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+async def build_xlsx(
+    batches: AsyncIterator[List[Dict[str, Any]]], columns: XlsxColumns, sheet_name: str
+) -> str:
+    """
+    Spool the streamed records to a temporary NDJSON file, then have a worker
+    process turn it into an .xlsx file. Returns the xlsx path; the caller deletes it.
+    """
+    spool_fd, spool_path = tempfile.mkstemp(prefix="report-", suffix=".ndjson")
+    xlsx_fd, xlsx_path = tempfile.mkstemp(prefix="report-", suffix=".xlsx")
+    os.close(xlsx_fd)
+    try:
+        with os.fdopen(spool_fd, "w", encoding="utf-8") as spool:
+            async for records in batches:
+                spool.write("".join(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in records))
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(_executor(), write_xlsx, spool_path, xlsx_path, columns, sheet_name)
+        return xlsx_path
+    except BaseException:
+        remove_files(xlsx_path)
+        raise
+    finally:
+        remove_files(spool_path)
@@ -8,7 +8,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 #  SQLAlchemy engine and base (used to create tables)
-from app.database.database import engine, Base
+from app.database.database import engine, Base, AsyncSessionLocal, upgrade_schema
 
 #  Custom app settings from .env or config file
 from app.database.config import settings
@@ -16,20 +16,68 @@ from app.database.config import settings
 #  Import your route modules
 from app.routes.bookFollowUp import bookFollowUpRouter
 from app.routes.authentication import router
+from app.routes.monitoring import metricsRouter, monitoringRouter
+
+#  In-memory committees/departments/junctions used by the book read paths
+from app.services.reference_cache import reference_cache
+from app.services.autocomplete import autocomplete_index
+from app.services.search_index import search_index
+from app.helper.pdf_text import shutdown_text_executor
+from app.helper.xlsx_export import shutdown_xlsx_executor
+from app.helper.password_hashing import password_pool
+from app.services.scheduler import create_scheduler
+from app.helper.request_timing import RequestTimingMiddleware, install_sql_timing
+from app.helper.metrics import instrument_pool, mark_worker_dead, start_loop_lag_monitor
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Prometheus: connection pool gauges and checkout wait times (before any query)
+    instrument_pool(engine.sync_engine)
+
     if settings.MODE.upper() == "DEVELOPMENT":  # Ensures dev mode is case-insensitive
         print("🌱 DEVELOPMENT mode: creating database tables...")
         # Fixed: Use async method for table creation
         async with engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+            await upgrade_schema(conn)
     else:
         print("🚀 PRODUCTION mode: skipping table creation.")
 
+    # Warm the reference cache; if this fails it is loaded on first use instead
+    try:
+        async with AsyncSessionLocal() as session:
+            await reference_cache.load(session)
+    except Exception as e:
+        print(f"Reference cache not loaded at startup: {str(e)}")
+
+    # Autocomplete index; until it loads the endpoints query the database
+    try:
+        async with AsyncSessionLocal() as session:
+            await autocomplete_index.load(session)
+    except Exception as e:
+        print(f"Autocomplete index not loaded at startup: {str(e)}")
+
+    # Full-text index is built in the background; /search queries the database until it is ready
+    search_index.refresh_in_background()
+
+    # Background jobs (late books snapshot, counters reconciliation)
+    scheduler = create_scheduler()
+    scheduler.start()
+
+    # Prometheus: event loop lag probe
+    lag_monitor = start_loop_lag_monitor(settings.EVENT_LOOP_LAG_INTERVAL_SEC)
+
     yield  #  Allows the application to continue startup
 
+    scheduler.shutdown(wait=False)
+    if lag_monitor is not None:
+        lag_monitor.cancel()
+    mark_worker_dead()
+    shutdown_text_executor()
+    shutdown_xlsx_executor()
+    password_pool.shutdown()
+
 
 def create_app() -> FastAPI:              #create_app() just defines a factory function returning a FastAPI app.
 
@@ -59,9 +107,16 @@ def create_app() -> FastAPI:              #create_app() just defines a factory f
         expose_headers=["*"]
     )
 
+    #  Wall time, SQL statements / DB time / rows per request (outermost, so CORS is included)
+    if settings.REQUEST_TIMING_ENABLED:
+        install_sql_timing(engine.sync_engine)
+        app.add_middleware(RequestTimingMiddleware, server_timing=settings.SERVER_TIMING_HEADER)
+
     #  Register routers
     app.include_router(bookFollowUpRouter)
     app.include_router(router)
+    app.include_router(monitoringRouter)
+    app.include_router(metricsRouter)
 
     return app
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, ForeignKey
+from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Unicode, UnicodeText
 #from sqlalchemy.orm import relationship
 from app.database.database import Base
 
@@ -16,6 +16,23 @@ class PDFTable(Base):
     pdf = Column(String, nullable=True)  # Stores PDF file path or URL
     userID = Column(Integer, nullable=True)
     currentDate = Column(Date, nullable=True)
+    sha256 = Column(String(64), nullable=True, index=True)  # Content hash (content-addressed storage)
+    fileName = Column(Unicode(255), nullable=True)  # Logical name: bookNo.year.count-timestamp.pdf
+
+
+
+class PDFTextTable(Base):
+    """Text layer extracted from a PDFTable file (one row per PDF once processed)."""
+    __tablename__ = "PDFTextTable"
+
+    pdfID = Column(Integer, primary_key=True, autoincrement=False)  # PDFTable.id
+    bookID = Column(Integer, nullable=True, index=True)
+    sha256 = Column(String(64), nullable=True, index=True)  # reuse text of identical files
+    status = Column(String(20), nullable=False)  # done | empty | failed | unavailable
+    pageCount = Column(Integer, nullable=True)
+    text = Column(UnicodeText, nullable=True)
+    error = Column(Unicode(500), nullable=True)
+    extractedAt = Column(DateTime, nullable=True)
 
 
 
@@ -29,6 +46,8 @@ class PDFCreate(BaseModel):
     pdf: Optional[str]
     userID: Optional[int]
     currentDate: Optional[date]
+    sha256: Optional[str] = None
+    fileName: Optional[str] = None
 
 class PDFResponse(BaseModel):
     id: int
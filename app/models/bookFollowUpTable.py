@@ -1,9 +1,9 @@
-from sqlalchemy import Column, Integer, String, Date, Unicode, BigInteger, ForeignKey
+from sqlalchemy import Column, Integer, String, Date, Unicode, BigInteger, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from app.database.database import Base
 from pydantic import BaseModel, Field, field_validator
 from datetime import date, datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 from app.models.PDFTable import PDFResponse
 
 
@@ -31,6 +31,26 @@ class BookFollowUpTable(Base):
     junction = relationship("CommitteeDepartmentsJunction", back_populates="books")
     bridge_records = relationship("BookJunctionBridge", back_populates="book")
 
+    # Supports keyset pagination on /getAll (ORDER BY currentDate DESC, id DESC)
+    __table_args__ = (
+        Index("ix_bookFollowUpTable_currentDate_id", "currentDate", "id"),
+        Index("ix_bookFollowUpTable_userID_ageDates", "userID", "incomingDate", "bookDate"),  # /lateBooks age buckets
+    )
+
+
+class BookCounterTable(Base):
+    """
+    Book counts per dimension value, kept in step with bookFollowUpTable by the
+    service layer (app.services.book_counters) inside the writing transaction.
+    dim: total | bookType | bookStatus | userID | committee | department |
+    pendingTotal | pendingDepartment (pending = currentDate IS NULL).
+    """
+    __tablename__ = "book_counters"
+
+    dim = Column(Unicode(20), primary_key=True)
+    dimKey = Column(Unicode(100), primary_key=True)  # "" for NULL; "coID:deID" for departments
+    cnt = Column(BigInteger, nullable=False)
+
 
 class CommitteeDepartmentsJunction(Base):
     __tablename__ = "committee_departments_junction"
@@ -216,6 +236,29 @@ class UserBookCount(BaseModel):
     username: str
     bookCount: int
 
+class CommitteeBookCount(BaseModel):
+    coID: int
+    Com: Optional[str] = None
+    bookCount: int
+
+class DepartmentBookCount(BaseModel):
+    coID: int
+    Com: Optional[str] = None
+    deID: int
+    departmentName: Optional[str] = None
+    bookCount: int
+
+class DashboardSummary(BaseModel):
+    totalBooks: int
+    bookTypes: BookTypeCounts
+    bookStatuses: BookStatusCounts
+    bookTypeBreakdown: Dict[str, int]    # every stored bookType value
+    bookStatusBreakdown: Dict[str, int]  # every stored bookStatus value
+    users: List[UserBookCount]
+    committees: List[CommitteeBookCount]    # books linked through book_junction_bridge
+    departments: List[DepartmentBookCount]  # a book with 2 departments counts for both
+    generatedAt: datetime
+
 class SubjectRequest(BaseModel):
     subject: str = Field(..., min_length=1, max_length=500, description="Subject to search for")
     
@@ -22,4 +22,12 @@ class UserResponse(BaseModel):
     permission: Optional[str]  # Included for future use, excluding password for security
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class Principal(BaseModel):
+    """Caller identified by a verified JWT (claims only, no database lookup)."""
+    id: int
+    username: Optional[str]
+    permission: Optional[str]
+    exp: int  # expiry, seconds since the epoch
@@ -2,8 +2,10 @@ import os
 from fastapi import APIRouter, Depends, HTTPException, Response,Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.database.database import get_async_db
-from app.models.users import UserCreate
-from app.services.authentication import AuthenticationService
+from app.models.users import Principal, UserCreate
+from app.services.authentication import AuthenticationService, get_current_principal
+from app.helper.rate_limit import client_ip
+from app.services.login_throttle import login_throttle
 from pydantic import BaseModel
 from typing import Optional
 from app.database.config import settings
@@ -30,6 +32,7 @@ class LoginRequest(BaseModel):
 async def login(
     request: LoginRequest,
     response: Response,
+    http_request: Request,
     db: AsyncSession = Depends(get_async_db)
 ):
     """
@@ -38,15 +41,19 @@ async def login(
     Args:
         request: LoginRequest with username and password
         response: FastAPI Response to set cookie
+        http_request: raw request (client IP for login throttling)
         db: AsyncSession dependency
              
     Returns:
         JSON response with message
     """
     try:
-        print(f"auth...{request.username, request.password}")
+        # Throttle before any database or bcrypt work (429)
+        await login_throttle.check(request.username, client_ip(http_request))
+
         # Verify user credentials
         user = await AuthenticationService.verify_user(db, request.username, request.password)
+        await login_throttle.succeeded(request.username)
 
         print(f"user .login,,,,,.. {user.permission}")           
         # # Generate JWT
@@ -159,6 +166,12 @@ async def register(
 
 
 
+@router.get("/me", response_model=Principal)
+async def me(principal: Principal = Depends(get_current_principal)):
+    """The logged-in user, from the JWT cookie alone (no database lookup)."""
+    return principal
+
+
 @router.post("/logout")
 async def logout(response: Response):
     """
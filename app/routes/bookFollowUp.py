@@ -8,18 +8,35 @@ import pydantic
 from sqlalchemy import select,extract,func, text
 from sqlalchemy.ext.asyncio import AsyncSession  #  Use AsyncSession instead of sync Session
 from app.database.database import get_async_db  #  Import async DB dependency
-from app.models.architecture.committees import Committee, CommitteeResponse
-from app.models.architecture.department import Department, DepartmentNameResponse
+from app.models.architecture.committees import CommitteeResponse
+from app.models.architecture.department import DepartmentNameResponse
 from app.models.users import Users
 from app.services.bookFollowUp import BookFollowUpService
 from app.services.pdf_service import PDFService
-from app.helper.save_pdf import async_delayed_delete, save_pdf_to_server  #  Responsible for saving the uploaded file
+from app.helper.file_response import pdf_file_response
+from app.helper.save_pdf import async_delayed_delete, save_upload_to_server  #  Responsible for saving the uploaded file
 from app.database.config import settings
 from app.models.PDFTable import PDFCreate, PDFResponse, PDFTable
-from app.models.bookFollowUpTable import BookFollowUpCreate, BookFollowUpResponse, BookFollowUpTable, BookFollowUpUpdate, BookFollowUpWithPDFResponseForUpdateByBookID, BookStatusCounts, BookTypeCounts, PaginatedOrderOut, SubjectRequest, UserBookCount
+from app.models.bookFollowUpTable import BookFollowUpCreate, BookFollowUpResponse, BookFollowUpTable, BookFollowUpUpdate, BookFollowUpWithPDFResponseForUpdateByBookID, BookStatusCounts, BookTypeCounts, DashboardSummary, PaginatedOrderOut, SubjectRequest, UserBookCount
 from sqlalchemy.sql.expression import cast
 from sqlalchemy.types import Date
 from app.services.lateBooks import LateBookFollowUpService
+from app.services.authentication import authorize
+from app.services.count_cache import INCLUDE_TOTAL_PATTERN
+from app.services.book_aging import AGE_BUCKET_PATTERN, LATE_BOOKS_SORT_PATTERN
+from app.services.reference_cache import reference_cache
+from app.services.autocomplete import AUTOCOMPLETE_RANK_PATTERN
+from app.services.search_index import search_index
+from app.services.book_counters import reconcile as reconcile_counters
+from app.services.dashboard_summary import dashboard_summary
+from app.services.report_stats import ReportStatsCounter
+from app.services.report_stream import (
+    DEPARTMENT_REPORT_CSV_COLUMNS, DEPARTMENT_REPORT_XLSX_COLUMNS, REPORT_CSV_COLUMNS, REPORT_FORMAT_PATTERN,
+    REPORT_XLSX_COLUMNS, department_report_batches, report_batches, report_stream_response,
+)
+from app.helper.xlsx_export import XLSX_MEDIA_TYPE, build_xlsx, remove_files, xlsx_available
+from starlette.background import BackgroundTask
+from app.services.pdf_path_cache import forget_pdf, lookup_pdf, remember_pdf
 from fastapi.responses import FileResponse
 import os
 from urllib.parse import unquote
@@ -35,7 +52,7 @@ if not logger.handlers:  # Avoid duplicate handlers
     )
 
 #  Create router with a prefix and tag for grouping endpoints
-bookFollowUpRouter = APIRouter(prefix="/api/bookFollowUp", tags=["BookFollowUp"])
+bookFollowUpRouter = APIRouter(prefix="/api/bookFollowUp", tags=["BookFollowUp"], dependencies=[Depends(authorize)])
 
 from enum import Enum
 
@@ -69,12 +86,10 @@ async def add_book_with_pdf(
         department_ids = [int(dept_id.strip()) for dept_id in deIDs.split(',')]
         print(f"Committee {coID} will be associated with departments: {department_ids}")
         
-        # Step 2: Get or create multiple junctions
-        junction_ids = []
-        for dept_id in department_ids:
-            junction_id = await BookFollowUpService.get_or_create_junction(db, coID, dept_id)
-            junction_ids.append(junction_id)
-            print(f"Junction ID for Committee {coID} + Department {dept_id}: {junction_id}")
+        # Step 2: Get or create all junctions in one batch
+        junction_map = await BookFollowUpService.get_or_create_junctions(db, coID, department_ids)
+        junction_ids = [junction_map[dept_id] for dept_id in department_ids]
+        print(f"Junction IDs for Committee {coID} + Departments {department_ids}: {junction_ids}")
         
         # Step 3: Handle incomingNo and incomingDate based on bookType
         final_incoming_no = None
@@ -117,15 +132,13 @@ async def add_book_with_pdf(
         print(f"book_data: {book_data}")
         
         # Step 5: Insert book
-        book_id = await BookFollowUpService.insert_book(db, book_data)
+        book_id = await BookFollowUpService.insert_book(db, book_data, junction_ids)
         print(f"Inserted book with ID: {book_id}")
         
-        # Step 6: Create bridge records
-        bridge_ids = []
-        for junction_id in junction_ids:
-            bridge_id = await BookFollowUpService.create_book_junction_bridge(db, book_id, junction_id)
-            bridge_ids.append(bridge_id)
-            print(f"Created bridge record {bridge_id} for book {book_id} and junction {junction_id}")
+        # Step 6: Create bridge records in one statement
+        bridge_map = await BookFollowUpService.create_book_junction_bridges(db, book_id, junction_ids)
+        bridge_ids = [bridge_map[junction_id] for junction_id in junction_ids]
+        print(f"Created bridge records {bridge_ids} for book {book_id}")
         
         # Step 7: Handle PDF processing
         count = await PDFService.get_pdf_count(db, book_id)
@@ -133,7 +146,8 @@ async def add_book_with_pdf(
         
         upload_dir = settings.PDF_UPLOAD_PATH
         with file.file as f:
-            pdf_path = save_pdf_to_server(f, bookNo, bookDate, count, upload_dir)
+            saved = await save_upload_to_server(f, bookNo, bookDate, count, upload_dir)
+        pdf_path = saved.path
         print(f"Saved PDF to: {pdf_path}")
         
         file.file.close()
@@ -143,6 +157,8 @@ async def add_book_with_pdf(
             bookNo=bookNo,
             countPdf=count,
             pdf=pdf_path,
+            sha256=saved.sha256,
+            fileName=saved.file_name,
             userID=userID,
             currentDate=datetime.now().date().isoformat()
         )
@@ -201,7 +217,8 @@ async def add_supplement_pdf(
     upload_dir = settings.PDF_UPLOAD_PATH
    #print(f"upload_dir -PDF_UPLOAD_PATH \env------- {settings.PDF_UPLOAD_PATH}")
 
-    pdf_path = save_pdf_to_server(file.file, bookNo, bookDate, count, upload_dir)
+    saved = await save_upload_to_server(file.file, bookNo, bookDate, count, upload_dir)
+    pdf_path = saved.path
 
     # print("upload_dir"+ upload_dir)
 
@@ -211,6 +228,8 @@ async def add_supplement_pdf(
         bookNo=bookNo,
         countPdf=count + 1,
         pdf=pdf_path,
+        sha256=saved.sha256,
+        fileName=saved.file_name,
         userID=userID,
         currentDate=datetime.now().date()
     )
@@ -240,40 +259,56 @@ async def test_path():
 
 
 @bookFollowUpRouter.get("/getAllBooksNo", response_model=list[str])
-async def getAllBooksNo(db: AsyncSession = Depends(get_async_db)):
+async def getAllBooksNo(
+    search: str = Query(default="", description="Partial match for bookNo"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Max suggestions (all when omitted)"),
+    rank: str = Query("alpha", pattern=AUTOCOMPLETE_RANK_PATTERN, description="alpha | prefix | frequency"),
+    db: AsyncSession = Depends(get_async_db)
+):
     print("getAllBooksNo ... route")
-    return await BookFollowUpService.getAllBooksNo(db)
+    return await BookFollowUpService.getAllBooksNo(db, search, limit, rank)
 
 
 @bookFollowUpRouter.get("/getAllIncomingNo", response_model=list[Optional[str]])
-async def getAllIncomingNo(db: AsyncSession = Depends(get_async_db)):
-    return await BookFollowUpService.getAllIncomingNo(db)
+async def getAllIncomingNo(
+    search: str = Query(default="", description="Partial match for incomingNo"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Max suggestions (all when omitted)"),
+    rank: str = Query("alpha", pattern=AUTOCOMPLETE_RANK_PATTERN, description="alpha | prefix | frequency"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await BookFollowUpService.getAllIncomingNo(db, search, limit, rank)
 
 
 
 @bookFollowUpRouter.get("/getAllDirectoryNames", response_model=list[str])
 async def get_all_directory_names(
     search: str = Query(default="", description="Partial match for directoryName"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Max suggestions (all when omitted)"),
+    rank: str = Query("alpha", pattern=AUTOCOMPLETE_RANK_PATTERN, description="alpha | prefix | frequency"),
     db: AsyncSession = Depends(get_async_db)
 ):
-    return await BookFollowUpService.searchDirectoryNames(db, search)
+    return await BookFollowUpService.searchDirectoryNames(db, search, limit, rank)
 
 
 @bookFollowUpRouter.get("/getSubjects", response_model=list[str])
 async def getSubjects(
     search: str = Query(default="", description="Partial match for subject"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Max suggestions (all when omitted)"),
+    rank: str = Query("alpha", pattern=AUTOCOMPLETE_RANK_PATTERN, description="alpha | prefix | frequency"),
     db: AsyncSession = Depends(get_async_db)
 ):
-    return await BookFollowUpService.getSubjects(db, search)
+    return await BookFollowUpService.getSubjects(db, search, limit, rank)
 
 
 
 @bookFollowUpRouter.get("/getDestination", response_model=list[str])
 async def getSubjects(
     search: str = Query(default="", description="Partial match for destination"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Max suggestions (all when omitted)"),
+    rank: str = Query("alpha", pattern=AUTOCOMPLETE_RANK_PATTERN, description="alpha | prefix | frequency"),
     db: AsyncSession = Depends(get_async_db)
 ):
-    return await BookFollowUpService.getDestination(db, search)
+    return await BookFollowUpService.getDestination(db, search, limit, rank)
 
 
 
@@ -291,15 +326,44 @@ async def getByFilterBooksNo(
     directoryName: Optional[str] = Query(None),
     subject: Optional[str] = Query(None),
     incomingNo: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="Keyset mode: send cursor= (empty) for the first page, then the returned nextCursor"),
+    includeTotal: str = Query("exact", pattern=INCLUDE_TOTAL_PATTERN, description="false | approximate | exact"),
     db: AsyncSession = Depends(get_async_db)
 ) -> Dict[str, Any]:
     return await BookFollowUpService.getAllFilteredBooksNo(
-        request, db, page, limit, bookNo, bookStatus, bookType, directoryName,subject, incomingNo
+        request, db, page, limit, bookNo, bookStatus, bookType, directoryName,subject, incomingNo, cursor, includeTotal
     )
 
 
 
 
+# Ranked full-text search (BM25F over subject, notes, action, names and numbers)
+@bookFollowUpRouter.get("/search", response_model=Dict[str, Any])
+async def search_books(
+    q: str = Query(..., min_length=1, max_length=500),
+    page: int = Query(1, ge=1),
+    limit: int = Query(10, ge=1, le=100),
+    bookType: Optional[str] = Query(None),
+    bookStatus: Optional[str] = Query(None),
+    startDate: Optional[str] = Query(None, description="YYYY-MM-DD, on currentDate"),
+    endDate: Optional[str] = Query(None, description="YYYY-MM-DD, on currentDate"),
+    db: AsyncSession = Depends(get_async_db)
+) -> Dict[str, Any]:
+    return await BookFollowUpService.searchBooks(db, q, page, limit, bookType, bookStatus, startDate, endDate)
+
+
+# Rebuild the search index from the database
+@bookFollowUpRouter.post("/search/rebuild", response_model=Dict[str, int])
+async def rebuild_search_index(db: AsyncSession = Depends(get_async_db)):
+    try:
+        return await search_index.load(db)
+    except Exception as e:
+        logger.error(f"Error rebuilding search index: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
+
+
+
+
 @bookFollowUpRouter.get("/checkBookNoExistsForDebounce")
 async def check_order_exists(
     bookType: str = Query(..., alias="bookType"),  # Required query parameter for book type
@@ -348,15 +412,25 @@ async def get_late_books(
     page: int = Query(1, ge=1, description="Page number (1-based)"),
     limit: int = Query(10, ge=1, le=100, description="Records per page"),
     userID: int = Query(..., description="get late books per userID"),
+    includeTotal: str = Query(
+        "exact", pattern=INCLUDE_TOTAL_PATTERN,
+        description="Response shape only: exact/approximate -> total and totalPages, false -> hasMore "
+                    "(the total is computed with the page either way)"
+    ),
+    ageBucket: Optional[str] = Query(None, pattern=AGE_BUCKET_PATTERN, description="Comma-separated: 0-7, 8-30, 31-90, 90+, unknown"),
+    sort: str = Query("currentDate", pattern=LATE_BOOKS_SORT_PATTERN, description="currentDate | age_desc (oldest first) | age_asc"),
     db: AsyncSession = Depends(get_async_db)
 ):
     """
     Retrieve late books (status 'قيد الانجاز') with pagination filtered by userID.
-    Returns paginated data with total count, page, limit, and total pages.
+    Returns paginated data with total count, page, limit, and total pages,
+    plus ageBuckets: how many of the user's late books fall in each age bucket.
+    includeTotal does not save any work here (the counts come with the page): it only
+    swaps total/totalPages for hasMore when "false"; "approximate" is the same as "exact".
     """
     try:
-        logger.info(f"GET /lateBooks - userID: {userID}, page: {page}, limit: {limit}")
-        result = await LateBookFollowUpService.getLateBooks(db, page, limit, userID)
+        logger.info(f"GET /lateBooks - userID: {userID}, page: {page}, limit: {limit}, ageBucket: {ageBucket}, sort: {sort}")
+        result = await LateBookFollowUpService.getLateBooks(db, page, limit, userID, includeTotal, ageBucket, sort)
         logger.info(f"Route response: {len(result.get('data', []))} records")
         return result
     except HTTPException:
@@ -410,35 +484,47 @@ async def get_pdfs_by_book_no(book_no: str, db: AsyncSession = Depends(get_async
 
 
 @bookFollowUpRouter.get("/pdf/file/{pdf_id}")
-async def get_pdf_file(pdf_id: int, db: AsyncSession = Depends(get_async_db)):
+async def get_pdf_file(pdf_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
 
     """
     Retrieve a single PDF file by its ID from PDFTable.
-    Returns the PDF file if found and accessible.
+    Returns the PDF file if found and accessible. Supports conditional GET
+    (ETag / If-None-Match / If-Modified-Since -> 304) and Range requests (206).
     """
     print(f"Fetching PDF file with id: {pdf_id}")
     try:
-        query = select(
-            PDFTable.pdf,
-            PDFTable.bookNo,
-            PDFTable.userID
-        ).filter(PDFTable.id == pdf_id)
-        result = await db.execute(query)
-        pdf_record = result.first()
-        
-        if not pdf_record:
-            print(f"No PDF found for id: {pdf_id}")
-            raise HTTPException(status_code=404, detail="PDF record not found in database")
-        
-        pdf_path, book_no, user_id = pdf_record
-        print(f"Queried PDF path: {pdf_path}, bookNo: {book_no}, userID: {user_id}")
-        
-        if not os.path.exists(pdf_path):
-            print(f"PDF file does not exist at: {pdf_path}")
-            raise HTTPException(status_code=404, detail="PDF file not found on server")
+        # Common case: location already cached, no DB round trip
+        location = lookup_pdf(pdf_id)
+        if location is None:
+            query = select(
+                PDFTable.pdf,
+                PDFTable.bookNo,
+                PDFTable.userID,
+                PDFTable.sha256,
+                PDFTable.fileName
+            ).filter(PDFTable.id == pdf_id)
+            result = await db.execute(query)
+            pdf_record = result.first()
+            
+            if not pdf_record:
+                print(f"No PDF found for id: {pdf_id}")
+                raise HTTPException(status_code=404, detail="PDF record not found in database")
+            
+            pdf_path, book_no, user_id, sha256, file_name = pdf_record
+            print(f"Queried PDF path: {pdf_path}, bookNo: {book_no}, userID: {user_id}")
+            
+            location = await remember_pdf(pdf_id, pdf_path, sha256, file_name) if pdf_path else None
+            if location is None:
+                print(f"PDF file does not exist at: {pdf_path}")
+                raise HTTPException(status_code=404, detail="PDF file not found on server")
         
-        print(f"Serving PDF file: {pdf_path} for bookNo: {book_no}, userID: {user_id}")
-        return FileResponse(pdf_path, media_type="application/pdf")
+        print(f"Serving PDF file: {location.path}")
+        return await pdf_file_response(
+            request, location.path, location.sha256, location.fileName, location.stat_result,
+            on_missing=lambda: forget_pdf(pdf_id)
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching PDF file with id {pdf_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
@@ -721,19 +807,52 @@ async def get_filtered_report(
     check: Optional[bool] = Query(False, description="Enable date range filtering (True) or NULL currentDate (False)"),
     startDate: Optional[str] = Query(None, description="Start date (YYYY-MM-DD) for check=True"),
     endDate: Optional[str] = Query(None, description="End date (YYYY-MM-DD) for check=True"),
+    format: str = Query("json", pattern=REPORT_FORMAT_PATTERN, description="json | ndjson | csv (streamed)"),
     db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get filtered book follow-up report with multi-department and multi-committee support.
     If check=True, filter by date range. If check=False, filter by currentDate IS NULL.
+    format=ndjson|csv streams the rows instead of building the whole list.
     
     Returns:
         List of book follow-up records with committee and department information
     """
     logger.debug(f"Received report request: bookType={bookType}, bookStatus={bookStatus}, check={check}, startDate={startDate}, endDate={endDate}")
+    if format != "json":
+        filters = BookFollowUpService.report_filters(bookType, bookStatus, check, startDate, endDate)
+        return report_stream_response(format, report_batches(filters), REPORT_CSV_COLUMNS, "report")
     return await BookFollowUpService.reportBookFollowUp(db, bookType, bookStatus, check, startDate, endDate)
 
 
+async def _xlsx_response(batches, columns, sheet_name: str, filename: str) -> FileResponse:
+    """Build the workbook off the event loop and send it; the file is deleted after sending."""
+    try:
+        path = await build_xlsx(batches, columns, sheet_name)
+    except Exception as e:
+        logger.error(f"Error building {filename}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to build the Excel report")
+    return FileResponse(path, media_type=XLSX_MEDIA_TYPE, filename=filename, background=BackgroundTask(remove_files, path))
+
+
+@bookFollowUpRouter.get("/report/export.xlsx")
+async def export_report_xlsx(
+    bookType: Optional[str] = Query(None, description="Filter by book type"),
+    bookStatus: Optional[str] = Query(None, description="Filter by book status"),
+    check: Optional[bool] = Query(False, description="Enable date range filtering (True) or NULL currentDate (False)"),
+    startDate: Optional[str] = Query(None, description="Start date (YYYY-MM-DD) for check=True"),
+    endDate: Optional[str] = Query(None, description="End date (YYYY-MM-DD) for check=True"),
+):
+    """
+    The /report rows as an Excel workbook (right-to-left sheet, Arabic headers).
+    Rows are streamed from the database and the workbook is written in a worker process.
+    """
+    if not xlsx_available():
+        raise HTTPException(status_code=503, detail="Excel export is not available (XlsxWriter is not installed)")
+    filters = BookFollowUpService.report_filters(bookType, bookStatus, check, startDate, endDate)
+    return await _xlsx_response(report_batches(filters), REPORT_XLSX_COLUMNS, "تقرير الكتب", "report.xlsx")
+
+
 
 
 # Pydantic model for request body
@@ -860,6 +979,26 @@ async def get_book_pdf(username: str = Query(..., description="Username for the
 
 
 
+# Every dashboard count (types, statuses, users, committees, departments) in one response
+@bookFollowUpRouter.get("/dashboard/summary", response_model=DashboardSummary)
+async def get_dashboard_summary(db: AsyncSession = Depends(get_async_db)):
+    return await BookFollowUpService.get_dashboard_summary(db)
+
+# Recompute book_counters from bookFollowUpTable; reports drift and corrects it unless dryRun
+@bookFollowUpRouter.post("/counters/reconcile", response_model=Dict[str, Any])
+async def reconcile_book_counters(
+    dryRun: bool = Query(False, description="Only report the drift"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    try:
+        report = await reconcile_counters(db, dry_run=dryRun)
+    except Exception as e:
+        logger.error(f"Error reconciling book counters: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
+    if not dryRun:
+        dashboard_summary.invalidate()
+    return report
+
 @bookFollowUpRouter.get("/counts/book-type", response_model=BookTypeCounts)
 async def get_book_type_counts(db: AsyncSession = Depends(get_async_db)):
     try:
@@ -889,21 +1028,30 @@ async def get_user_book_counts(db: AsyncSession = Depends(get_async_db)):
     
 
 
-# GET all committees
+# Reload committees/departments/junctions into the in-memory reference cache
+@bookFollowUpRouter.post("/reference-cache/refresh", response_model=Dict[str, int])
+async def refresh_reference_cache(db: AsyncSession = Depends(get_async_db)):
+    try:
+        return await reference_cache.load(db)
+    except Exception as e:
+        logger.error(f"Error refreshing reference cache: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
+
+
+
+# GET all committees (served from the reference cache)
 @bookFollowUpRouter.get("/committees", response_model=List[CommitteeResponse])
 async def get_all_committees(db: AsyncSession = Depends(get_async_db)):
     try:
         logger.info("Fetching all committees")
-        # Query all committees
-        result = await db.execute(select(Committee))
-        committees = result.scalars().all()
+        await reference_cache.ensure_loaded(db)
+        committees = reference_cache.list_committees()
         
         if not committees:
             logger.warning("No committees found in the database")
             return []
         
-        # Convert to list of Pydantic models
-        committees_list = [CommitteeResponse.model_validate(committee) for committee in committees]
+        committees_list = [CommitteeResponse(coID=coID, Com=Com) for coID, Com in committees]
         logger.info(f"Retrieved {len(committees_list)} committees")
         return committees_list
     
@@ -915,29 +1063,24 @@ async def get_all_committees(db: AsyncSession = Depends(get_async_db)):
 
 
 
-# GET department names by coID
+# GET department names by coID (served from the reference cache)
 @bookFollowUpRouter.get("/{coID}/departments", response_model=List[DepartmentNameResponse])
 async def get_department_names_by_coID(coID: int, db: AsyncSession = Depends(get_async_db)):
     try:
         logger.info(f"Fetching department names for coID: {coID}")
-        result = await db.execute(select(Committee).filter(Committee.coID == coID))
-        committee = result.scalars().first()
-        if not committee:
+        await reference_cache.ensure_loaded(db)
+        if coID not in reference_cache.committees:
             logger.warning(f"Committee with coID {coID} not found")
             raise HTTPException(status_code=404, detail=f"Committee with coID {coID} not found")
         
-        result = await db.execute(select(Department).filter(Department.coID == coID))
-        departments = result.scalars().all()
+        departments = reference_cache.departments_of_committee(coID)
         if not departments:
             logger.warning(f"No departments found for coID {coID}")
             return []
         
         department_names = [
-            DepartmentNameResponse(
-                deID=department.deID if department.deID is not None else index + 1,
-                departmentName=department.departmentName
-            )
-            for index, department in enumerate(departments)
+            DepartmentNameResponse(deID=deID, departmentName=departmentName)
+            for deID, departmentName in departments
         ]
         logger.info(f"Retrieved {len(department_names)} department names for coID {coID}")
         return department_names
@@ -1071,8 +1214,19 @@ async def get_report_with_statistics(
     check: Optional[bool] = Query(False),
     startDate: Optional[str] = Query(None),
     endDate: Optional[str] = Query(None),
+    format: str = Query("json", pattern=REPORT_FORMAT_PATTERN, description="json | ndjson | csv (streamed)"),
     db: AsyncSession = Depends(get_async_db)
 ):
+    if format != "json":
+        # ndjson: one record per line, then {"statistics": {...}} as the last line
+        filters = BookFollowUpService.report_filters(bookType, bookStatus, check, startDate, endDate)
+        stats = ReportStatsCounter()
+        return report_stream_response(
+            format, report_batches(filters, stats), REPORT_CSV_COLUMNS, "report-with-stats",
+            trailer=lambda: {"statistics": stats.statistics(
+                stats.books, bookType, bookStatus, check, startDate, endDate
+            )},
+        )
     return await BookFollowUpService.reportBookFollowUpWithStats(
         db, bookType, bookStatus, check, startDate, endDate
     )
@@ -1145,23 +1299,54 @@ async def get_filtered_department_report(
     endDate: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
     coID: Optional[str] = Query(None, description="Filter by committee ID"),
     deID: Optional[str] = Query(None, description="Filter by department ID"),
+    format: str = Query("json", pattern=REPORT_FORMAT_PATTERN, description="json | ndjson | csv (streamed)"),
     db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get filtered book follow-up records by department and committee.
     Returns records with total count and department/committee info.
     Date filtering is applied when both startDate and endDate are provided.
+    format=ndjson|csv streams the records only.
     """
     logger.debug(
         f"Received filtered department report request: "
         f"bookType={bookType}, bookStatus={bookStatus}, "
         f"startDate={startDate}, endDate={endDate}, coID={coID}, deID={deID}"
     )
+    if format != "json":
+        try:
+            filters = BookFollowUpService.department_report_filters(bookType, bookStatus, startDate, endDate, coID, deID)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="coID and deID must be integers")
+        return report_stream_response(
+            format, department_report_batches(filters), DEPARTMENT_REPORT_CSV_COLUMNS, "report-department"
+        )
     return await BookFollowUpService.reportBookFollowUpByDepartment(
         db, bookType, bookStatus, startDate, endDate, coID, deID
     )
 
 
+@bookFollowUpRouter.get("/report-with-stats-department/export.xlsx")
+async def export_department_report_xlsx(
+    bookType: Optional[str] = Query(None, description="Filter by book type"),
+    bookStatus: Optional[str] = Query(None, description="Filter by book status"),
+    startDate: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
+    endDate: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
+    coID: Optional[str] = Query(None, description="Filter by committee ID"),
+    deID: Optional[str] = Query(None, description="Filter by department ID"),
+):
+    """The /report-with-stats-department records as an Excel workbook (one row per book and department)."""
+    if not xlsx_available():
+        raise HTTPException(status_code=503, detail="Excel export is not available (XlsxWriter is not installed)")
+    try:
+        filters = BookFollowUpService.department_report_filters(bookType, bookStatus, startDate, endDate, coID, deID)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="coID and deID must be integers")
+    return await _xlsx_response(
+        department_report_batches(filters), DEPARTMENT_REPORT_XLSX_COLUMNS, "تقرير الأقسام", "report-department.xlsx"
+    )
+
+
 
 # For /committees-with-departments endpoint
 class DepartmentInfo(BaseModel):
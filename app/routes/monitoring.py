@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import Response
+from typing import Any, Dict
+
+from app.helper.metrics import CONTENT_TYPE_LATEST, metrics_available, render_metrics
+from app.helper.password_hashing import password_pool
+from app.helper.request_timing import timing_registry
+from app.services.authentication import get_current_principal
+
+# Signed-in users only; /metrics below stays open for Prometheus
+monitoringRouter = APIRouter(
+    prefix="/api/monitoring", tags=["Monitoring"], dependencies=[Depends(get_current_principal)]
+)
+# Prometheus scrapes /metrics at the root, as usual
+metricsRouter = APIRouter(tags=["Monitoring"])
+
+
+@metricsRouter.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus text format (all workers when PROMETHEUS_MULTIPROC_DIR is set)."""
+    if not metrics_available():
+        raise HTTPException(status_code=503, detail="prometheus_client is not installed")
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
+@monitoringRouter.get("/timing", response_model=Dict[str, Any])
+async def get_request_timing():
+    """
+    Per-route histograms of this worker: wall time, DB time, SQL statements and rows
+    per request, slowest routes (by total time) first.
+    """
+    return {"routes": timing_registry.snapshot()}
+
+
+@monitoringRouter.delete("/timing")
+async def reset_request_timing():
+    """Start the histograms over (e.g. before measuring one scenario)."""
+    timing_registry.clear()
+    return {"message": "Request timing reset"}
+
+
+@monitoringRouter.get("/password-pool", response_model=Dict[str, Any])
+async def get_password_pool_stats():
+    """Load of this worker's bcrypt pool: queue depth, refusals (503) and time jobs spent waiting."""
+    return password_pool.stats()
@@ -1,24 +1,38 @@
-from fastapi import HTTPException
+from fastapi import Cookie, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from app.models.users import UserCreate, Users, UserResponse
-from passlib.context import CryptContext
-from jose import jwt
+from app.models.users import Principal, UserCreate, Users, UserResponse
+from app.database.config import settings
+from app.helper.ttl_cache import TTLCache
+from app.helper.password_hashing import PasswordPoolBusy, password_pool
+from jose import ExpiredSignatureError, JWTError, jwt
 from datetime import datetime, timedelta
+import hashlib
 import os
+import time
 from typing import Optional
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # JWT settings
 JWT_SECRET = os.getenv("JWT_SECRET")
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRE_DAYS = 30
 
+AUTH_COOKIE = "jwt_cookies_auth_token"
+
+# sha256(token) -> Principal; entries are checked against their own exp, not a TTL
+_token_cache = TTLCache(max_size=settings.JWT_CACHE_SIZE, ttl_sec=None, name="jwt")
+
+
+async def _password_job(job):
+    """Await a password_pool job; a saturated pool answers 503 (the client should retry)."""
+    try:
+        return await job
+    except PasswordPoolBusy:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+
 class AuthenticationService:
     @staticmethod
     async def verify_user(db: AsyncSession, username: str, password: str) -> Optional[UserResponse]:
@@ -37,13 +51,12 @@ class AuthenticationService:
             # Query user by username
             result = await db.execute(select(Users).where(Users.username == username))
             user = result.scalars().first()
-            print("user ....mmmmm", user.permission)
             
             if not user:
                 raise HTTPException(status_code=400, detail="Invalid username or password")
             
             # Verify password
-            if not pwd_context.verify(password, user.password):
+            if not await _password_job(password_pool.verify(password, user.password)):
                 raise HTTPException(status_code=400, detail="Invalid username or password")
             
             # Return user data (excluding password)
@@ -79,6 +92,34 @@ class AuthenticationService:
 
         
         return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+    @staticmethod
+    def decode_jwt(token: str) -> Principal:
+        """
+        Verify a JWT and return its principal, raising 401 if it is invalid or expired.
+        Verified tokens are remembered by hash until their exp, so repeated requests
+        with the same cookie skip the signature check.
+        """
+        key = hashlib.sha256(token.encode()).digest()
+        principal = _token_cache.get(key)
+        if principal is not None and principal.exp > time.time():
+            return principal
+
+        try:
+            claims = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM], options={"require_exp": True})
+            principal = Principal(
+                id=claims["id"],
+                username=claims.get("username"),
+                permission=claims.get("permission"),
+                exp=claims["exp"]
+            )
+        except ExpiredSignatureError:
+            raise HTTPException(status_code=401, detail="Token expired")
+        except (JWTError, KeyError, ValueError):
+            raise HTTPException(status_code=401, detail="Invalid token")
+
+        _token_cache.set(key, principal)
+        return principal
     
 
 
@@ -110,7 +151,7 @@ class AuthenticationService:
             raise HTTPException(status_code=400, detail="User already exists")
 
         
-        hashed_password = pwd_context.hash(user_create.password) if user_create.password else None
+        hashed_password = await _password_job(password_pool.hash(user_create.password)) if user_create.password else None
         db_user = Users(
             username=user_create.username,
             password=hashed_password,
@@ -126,4 +167,37 @@ class AuthenticationService:
             id=db_user.id,
             username=db_user.username,
             permission=db_user.permission
-        )
\ No newline at end of file
+        )
+
+
+# ---------- dependencies ----------
+
+async def get_current_principal(
+    request: Request, token: Optional[str] = Cookie(None, alias=AUTH_COOKIE)
+) -> Principal:
+    """Dependency: the caller of a route that requires login (401 without a valid cookie)."""
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    principal = AuthenticationService.decode_jwt(token)
+    request.state.principal = principal
+    return principal
+
+
+async def authorize(
+    request: Request, token: Optional[str] = Cookie(None, alias=AUTH_COOKIE)
+) -> Optional[Principal]:
+    """
+    Router dependency: with AUTH_ENFORCE the same as get_current_principal; otherwise
+    the principal when a valid cookie is sent and None instead of 401.
+    Handlers can read it from request.state.principal.
+    """
+    if settings.AUTH_ENFORCE:
+        return await get_current_principal(request, token)
+    request.state.principal = None
+    if not token:
+        return None
+    try:
+        request.state.principal = AuthenticationService.decode_jwt(token)
+    except HTTPException:
+        pass
+    return request.state.principal
@@ -0,0 +1,288 @@
+import asyncio
+import bisect
+import heapq
+import logging
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import anyio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.config import settings
+from app.database.database import AsyncSessionLocal
+from app.helper.arabic import normalize_arabic
+from app.models.bookFollowUpTable import BookFollowUpTable
+from app.services.book_events import BookEvent, subscribe
+from app.services.fuzzy_index import FuzzyIndex
+
+logger = logging.getLogger(__name__)
+
+
+AUTOCOMPLETE_FIELDS = ("bookNo", "incomingNo", "directoryName", "subject", "destination")
+
+# Fields that also keep a FuzzyIndex of their distinct values (getRecordBySubject)
+FUZZY_FIELDS = ("subject",)
+
+# alpha: alphabetical (same order as the old ORDER BY)
+# prefix: values starting with the query first, then infix matches, each alphabetical
+# frequency: most used values first
+AUTOCOMPLETE_RANK_PATTERN = "^(alpha|prefix|frequency)$"
+
+# Shorter queries match values starting with them only: a substring test on one or
+# two letters would scan every distinct value and match most of them anyway
+INFIX_MIN_CHARS = 3
+
+
+def _fold(value: str) -> str:
+    # Arabic spelling variants and case fold to the same key, so they list together,
+    # prefix/infix search matches either spelling and variants() can expand filters
+    return normalize_arabic(value).casefold()
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class FieldIndex:
+    """
+    Distinct values of one column with their row counts.
+    - sorted (folded, value) list: alphabetical listing and prefix ranges via bisect
+    - trigram -> value ids: candidate set for infix (ILIKE '%q%') queries of 3+ chars;
+      shorter queries are prefix queries (INFIX_MIN_CHARS)
+    - optional FuzzyIndex over the same distinct values
+    """
+
+    def __init__(self, fuzzy: Optional[FuzzyIndex] = None):
+        self.counts: Dict[str, int] = {}
+        self._sorted: List[Tuple[str, str]] = []
+        self._ids: Dict[str, int] = {}
+        self._folded: List[Optional[str]] = []   # value id -> folded value (None once removed)
+        self._values: List[Optional[str]] = []   # value id -> value
+        self._trigrams: Dict[str, Set[int]] = {}
+        self.fuzzy = fuzzy
+
+    @classmethod
+    def from_counts(cls, counts: Dict[str, int], fuzzy: bool = False) -> "FieldIndex":
+        index = cls(FuzzyIndex() if fuzzy else None)
+        index.counts = dict(counts)
+        index._sorted = sorted((_fold(value), value) for value in counts)
+        for folded, value in index._sorted:
+            index._register(folded, value)
+        return index
+
+    def _register(self, folded: str, value: str) -> None:
+        value_id = len(self._values)
+        self._values.append(value)
+        self._folded.append(folded)
+        self._ids[value] = value_id
+        for gram in _trigrams(folded):
+            self._trigrams.setdefault(gram, set()).add(value_id)
+        if self.fuzzy is not None:
+            self.fuzzy.add(value)
+
+    def add(self, value: Optional[str]) -> None:
+        if value is None:
+            return
+        if value in self.counts:
+            self.counts[value] += 1
+            return
+        self.counts[value] = 1
+        folded = _fold(value)
+        bisect.insort(self._sorted, (folded, value))
+        self._register(folded, value)
+
+    def remove(self, value: Optional[str]) -> None:
+        count = self.counts.get(value)
+        if count is None:
+            return
+        if count > 1:
+            self.counts[value] = count - 1
+            return
+
+        del self.counts[value]
+        folded = _fold(value)
+        position = bisect.bisect_left(self._sorted, (folded, value))
+        if position < len(self._sorted) and self._sorted[position] == (folded, value):
+            del self._sorted[position]
+
+        value_id = self._ids.pop(value)
+        self._values[value_id] = None
+        self._folded[value_id] = None
+        for gram in _trigrams(folded):
+            postings = self._trigrams.get(gram)
+            if postings is not None:
+                postings.discard(value_id)
+                if not postings:
+                    del self._trigrams[gram]
+        if self.fuzzy is not None:
+            self.fuzzy.remove(value)
+
+    def _prefix_matches(self, folded_query: str) -> List[Tuple[str, str]]:
+        start = bisect.bisect_left(self._sorted, (folded_query,))
+        matches = []
+        for folded, value in self._sorted[start:]:
+            if not folded.startswith(folded_query):
+                break
+            matches.append((folded, value))
+        return matches
+
+    def variants(self, value: str) -> List[str]:
+        """Distinct stored values that fold to the same key as value (any spelling)."""
+        folded_value = _fold(value)
+        start = bisect.bisect_left(self._sorted, (folded_value,))
+        end = bisect.bisect_left(self._sorted, (folded_value + "\0",), start)
+        return [stored for _, stored in self._sorted[start:end]]
+
+    def _infix_matches(self, folded_query: str) -> List[Tuple[str, str]]:
+        if len(folded_query) < INFIX_MIN_CHARS:
+            return self._prefix_matches(folded_query)
+
+        postings = sorted((self._trigrams.get(gram, set()) for gram in _trigrams(folded_query)), key=len)
+        candidates = set(postings[0]) if postings else set()
+        for other in postings[1:]:
+            candidates &= other
+            if not candidates:
+                break
+        # Trigrams only narrow the set; the substring check is the actual match
+        return [
+            (self._folded[value_id], self._values[value_id])
+            for value_id in candidates
+            if self._folded[value_id] is not None and folded_query in self._folded[value_id]
+        ]
+
+    def search(self, query: str = "", limit: Optional[int] = None, rank: str = "alpha") -> List[str]:
+        folded_query = _fold(query or "")
+
+        if not folded_query:
+            matches = self._sorted
+        elif rank == "prefix" and limit is not None:
+            # Enough prefix hits: no need to look for infix matches at all
+            matches = self._prefix_matches(folded_query)
+            if len(matches) >= limit:
+                return [value for _, value in matches[:limit]]
+            matches = self._infix_matches(folded_query)
+        else:
+            matches = self._infix_matches(folded_query)
+
+        if rank == "frequency":
+            key = lambda item: (-self.counts.get(item[1], 0), item)
+        elif rank == "prefix":
+            key = lambda item: (not item[0].startswith(folded_query), item)
+        else:
+            key = lambda item: item
+
+        if limit is not None:
+            ranked = heapq.nsmallest(limit, matches, key=key)
+        elif matches is self._sorted and rank == "alpha":
+            ranked = matches
+        else:
+            ranked = sorted(matches, key=key)
+        return [value for _, value in ranked]
+
+
+class AutocompleteIndex:
+    """
+    Process-local autocomplete over the AUTOCOMPLETE_FIELDS columns of bookFollowUpTable.
+    Loaded at startup, kept current from committed book events of this worker, and
+    reloaded in the background once it is older than AUTOCOMPLETE_MAX_AGE_SEC so
+    writes made by other workers show up too. Callers fall back to the database
+    while it is not loaded.
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, FieldIndex] = {
+            field: FieldIndex(FuzzyIndex() if field in FUZZY_FIELDS else None) for field in AUTOCOMPLETE_FIELDS
+        }
+        self.loaded = False
+        self.loaded_at = 0.0
+        self._buffer: Optional[List[List[BookEvent]]] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _build(rows: List[Any]) -> Dict[str, FieldIndex]:
+        counters = {field: Counter() for field in AUTOCOMPLETE_FIELDS}
+        for row in rows:
+            for position, field in enumerate(AUTOCOMPLETE_FIELDS):
+                value = row[position]
+                if value is not None:
+                    counters[field][value] += 1
+        return {
+            field: FieldIndex.from_counts(counters[field], fuzzy=field in FUZZY_FIELDS)
+            for field in AUTOCOMPLETE_FIELDS
+        }
+
+    async def load(self, db: AsyncSession) -> Dict[str, int]:
+        self._buffer = []  # events committed while we read are replayed on the new index
+        try:
+            columns = [getattr(BookFollowUpTable, field) for field in AUTOCOMPLETE_FIELDS]
+            rows = (await db.execute(select(*columns))).fetchall()
+            # Sorting and trigrams of every distinct value take a while; keep the event loop free
+            self.fields = await anyio.to_thread.run_sync(AutocompleteIndex._build, rows)
+            buffered = self._buffer
+        finally:
+            self._buffer = None
+
+        for events in buffered:
+            self._apply(events)
+        self.loaded = True
+        self.loaded_at = time.monotonic()
+
+        stats = {field: len(index.counts) for field, index in self.fields.items()}
+        logger.info(f"Autocomplete index loaded from {len(rows)} books: {stats}")
+        return stats
+
+    def refresh_in_background(self) -> None:
+        if self._refresh_task and not self._refresh_task.done():
+            return
+
+        async def _refresh():
+            try:
+                async with AsyncSessionLocal() as session:
+                    await self.load(session)
+            except Exception as e:
+                logger.error(f"Autocomplete index refresh failed: {str(e)}")
+
+        self._refresh_task = asyncio.create_task(_refresh())
+
+    def ready(self) -> bool:
+        """True if the index can answer; schedules a (re)load when missing or stale."""
+        if not self.loaded:
+            self.refresh_in_background()
+            return False
+        max_age = settings.AUTOCOMPLETE_MAX_AGE_SEC
+        if max_age and time.monotonic() - self.loaded_at > max_age:
+            self.refresh_in_background()
+        return True
+
+    def apply_events(self, events: List[BookEvent]) -> None:
+        if self._buffer is not None:
+            self._buffer.append(events)
+        if self.loaded:
+            self._apply(events)
+
+    def _apply(self, events: Iterable[BookEvent]) -> None:
+        for book_event in events:
+            for field in AUTOCOMPLETE_FIELDS:
+                old = book_event.old.get(field)
+                new = book_event.new.get(field)
+                if book_event.kind == "update" and old == new:
+                    continue
+                if book_event.kind in ("update", "delete"):
+                    self.fields[field].remove(old)
+                if book_event.kind in ("insert", "update"):
+                    self.fields[field].add(new)
+
+    def search(self, field: str, query: str = "", limit: Optional[int] = None, rank: str = "alpha") -> List[str]:
+        return self.fields[field].search(query, limit, rank)
+
+    def variants(self, field: str, value: str) -> List[str]:
+        return self.fields[field].variants(value)
+
+    def fuzzy_matches(self, field: str, query: str, threshold: float = 0.8) -> List[Tuple[str, float]]:
+        return self.fields[field].fuzzy.matches(query, threshold)
+
+
+autocomplete_index = AutocompleteIndex()
+subscribe(autocomplete_index.apply_events)
@@ -1,17 +1,30 @@
 import asyncio
 from datetime import date, datetime
+from functools import partial
+import json
 import os
+from types import SimpleNamespace
 from typing import Any, Dict, List, Optional
 from urllib.parse import unquote
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from app.helper.save_pdf import async_delayed_delete, save_pdf_to_server
+from app.helper.save_pdf import async_delayed_delete, save_upload_to_server
+from app.helper.cursor import decode_cursor, encode_cursor
+from app.services.count_cache import cached_total, count_cache_key, resolve_total, store_total
+from app.services.reference_cache import EMPTY_JUNCTION, JunctionRef, reference_cache
+from app.services.book_events import call_after_commit
+from app.services.autocomplete import AUTOCOMPLETE_FIELDS, INFIX_MIN_CHARS, autocomplete_index
+from app.services.search_index import SEARCH_FIELDS, search_index
+from app.services.report_stats import ReportStatsCounter
+from app.services.dashboard_summary import dashboard_summary
+from app.services.late_books_snapshot import late_books_snapshot
+from app.services.book_counters import apply_counter_change, counter_state, junction_departments, read_counters, stored_counter_state
 from app.models.PDFTable import PDFCreate, PDFResponse, PDFTable
 from app.models.architecture.committees import Committee
 from app.models.architecture.department import Department
-from app.models.bookFollowUpTable import BookFollowUpResponse, BookFollowUpTable, BookFollowUpCreate, BookFollowUpWithPDFResponseForUpdateByBookID, BookJunctionBridge, BookStatusCounts, BookTypeCounts, CommitteeDepartmentsJunction, UserBookCount
-from sqlalchemy import String, and_, cast, delete, select,func,case, text,desc
+from app.models.bookFollowUpTable import BookFollowUpResponse, BookFollowUpTable, BookFollowUpCreate, BookFollowUpWithPDFResponseForUpdateByBookID, BookJunctionBridge, BookStatusCounts, BookTypeCounts, CommitteeDepartmentsJunction, DashboardSummary, UserBookCount
+from sqlalchemy import String, and_, cast, delete, insert, select,func, text,desc
 from fastapi import HTTPException, Request, UploadFile
 from app.models.users import Users
 from app.services.pdf_service import PDFService
@@ -62,6 +75,8 @@ class BookFollowUpService:
             db.add(new_junction)
             await db.flush()  # Flush to get ID without full commit
             junction_id = new_junction.id
+            # Into the shared cache only once the junction is committed
+            call_after_commit(db.sync_session, partial(reference_cache.add_junction, junction_id, coID, deID))
             print(f"Created new junction: {junction_id} for coID={coID}, deID={deID}")
             return junction_id
             
@@ -88,10 +103,12 @@ class BookFollowUpService:
                 )
     
     @staticmethod
-    async def insert_book(db: AsyncSession, book: BookFollowUpCreate) -> int:
+    async def insert_book(db: AsyncSession, book: BookFollowUpCreate, junction_ids: Optional[List[int]] = None) -> int:
         """
         Insert new book record with SQL Server optimized date handling.
         Handles optional incomingNo and incomingDate for SECRET book types.
+        junction_ids: the bridges the caller creates for the book in the same
+        transaction (counted in book_counters).
         """
         book_dict = book.model_dump(exclude_none=True)
         
@@ -120,6 +137,9 @@ class BookFollowUpService:
         db.add(new_book)
         await db.flush()
         book_id = new_book.id
+        await apply_counter_change(
+            db, None, counter_state(new_book, await junction_departments(db, junction_ids or []))
+        )
         print(f"Created book record with ID: {book_id} (Type: {book_dict.get('bookType')})")
         return book_id
   
@@ -205,6 +225,93 @@ class BookFollowUpService:
                 status_code=400, 
                 detail=f"Failed to create bridge record for book {book_id} and junction {junction_id}"
             )
+
+    @staticmethod
+    async def get_or_create_junctions(db: AsyncSession, coID: int, deIDs: List[int]) -> Dict[int, int]:
+        """
+        Batch version of get_or_create_junction: returns {deID: junctionID} for every
+        department. One SELECT ... IN for the existing pairs and one multi-row
+        INSERT ... OUTPUT for the missing ones.
+        """
+        wanted = list(dict.fromkeys(deIDs))  # dedupe, keep order
+        if not wanted:
+            return {}
+
+        select_stmt = select(CommitteeDepartmentsJunction.id, CommitteeDepartmentsJunction.deID).where(
+            CommitteeDepartmentsJunction.coID == coID,
+            CommitteeDepartmentsJunction.deID.in_(wanted)
+        )
+        result = await db.execute(select_stmt)
+        junction_map = {row.deID: row.id for row in result.fetchall()}
+
+        missing = [deID for deID in wanted if deID not in junction_map]
+        if missing:
+            insert_stmt = (
+                insert(CommitteeDepartmentsJunction)
+                .values([{"coID": coID, "deID": deID} for deID in missing])
+                .returning(CommitteeDepartmentsJunction.id, CommitteeDepartmentsJunction.deID)
+            )
+            try:
+                # Savepoint so a concurrent insert of the same pair only undoes this statement
+                async with db.begin_nested():
+                    result = await db.execute(insert_stmt)
+                    created = {row.deID: row.id for row in result.fetchall()}
+                for deID, junction_id in created.items():
+                    # Into the shared cache only once the caller commits (a rollback drops them)
+                    call_after_commit(db.sync_session, partial(reference_cache.add_junction, junction_id, coID, deID))
+                junction_map.update(created)
+                print(f"Created {len(created)} new junctions for coID={coID}: {created}")
+            except IntegrityError as e:
+                # Another request created some of the pairs first: re-fetch everything
+                print(f"IntegrityError creating junctions for coID={coID}, deIDs={missing}: {str(e)}")
+                result = await db.execute(select_stmt)
+                junction_map = {row.deID: row.id for row in result.fetchall()}
+
+        still_missing = [deID for deID in wanted if deID not in junction_map]
+        if still_missing:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to create or retrieve junctions for coID={coID}, deIDs={still_missing}"
+            )
+        return junction_map
+
+    @staticmethod
+    async def create_book_junction_bridges(db: AsyncSession, book_id: int, junction_ids: List[int]) -> Dict[int, int]:
+        """
+        Batch version of create_book_junction_bridge: returns {junctionID: bridgeID}.
+        Existing bridges are reused; the rest are written in one multi-row INSERT ... OUTPUT.
+        """
+        wanted = list(dict.fromkeys(junction_ids))
+        if not wanted:
+            return {}
+
+        try:
+            result = await db.execute(
+                select(BookJunctionBridge.id, BookJunctionBridge.junctionID).where(
+                    BookJunctionBridge.bookID == book_id,
+                    BookJunctionBridge.junctionID.in_(wanted)
+                )
+            )
+            bridge_map = {row.junctionID: row.id for row in result.fetchall()}
+
+            missing = [junction_id for junction_id in wanted if junction_id not in bridge_map]
+            if missing:
+                result = await db.execute(
+                    insert(BookJunctionBridge)
+                    .values([{"bookID": book_id, "junctionID": junction_id} for junction_id in missing])
+                    .returning(BookJunctionBridge.id, BookJunctionBridge.junctionID)
+                )
+                bridge_map.update({row.junctionID: row.id for row in result.fetchall()})
+                print(f"Created {len(missing)} bridge records for bookID={book_id}")
+            return bridge_map
+
+        except IntegrityError as e:
+            await db.rollback()
+            print(f"IntegrityError creating bridges for bookID={book_id}, junctionIDs={wanted}: {str(e)}")
+            raise HTTPException(
+                status_code=400,
+                detail=f"Failed to create bridge records for book {book_id}"
+            )
     
     @staticmethod
 
@@ -247,70 +354,76 @@ class BookFollowUpService:
 
     
     @staticmethod
-    async def getAllBooksNo(db: AsyncSession):
+    async def _autocomplete(
+        db: AsyncSession, field: str, query: str = "", limit: Optional[int] = None, rank: str = "alpha"
+    ) -> List[str]:
+        """
+        Distinct values of a column containing query (case-insensitive; starting with it
+        below INFIX_MIN_CHARS characters), served from the in-memory autocomplete index;
+        falls back to the database while it is not loaded.
+        """
+        if autocomplete_index.ready():
+            return autocomplete_index.search(field, query, limit, rank)
+
+        column = getattr(BookFollowUpTable, field)
+        stmt = select(column).where(column.isnot(None))
+        if query:
+            stmt = stmt.where(column.ilike(f"%{query}%" if len(query) >= INFIX_MIN_CHARS else f"{query}%"))
+        if rank == "frequency":
+            stmt = stmt.group_by(column).order_by(func.count().desc(), column)
+        else:
+            stmt = stmt.group_by(column).order_by(column)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        result = await db.execute(stmt)
+        return result.scalars().all()
+
+    @staticmethod
+    def _spellings(field: str, value: str) -> List[str]:
+        """
+        value plus every stored spelling of it that differs only in Arabic variants
+        (أ/إ/آ/ا, ة/ه, ى/ي, tatweel, diacritics) or case, for an exact IN filter instead
+        of normalizing the column in SQL. These columns are nvarchar(max), so the filter
+        is not an index seek; it just avoids a function per row. Just [value] while the
+        autocomplete index is not loaded.
+        """
+        if field not in AUTOCOMPLETE_FIELDS or not autocomplete_index.ready():
+            return [value]
+        spellings = autocomplete_index.variants(field, value)
+        if value not in spellings:
+            # Written by another worker since the last reload
+            spellings.append(value)
+        return spellings
+
+    @staticmethod
+    async def getAllBooksNo(db: AsyncSession, search: str = "", limit: Optional[int] = None, rank: str = "alpha"):
             print("getAllBooksNo ... method")
-            stmt = (
-                select(BookFollowUpTable.bookNo)
-                .group_by(BookFollowUpTable.bookNo)
-                .order_by(BookFollowUpTable.bookNo)
-            )
-            result = await db.execute(stmt)
-            return result.scalars().all()
+            return await BookFollowUpService._autocomplete(db, "bookNo", search, limit, rank)
 
     
     
     @staticmethod
-    async def getAllIncomingNo(db: AsyncSession):
-        stmt = (
-            select(BookFollowUpTable.incomingNo)
-            .where(BookFollowUpTable.incomingNo.isnot(None))   ## only return non-null incomingNo values
-            .group_by(BookFollowUpTable.incomingNo)
-            .order_by(BookFollowUpTable.incomingNo)
-        )
-        result = await db.execute(stmt)
-        return result.scalars().all()
+    async def getAllIncomingNo(db: AsyncSession, search: str = "", limit: Optional[int] = None, rank: str = "alpha"):
+        ## only returns non-null incomingNo values
+        return await BookFollowUpService._autocomplete(db, "incomingNo", search, limit, rank)
     
 
 
     @staticmethod
-    async def searchDirectoryNames(db: AsyncSession, query: str = ""):
-        stmt = (
-            select(BookFollowUpTable.directoryName)
-            .where(BookFollowUpTable.directoryName.isnot(None))
-            .where(BookFollowUpTable.directoryName.ilike(f"%{query}%"))
-            .distinct()
-            .order_by(BookFollowUpTable.directoryName)
-        )
-        result = await db.execute(stmt)
-        return result.scalars().all()
+    async def searchDirectoryNames(db: AsyncSession, query: str = "", limit: Optional[int] = None, rank: str = "alpha"):
+        return await BookFollowUpService._autocomplete(db, "directoryName", query, limit, rank)
     
 
 
     @staticmethod
-    async def getSubjects(db: AsyncSession, query: str = ""):
-        stmt = (
-            select(BookFollowUpTable.subject)
-            .where(BookFollowUpTable.subject.isnot(None))
-            .where(BookFollowUpTable.subject.ilike(f"%{query}%"))
-            .distinct()
-            .order_by(BookFollowUpTable.subject)
-        )
-        result = await db.execute(stmt)
-        return result.scalars().all()
+    async def getSubjects(db: AsyncSession, query: str = "", limit: Optional[int] = None, rank: str = "alpha"):
+        return await BookFollowUpService._autocomplete(db, "subject", query, limit, rank)
     
 
 
     @staticmethod
-    async def getDestination(db: AsyncSession, query: str = ""):
-        stmt = (
-            select(BookFollowUpTable.destination)
-            .where(BookFollowUpTable.destination.isnot(None))
-            .where(BookFollowUpTable.destination.ilike(f"%{query}%"))
-            .distinct()
-            .order_by(BookFollowUpTable.destination)
-        )
-        result = await db.execute(stmt)
-        return result.scalars().all()
+    async def getDestination(db: AsyncSession, query: str = "", limit: Optional[int] = None, rank: str = "alpha"):
+        return await BookFollowUpService._autocomplete(db, "destination", query, limit, rank)
 
     #http://127.0.0.1:9000/api/bookFollowUp/getAllDirectoryNames?search=مكتب
     #http://127.0.0.1:9000/api/bookFollowUp/getAllIncomingNo
@@ -331,43 +444,70 @@ class BookFollowUpService:
         directoryName: Optional[str] = None,
         subject: Optional[str] = None,
         incomingNo: Optional[str] = None,
+        cursor: Optional[str] = None,
+        includeTotal: str = "exact",
     ) -> Dict[str, Any]:
         """
         Retrieve all BookFollowUpTable records with pagination, optional filters, and associated PDFs.
         Updated for new multi-department schema with junctions and bridges.
+
+        When cursor is None the classic page/limit (OFFSET) mode is used.
+        When cursor is given (empty string for the first page) keyset mode is used:
+        rows are ordered by (currentDate DESC, id DESC) and the next page is found with
+        a WHERE predicate on the last served row, so every page costs the same.
+
+        includeTotal controls the total count: "exact" (cached for a short TTL),
+        "approximate" (cached count up to COUNT_CACHE_APPROX_MAX_AGE_SEC old, else exact)
+        or "false" (skipped, hasMore instead).
         """
         try:
-            # Optional filters
-            filters = []
-            if bookNo:
-                filters.append(BookFollowUpTable.bookNo == bookNo.strip())
-            if bookStatus:
-                filters.append(BookFollowUpTable.bookStatus == bookStatus.strip().lower())
-            if bookType:
-                filters.append(BookFollowUpTable.bookType == bookType.strip())
-            if directoryName:
-                filters.append(BookFollowUpTable.directoryName == directoryName.strip())
-            if subject:
-                filters.append(BookFollowUpTable.subject == subject.strip())
-            if incomingNo:
-                filters.append(BookFollowUpTable.incomingNo == incomingNo.strip())
-
-            # Step 1: Count distinct bookNo
+            # Optional filters (normalized values are also the count cache key)
+            filter_values = {
+                "bookNo": bookNo.strip() if bookNo else None,
+                "bookStatus": bookStatus.strip().lower() if bookStatus else None,
+                "bookType": bookType.strip() if bookType else None,
+                "directoryName": directoryName.strip() if directoryName else None,
+                "subject": subject.strip() if subject else None,
+                "incomingNo": incomingNo.strip() if incomingNo else None,
+            }
+            # Each filter matches every spelling variant of the value
+            filter_spellings = {
+                column: BookFollowUpService._spellings(column, value)
+                for column, value in filter_values.items()
+                if value
+            }
+            filters = [
+                getattr(BookFollowUpTable, column) == spellings[0] if len(spellings) == 1
+                else getattr(BookFollowUpTable, column).in_(spellings)
+                for column, spellings in filter_spellings.items()
+            ]
+
+            if settings.BOOK_LIST_ENGINE.lower() == "json":
+                return await BookFollowUpService._getAllFilteredBooksNoJson(
+                    db, filter_values, filter_spellings, page, limit, cursor, includeTotal
+                )
+
+            # Step 1: Count distinct bookNo (served from the count cache when possible)
             count_stmt = select(func.count()).select_from(
                 select(BookFollowUpTable.bookNo)
                 .distinct()
                 .filter(*filters)
                 .subquery()
             )
-            count_result = await db.execute(count_stmt)
-            total = count_result.scalar() or 0
+            total = await resolve_total(db, includeTotal, count_cache_key("getAll", filter_values), count_stmt)
             logger.info(f"Total records: {total}, Page: {page}, Limit: {limit}")
 
-            # Step 2: Pagination offset
-            offset = (page - 1) * limit
+            # Step 2: Pagination offset (keyset mode takes it from the cursor)
+            keyset_mode = cursor is not None
+            last_date, last_id = None, None
+            if keyset_mode and cursor:
+                last_date, last_id, offset = decode_cursor(cursor)
+            elif keyset_mode:
+                offset = 0
+            else:
+                offset = (page - 1) * limit
 
-            # Step 3: Complex query to get book with ALL associated departments
-            # Using CTE to get books with their primary junction info, then collect all departments
+            # Step 3: Book columns only; committee/department names come from the reference cache
             book_with_primary_junction = (
                 select(
                     BookFollowUpTable.id,
@@ -385,154 +525,322 @@ class BookFollowUpService:
                     BookFollowUpTable.notes,
                     BookFollowUpTable.currentDate,
                     BookFollowUpTable.userID,
-                    Users.username,
-                    # Get primary committee and department from junctionID
-                    Committee.coID,
-                    Committee.Com,
-                    Department.deID.label('primary_deID'),
-                    Department.departmentName.label('primary_departmentName')
+                    Users.username
                 )
                 .outerjoin(Users, BookFollowUpTable.userID == Users.id)
-                .outerjoin(
-                    CommitteeDepartmentsJunction, 
-                    BookFollowUpTable.junctionID == CommitteeDepartmentsJunction.id
-                )
-                .outerjoin(Committee, CommitteeDepartmentsJunction.coID == Committee.coID)
-                .outerjoin(Department, CommitteeDepartmentsJunction.deID == Department.deID)
                 .filter(*filters)
-                .distinct(BookFollowUpTable.bookNo)
-                .order_by(BookFollowUpTable.currentDate.desc())
-                .offset(offset)
-                .limit(limit)
             )
-            
-            book_result = await db.execute(book_with_primary_junction)
-            book_rows = book_result.fetchall()
 
-            # Step 4: Get ALL departments for each book through bridge records
-            book_ids = [row.id for row in book_rows]
-            if book_ids:
-                # Query to get all departments for each book
-                all_departments_stmt = (
-                    select(
-                        BookFollowUpTable.id.label('book_id'),
-                        BookFollowUpTable.bookNo,
-                        Department.deID,
-                        Department.departmentName,
-                        Committee.coID,
-                        Committee.Com
+            if keyset_mode:
+                # No DISTINCT here: id is unique and the junction join is many-to-one, and
+                # leaving it out lets SQL Server walk the (currentDate, id) index backwards
+                # with TOP (limit + 1) instead of sorting the whole filtered set.
+                if last_id is not None:
+                    book_with_primary_junction = book_with_primary_junction.filter(
+                        BookFollowUpService._keyset_after(last_date, last_id)
                     )
-                    .select_from(BookFollowUpTable)
-                    .join(BookJunctionBridge, BookFollowUpTable.id == BookJunctionBridge.bookID)
-                    .join(CommitteeDepartmentsJunction, BookJunctionBridge.junctionID == CommitteeDepartmentsJunction.id)
-                    .join(Committee, CommitteeDepartmentsJunction.coID == Committee.coID)
-                    .join(Department, CommitteeDepartmentsJunction.deID == Department.deID)
-                    .filter(BookFollowUpTable.id.in_(book_ids))
-                    .order_by(BookFollowUpTable.id, Department.departmentName)
+                book_with_primary_junction = (
+                    book_with_primary_junction
+                    .order_by(BookFollowUpTable.currentDate.desc(), BookFollowUpTable.id.desc())
+                    .limit(limit + 1)  # one extra row tells us whether there is a next page
                 )
-                
-                dept_result = await db.execute(all_departments_stmt)
-                dept_rows = dept_result.fetchall()
-                
-                # Group departments by book_id
-                dept_map = {}
-                for dept in dept_rows:
-                    if dept.book_id not in dept_map:
-                        dept_map[dept.book_id] = []
-                    dept_map[dept.book_id].append({
-                        "deID": dept.deID,
-                        "departmentName": dept.departmentName,
-                        "coID": dept.coID,
-                        "Com": dept.Com
-                    })
             else:
-                dept_map = {}
+                book_with_primary_junction = (
+                    book_with_primary_junction
+                    .distinct(BookFollowUpTable.bookNo)
+                    .order_by(BookFollowUpTable.currentDate.desc())
+                    .offset(offset)
+                    .limit(limit if total is not None else limit + 1)
+                )
+            
+            book_result = await db.execute(book_with_primary_junction)
+            book_rows = book_result.fetchall()
+
+            next_cursor = None
+            has_more = len(book_rows) > limit
+            book_rows = book_rows[:limit]
+            if keyset_mode:
+                if has_more:
+                    last_row = book_rows[-1]
+                    next_cursor = encode_cursor(last_row.currentDate, last_row.id, offset + len(book_rows))
+
+            # Step 4: Primary junction and ALL departments of each book (bridge table + cache)
+            primary_map = await reference_cache.resolve_junctions(db, [row.junctionID for row in book_rows])
+            dept_map = await reference_cache.departments_for_books(db, [row.id for row in book_rows])
 
             # Step 5: Fetch PDFs for all bookNos in the current page
-            book_nos = [row.bookNo for row in book_rows]
-            if book_nos:
-                pdf_stmt = (
-                    select(
-                        PDFTable.id,
-                        PDFTable.bookNo,
-                        PDFTable.pdf,
-                        PDFTable.currentDate,
-                        Users.username
-                    )
-                    .outerjoin(Users, PDFTable.userID == Users.id)
-                    .filter(PDFTable.bookNo.in_(book_nos))
-                )
-                pdf_result = await db.execute(pdf_stmt)
-                pdf_rows = pdf_result.fetchall()
-
-                # Group PDFs by bookNo
-                pdf_map = {}
-                for pdf in pdf_rows:
-                    if pdf.bookNo not in pdf_map:
-                        pdf_map[pdf.bookNo] = []
-                    pdf_map[pdf.bookNo].append({
-                        "id": pdf.id,
-                        "pdf": pdf.pdf,
-                        "currentDate": pdf.currentDate.strftime('%Y-%m-%d') if pdf.currentDate else None,
-                        "username": pdf.username
-                    })
-            else:
-                pdf_map = {}
+            pdf_map = await BookFollowUpService._pdfs_by_book_no(db, [row.bookNo for row in book_rows])
 
             # Step 6: Format data with multiple departments
-            data = []
-            for i, row in enumerate(book_rows):
-                book_departments = dept_map.get(row.id, [])
-                
-                # Create department summary strings
-                dept_names = [dept["departmentName"] for dept in book_departments if dept["departmentName"]]
-                dept_ids = [dept["deID"] for dept in book_departments]
-                
-                data.append({
-                    "serialNo": offset + i + 1,
-                    "id": row.id,
-                    "bookType": row.bookType,
-                    "bookNo": row.bookNo,
-                    "bookDate": row.bookDate.strftime('%Y-%m-%d') if row.bookDate else None,
-                    "directoryName": row.directoryName,
-                    "incomingNo": row.incomingNo,
-                    "incomingDate": row.incomingDate.strftime('%Y-%m-%d') if row.incomingDate else None,
-                    "subject": row.subject,
-                    "bookAction": row.bookAction,
-                    "bookStatus": row.bookStatus.strip().lower() if row.bookStatus else None,
-                    "notes": row.notes,
-                    "currentDate": row.currentDate.strftime('%Y-%m-%d') if row.currentDate else None,
-                    "userID": row.userID,
-                    "username": row.username,
-                    
-                    # Primary junction info (for backward compatibility)
-                    "deID": row.primary_deID,
-                    "departmentName": row.primary_departmentName,
-                    "coID": row.coID,
-                    "Com": row.Com,
-                    
-                    # All departments for this book
-                    "all_departments": book_departments,
-                    "department_names": ", ".join(dept_names),  # Comma-separated string
-                    "department_count": len(book_departments),
-                    
-                    "pdfFiles": pdf_map.get(row.bookNo, [])
-                })
+            data = [
+                BookFollowUpService._format_list_row(
+                    row, offset + i + 1,
+                    primary_map.get(row.junctionID, EMPTY_JUNCTION),
+                    dept_map.get(row.id, []),
+                    pdf_map.get(row.bookNo, [])
+                )
+                for i, row in enumerate(book_rows)
+            ]
 
             logger.info(f"Fetched {len(data)} records with PDFs and departments")
 
             # Step 7: Response
-            return {
+            response = {
                 "data": data,
                 "total": total,
                 "page": page,
                 "limit": limit,
-                "totalPages": (total + limit - 1) // limit
+                "totalPages": (total + limit - 1) // limit if total is not None else None
             }
+            if total is None:
+                response["hasMore"] = has_more
+            if keyset_mode:
+                response["page"] = None
+                response["nextCursor"] = next_cursor
+                response["hasMore"] = next_cursor is not None
+            return response
             
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error fetching books: {str(e)}", exc_info=True)
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    @staticmethod
+    async def _pdfs_by_book_no(db: AsyncSession, book_nos: List[str]) -> Dict[str, List[dict]]:
+        """PDF list entries of the given bookNos, grouped by bookNo (one query)."""
+        if not book_nos:
+            return {}
+        pdf_stmt = (
+            select(
+                PDFTable.id,
+                PDFTable.bookNo,
+                PDFTable.pdf,
+                PDFTable.currentDate,
+                Users.username
+            )
+            .outerjoin(Users, PDFTable.userID == Users.id)
+            .filter(PDFTable.bookNo.in_(book_nos))
+        )
+        pdf_result = await db.execute(pdf_stmt)
+
+        # Group PDFs by bookNo
+        pdf_map = {}
+        for pdf in pdf_result.fetchall():
+            if pdf.bookNo not in pdf_map:
+                pdf_map[pdf.bookNo] = []
+            pdf_map[pdf.bookNo].append({
+                "id": pdf.id,
+                "pdf": pdf.pdf,
+                "currentDate": pdf.currentDate.strftime('%Y-%m-%d') if pdf.currentDate else None,
+                "username": pdf.username
+            })
+        return pdf_map
+
+    @staticmethod
+    def _keyset_after(last_date: Optional[date], last_id: int):
+        """
+        WHERE predicate for rows that come after (last_date, last_id) in
+        ORDER BY currentDate DESC, id DESC. SQL Server sorts NULLs last in DESC order.
+        """
+        if last_date is None:
+            return and_(BookFollowUpTable.currentDate.is_(None), BookFollowUpTable.id < last_id)
+        return or_(
+            BookFollowUpTable.currentDate < last_date,
+            and_(BookFollowUpTable.currentDate == last_date, BookFollowUpTable.id < last_id),
+            BookFollowUpTable.currentDate.is_(None),
+        )
+
+    @staticmethod
+    def _format_list_row(
+        row, serial_no: int, primary: JunctionRef, book_departments: List[dict], pdf_files: List[dict]
+    ) -> Dict[str, Any]:
+        """Shape one /getAll row; shared by the multi-query and JSON engines."""
+        # Create department summary strings
+        dept_names = [dept["departmentName"] for dept in book_departments if dept["departmentName"]]
+
+        return {
+            "serialNo": serial_no,
+            "id": row.id,
+            "bookType": row.bookType,
+            "bookNo": row.bookNo,
+            "bookDate": row.bookDate.strftime('%Y-%m-%d') if row.bookDate else None,
+            "directoryName": row.directoryName,
+            "incomingNo": row.incomingNo,
+            "incomingDate": row.incomingDate.strftime('%Y-%m-%d') if row.incomingDate else None,
+            "subject": row.subject,
+            "bookAction": row.bookAction,
+            "bookStatus": row.bookStatus.strip().lower() if row.bookStatus else None,
+            "notes": row.notes,
+            "currentDate": row.currentDate.strftime('%Y-%m-%d') if row.currentDate else None,
+            "userID": row.userID,
+            "username": row.username,
+
+            # Primary junction info (for backward compatibility)
+            "deID": primary.deID,
+            "departmentName": primary.departmentName,
+            "coID": primary.coID,
+            "Com": primary.Com,
+
+            # All departments for this book
+            "all_departments": book_departments,
+            "department_names": ", ".join(dept_names),  # Comma-separated string
+            "department_count": len(book_departments),
+
+            "pdfFiles": pdf_files
+        }
+
+    @staticmethod
+    async def _getAllFilteredBooksNoJson(
+        db: AsyncSession,
+        filter_values: Dict[str, Optional[str]],
+        filter_spellings: Dict[str, List[str]],
+        page: int,
+        limit: int,
+        cursor: Optional[str],
+        includeTotal: str,
+    ) -> Dict[str, Any]:
+        """
+        Single round-trip variant of getAllFilteredBooksNo (BOOK_LIST_ENGINE=json).
+        Departments and PDFs come back nested as FOR JSON PATH columns, and the total
+        (when it is needed and not cached) is an uncorrelated scalar subquery of the
+        same statement. Same response shape as the multi-query engine.
+        """
+        params: Dict[str, Any] = {}
+        where_outer = []
+        where_count = []
+        for column, spellings in filter_spellings.items():
+            # column names come from the fixed filter_values keys, values are bound
+            names = []
+            for position, spelling in enumerate(spellings):
+                params[f"f_{column}_{position}"] = spelling
+                names.append(f":f_{column}_{position}")
+            where_outer.append(f"b.[{column}] IN ({', '.join(names)})")
+            where_count.append(f"[{column}] IN ({', '.join(names)})")
+
+        # Total: cached value, nothing, or computed inside the statement
+        count_key = count_cache_key("getAll", filter_values)
+        total = cached_total(includeTotal, count_key)
+        need_count = includeTotal != "false" and total is None
+        count_sql = ""
+        if need_count:
+            count_where = f"WHERE {' AND '.join(where_count)}" if where_count else ""
+            count_sql = f""",
+                (SELECT COUNT(*) FROM (
+                    SELECT DISTINCT bookNo FROM bookFollowUpTable {count_where}
+                ) AS distinct_books) AS total_count"""
+
+        # Pagination: keyset predicate or OFFSET
+        keyset_mode = cursor is not None
+        if keyset_mode and cursor:
+            last_date, last_id, offset = decode_cursor(cursor)
+            params["last_id"] = last_id
+            if last_date is None:
+                where_outer.append("(b.currentDate IS NULL AND b.id < :last_id)")
+            else:
+                params["last_date"] = last_date
+                where_outer.append(
+                    "(b.currentDate < :last_date"
+                    " OR (b.currentDate = :last_date AND b.id < :last_id)"
+                    " OR b.currentDate IS NULL)"
+                )
+            params["skip"] = 0
+        elif keyset_mode:
+            offset = 0
+            params["skip"] = 0
+        else:
+            offset = (page - 1) * limit
+            params["skip"] = offset
+        params["take"] = limit + 1  # one extra row tells us whether there is a next page
+
+        where_sql = f"WHERE {' AND '.join(where_outer)}" if where_outer else ""
+
+        query = text(f"""
+            SELECT
+                b.id, b.bookType, b.bookNo, b.bookDate, b.directoryName, b.junctionID,
+                b.incomingNo, b.incomingDate, b.subject, b.destination, b.bookAction,
+                b.bookStatus, b.notes, b.currentDate, b.userID,
+                u.username,
+                c.coID, c.Com,
+                d.deID AS primary_deID,
+                d.departmentName AS primary_departmentName,
+                (
+                    SELECT ad.deID, ad.departmentName, ac.coID, ac.Com
+                    FROM book_junction_bridge br
+                    INNER JOIN committee_departments_junction aj ON br.junctionID = aj.id
+                    INNER JOIN committees ac ON aj.coID = ac.coID
+                    INNER JOIN departments ad ON aj.deID = ad.deID
+                    WHERE br.bookID = b.id
+                    ORDER BY ad.departmentName
+                    FOR JSON PATH, INCLUDE_NULL_VALUES
+                ) AS departments_json,
+                (
+                    SELECT p.id, p.pdf, CONVERT(varchar(10), p.currentDate, 23) AS currentDate, pu.username
+                    FROM PDFTable p
+                    LEFT JOIN users pu ON p.userID = pu.id
+                    WHERE p.bookNo = b.bookNo
+                    FOR JSON PATH, INCLUDE_NULL_VALUES
+                ) AS pdfs_json{count_sql}
+            FROM bookFollowUpTable b
+            LEFT JOIN users u ON b.userID = u.id
+            LEFT JOIN committee_departments_junction j ON b.junctionID = j.id
+            LEFT JOIN committees c ON j.coID = c.coID
+            LEFT JOIN departments d ON j.deID = d.deID
+            {where_sql}
+            ORDER BY b.currentDate DESC, b.id DESC
+            OFFSET :skip ROWS FETCH NEXT :take ROWS ONLY
+        """)
+
+        result = await db.execute(query, params)
+        rows = result.fetchall()
+
+        if need_count:
+            if rows:
+                total = rows[0].total_count or 0
+                store_total(count_key, total)
+            else:
+                # Past the last page there is no row to carry the count
+                total = await resolve_total(
+                    db, includeTotal, count_key,
+                    text(f"SELECT COUNT(*) FROM (SELECT DISTINCT bookNo FROM bookFollowUpTable "
+                         f"{'WHERE ' + ' AND '.join(where_count) if where_count else ''}) AS distinct_books")
+                    .bindparams(**{k: v for k, v in params.items() if k.startswith("f_")})
+                )
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        data = [
+            BookFollowUpService._format_list_row(
+                row,
+                offset + i + 1,
+                JunctionRef(row.coID, row.Com, row.primary_deID, row.primary_departmentName),
+                json.loads(row.departments_json) if row.departments_json else [],
+                json.loads(row.pdfs_json) if row.pdfs_json else [],
+            )
+            for i, row in enumerate(rows)
+        ]
+        logger.info(f"Fetched {len(data)} records with PDFs and departments (json engine)")
+
+        response = {
+            "data": data,
+            "total": total,
+            "page": page,
+            "limit": limit,
+            "totalPages": (total + limit - 1) // limit if total is not None else None
+        }
+        if total is None:
+            response["hasMore"] = has_more
+        if keyset_mode:
+            last_row = rows[-1] if rows else None
+            next_cursor = (
+                encode_cursor(last_row.currentDate, last_row.id, offset + len(rows))
+                if has_more and last_row is not None else None
+            )
+            response["page"] = None
+            response["nextCursor"] = next_cursor
+            response["hasMore"] = next_cursor is not None
+        return response
     
  
 
@@ -570,8 +878,10 @@ class BookFollowUpService:
         """
         try:
             # Step 1: Fetch the existing book
+            # UPDLOCK: concurrent updates of the book wait here, so each one reads the
+            # counters state the previous one committed
             result = await db.execute(
-                select(BookFollowUpTable).filter(BookFollowUpTable.id == id)
+                select(BookFollowUpTable).filter(BookFollowUpTable.id == id).with_for_update()
             )
             book = result.scalars().first()
             if not book:
@@ -579,6 +889,7 @@ class BookFollowUpService:
                 raise HTTPException(status_code=404, detail="Book not found")
 
             logger.info(f"Updating book ID {id} with multi-department support")
+            counters_before = await stored_counter_state(db, book)
 
             # Step 2: Handle multi-department junction updates if provided
             junction_ids = []
@@ -587,11 +898,10 @@ class BookFollowUpService:
             if committee_id and department_ids:
                 logger.info(f"Updating multi-department assignment: Committee {committee_id} with departments {department_ids}")
                 
-                # Create/get junctions for each committee-department pair
-                for dept_id in department_ids:
-                    junction_id = await BookFollowUpService.get_or_create_junction(db, committee_id, dept_id)
-                    junction_ids.append(junction_id)
-                    logger.info(f"Junction ID for Committee {committee_id} + Department {dept_id}: {junction_id}")
+                # Create/get junctions for all committee-department pairs in one batch
+                junction_map = await BookFollowUpService.get_or_create_junctions(db, committee_id, department_ids)
+                junction_ids = [junction_map[dept_id] for dept_id in department_ids]
+                logger.info(f"Junction IDs for Committee {committee_id} + Departments {department_ids}: {junction_ids}")
 
                 # Update book's primary junction to the first one
                 if junction_ids:
@@ -604,11 +914,10 @@ class BookFollowUpService:
                 )
                 logger.info(f"Cleared existing bridge records for book {id}")
 
-                # Create new bridge records for all junctions
-                for junction_id in junction_ids:
-                    bridge_id = await BookFollowUpService.create_book_junction_bridge(db, id, junction_id)
-                    bridge_ids.append(bridge_id)
-                    logger.info(f"Created bridge record {bridge_id} for book {id} and junction {junction_id}")
+                # Create new bridge records for all junctions in one statement
+                bridge_map = await BookFollowUpService.create_book_junction_bridges(db, id, junction_ids)
+                bridge_ids = [bridge_map[junction_id] for junction_id in junction_ids]
+                logger.info(f"Created bridge records {bridge_ids} for book {id} and junctions {junction_ids}")
 
             # Step 3: Update book fields, excluding unset values
             update_data = book_data.model_dump(exclude_unset=True)
@@ -633,6 +942,7 @@ class BookFollowUpService:
 
             # Step 4: Handle PDF upload if file is provided
             pdf_added = False
+            new_pdf = None
             if file is not None and hasattr(file, 'filename') and file.filename:
                 logger.info(f"Processing file upload: {file.filename}")
                 
@@ -643,18 +953,21 @@ class BookFollowUpService:
                 
                 try:
                     count = await PDFService.get_pdf_count(db, id)
-                    pdf_path = save_pdf_to_server(
+                    saved = await save_upload_to_server(
                         file.file, book.bookNo, book.bookDate, count, settings.PDF_UPLOAD_PATH
                     )
+                    pdf_path = saved.path
                     pdf_data = PDFCreate(
                         bookID=id,
                         bookNo=book.bookNo,
                         countPdf=count,
                         pdf=pdf_path,
+                        sha256=saved.sha256,
+                        fileName=saved.file_name,
                         userID=user_id,
                         currentDate=datetime.now().date().isoformat()
                     )
-                    await PDFService.insert_pdf(db, pdf_data)
+                    new_pdf = await PDFService.insert_pdf(db, pdf_data, commit=False)
                     logger.info(f"Successfully saved PDF for book ID {id}")
                     pdf_added = True
 
@@ -673,8 +986,17 @@ class BookFollowUpService:
             else:
                 logger.info(f"No file provided for book ID {id}, updating only book fields")
 
-            # Step 5: Commit all changes
+            # Step 5: Commit all changes (book_counters in the same transaction)
+            if counters_before is not None:
+                departments = await junction_departments(db, junction_ids) if junction_ids else counters_before.departments
+                await apply_counter_change(db, counters_before, counter_state(book, departments))
             await db.commit()
+            if new_pdf is not None:
+                await PDFService.pdf_committed(new_pdf)
+            if bridge_ids:
+                # Department changes alone touch only the bridge table, which publishes no book event
+                dashboard_summary.invalidate()
+                late_books_snapshot.departments_changed(id)
             await db.refresh(book)
             logger.info(f"Successfully updated book ID {id} with {len(junction_ids)} junctions and {len(bridge_ids)} bridges")
 
@@ -727,13 +1049,16 @@ class BookFollowUpService:
         """
         try:
             # Fetch the existing book
+            # UPDLOCK: concurrent updates of the book wait here, so each one reads the
+            # counters state the previous one committed
             result = await db.execute(
-                select(BookFollowUpTable).filter(BookFollowUpTable.id == id)
+                select(BookFollowUpTable).filter(BookFollowUpTable.id == id).with_for_update()
             )
             book = result.scalars().first()
             if not book:
                 logger.error(f"Book ID {id} not found")
                 raise HTTPException(status_code=404, detail="Book not found")
+            counters_before = await stored_counter_state(db, book)
 
             # Update fields, excluding unset values
             update_data = book_data.model_dump(exclude_unset=True)
@@ -742,6 +1067,8 @@ class BookFollowUpService:
                 if value is not None:  # Skip None values
                     setattr(book, key, value)
             
+            new_pdf = None
+
             # Set currentDate as string
             # book.currentDate = datetime.now().date().strftime('%Y-%m-%d')
 
@@ -756,18 +1083,21 @@ class BookFollowUpService:
                 
                 try:
                     count = await PDFService.get_pdf_count(db, id)
-                    pdf_path = save_pdf_to_server(
+                    saved = await save_upload_to_server(
                         file.file, book.bookNo, book.bookDate, count, settings.PDF_UPLOAD_PATH
                     )
+                    pdf_path = saved.path
                     pdf_data = PDFCreate(
                         bookID=id,
                         bookNo=book.bookNo,
                         countPdf=count,
                         pdf=pdf_path,
+                        sha256=saved.sha256,
+                        fileName=saved.file_name,
                         userID=user_id,
                         currentDate=datetime.now().date().strftime('%Y-%m-%d')
                     )
-                    await PDFService.insert_pdf(db, pdf_data)
+                    new_pdf = await PDFService.insert_pdf(db, pdf_data, commit=False)
                     logger.info(f"Successfully saved PDF for book ID {id}")
 
                     # Delete original file (with delay)
@@ -788,8 +1118,12 @@ class BookFollowUpService:
             else:
                 logger.info(f"No file provided for book ID {id}, updating only book fields")
 
-            # Commit changes
+            # Commit changes (book_counters in the same transaction)
+            if counters_before is not None:
+                await apply_counter_change(db, counters_before, counter_state(book, counters_before.departments))
             await db.commit()
+            if new_pdf is not None:
+                await PDFService.pdf_committed(new_pdf)
             await db.refresh(book)
             logger.info(f"Successfully updated book ID {id}")
             return book.id
@@ -818,21 +1152,10 @@ class BookFollowUpService:
             HTTPException: If book not found or database error occurs.
         """
         try:
-            # Step 1: Fetch main book data with primary junction info
+            # Step 1: Fetch main book data (committee/department names come from the reference cache)
             book_query = select(
                 BookFollowUpTable,
-                Committee.coID,
-                Committee.Com,
-                Department.deID,
-                Department.departmentName,
                 Users.username.label('book_username')
-            ).outerjoin(
-                CommitteeDepartmentsJunction, 
-                BookFollowUpTable.junctionID == CommitteeDepartmentsJunction.id
-            ).outerjoin(
-                Committee, CommitteeDepartmentsJunction.coID == Committee.coID
-            ).outerjoin(
-                Department, CommitteeDepartmentsJunction.deID == Department.deID
             ).outerjoin(
                 Users, BookFollowUpTable.userID == Users.id
             ).filter(BookFollowUpTable.id == id)
@@ -845,40 +1168,17 @@ class BookFollowUpService:
                 raise HTTPException(status_code=404, detail="Book not found")
 
             book = book_row[0]
-            primary_committee = book_row[1]  # coID
-            primary_committee_name = book_row[2]  # Com
-            primary_department = book_row[3]  # deID
-            primary_department_name = book_row[4]  # departmentName
-            book_username = book_row[5]
+            book_username = book_row[1]
+            primary = (await reference_cache.resolve_junctions(db, [book.junctionID])).get(
+                book.junctionID, EMPTY_JUNCTION
+            )
+            primary_committee = primary.coID
+            primary_committee_name = primary.Com
+            primary_department = primary.deID
+            primary_department_name = primary.departmentName
 
             # Step 2: Get ALL departments for this book through bridge records
-            all_departments_query = select(
-                Department.deID,
-                Department.departmentName,
-                Committee.coID,
-                Committee.Com
-            ).select_from(BookFollowUpTable).join(
-                BookJunctionBridge, BookFollowUpTable.id == BookJunctionBridge.bookID
-            ).join(
-                CommitteeDepartmentsJunction, BookJunctionBridge.junctionID == CommitteeDepartmentsJunction.id
-            ).join(
-                Committee, CommitteeDepartmentsJunction.coID == Committee.coID
-            ).join(
-                Department, CommitteeDepartmentsJunction.deID == Department.deID
-            ).filter(BookFollowUpTable.id == id).order_by(Department.departmentName)
-
-            dept_result = await db.execute(all_departments_query)
-            dept_rows = dept_result.fetchall()
-
-            # Process all departments
-            all_departments = []
-            for dept_row in dept_rows:
-                all_departments.append({
-                    "deID": dept_row[0],
-                    "departmentName": dept_row[1],
-                    "coID": dept_row[2],
-                    "Com": dept_row[3]
-                })
+            all_departments = (await reference_cache.departments_for_books(db, [id])).get(id, [])
 
             # Create department summary
             dept_names = [dept["departmentName"] for dept in all_departments if dept["departmentName"]]
@@ -958,6 +1258,112 @@ class BookFollowUpService:
 
 
     
+    @staticmethod
+    def report_filters(
+        bookType: Optional[str] = None,
+        bookStatus: Optional[str] = None,
+        check: Optional[bool] = False,
+        startDate: Optional[str] = None,
+        endDate: Optional[str] = None
+    ) -> list:
+        """
+        WHERE clauses of /report and /report-with-stats (every output format).
+        check=True: currentDate between startDate and endDate; otherwise currentDate IS NULL.
+        Raises HTTPException(400) for missing or invalid dates.
+        """
+        filters = []
+        if bookType:
+            filters.append(BookFollowUpTable.bookType == bookType.strip())
+        if bookStatus:
+            filters.append(BookFollowUpTable.bookStatus == bookStatus.strip().lower())
+
+        if check:
+            if not startDate or not endDate:
+                logger.error("startDate and endDate are required when check is True")
+                raise HTTPException(status_code=400, detail="startDate and endDate are required when check is True")
+
+            try:
+                start_date = datetime.strptime(startDate, '%Y-%m-%d').date()
+                end_date = datetime.strptime(endDate, '%Y-%m-%d').date()
+            except ValueError as e:
+                logger.error(f"Invalid date format for startDate or endDate: {str(e)}")
+                raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+            if start_date > end_date:
+                logger.error("startDate cannot be after endDate")
+                raise HTTPException(status_code=400, detail="startDate cannot be after endDate")
+
+            filters.append(BookFollowUpTable.currentDate.isnot(None))
+            filters.append(BookFollowUpTable.currentDate.between(start_date, end_date))
+            logger.debug(f"Applying date range filter: {start_date} to {end_date}")
+        else:
+            filters.append(BookFollowUpTable.currentDate.is_(None))
+            logger.debug("Applying currentDate IS NULL filter")
+        return filters
+
+    @staticmethod
+    def report_stmt(filters: list):
+        """Book rows of the report ordered by bookNo (names resolved from the reference cache)."""
+        return (
+            select(
+                BookFollowUpTable.id,
+                BookFollowUpTable.bookType,
+                BookFollowUpTable.bookNo,
+                BookFollowUpTable.bookDate,
+                BookFollowUpTable.directoryName,
+                BookFollowUpTable.junctionID,
+                BookFollowUpTable.incomingNo,
+                BookFollowUpTable.incomingDate,
+                BookFollowUpTable.subject,
+                BookFollowUpTable.destination,
+                BookFollowUpTable.bookAction,
+                BookFollowUpTable.bookStatus,
+                BookFollowUpTable.notes,
+                BookFollowUpTable.currentDate,
+                BookFollowUpTable.userID,
+                Users.username
+            )
+            .outerjoin(Users, BookFollowUpTable.userID == Users.id)
+            .filter(*filters)
+            .order_by(BookFollowUpTable.bookNo)
+        )
+
+    @staticmethod
+    def report_record(row, serial_no: int, primary: JunctionRef, all_departments: List[dict]) -> Dict[str, Any]:
+        """One /report record (single committee, multiple departments)."""
+        # Create department summary
+        dept_names = [dept["departmentName"] for dept in all_departments if dept["departmentName"]]
+        department_names = ", ".join(dept_names) if dept_names else primary.departmentName
+
+        return {
+            "serialNo": serial_no,
+            "id": row.id,
+            "bookType": row.bookType,
+            "bookNo": row.bookNo,
+            "bookDate": row.bookDate.strftime('%Y-%m-%d') if row.bookDate else None,
+            "directoryName": row.directoryName,
+            "incomingNo": row.incomingNo,
+            "incomingDate": row.incomingDate.strftime('%Y-%m-%d') if row.incomingDate else None,
+            "subject": row.subject,
+            "destination": row.destination,
+            "bookAction": row.bookAction,
+            "bookStatus": row.bookStatus,
+            "notes": row.notes,
+            "currentDate": row.currentDate.strftime('%Y-%m-%d') if row.currentDate else None,
+            "userID": row.userID,
+            "username": row.username,
+
+            # Single committee info
+            "coID": primary.coID,
+            "Com": primary.Com,
+            "deID": str(primary.deID) if primary.deID else None,
+            "departmentName": primary.departmentName,
+
+            # Multi-department info (for single committee)
+            "all_departments": all_departments,
+            "department_names": department_names,
+            "department_count": len(all_departments),
+        }
+
     @staticmethod
     async def reportBookFollowUp(
         db: AsyncSession,
@@ -972,71 +1378,9 @@ class BookFollowUpService:
         Single committee with multiple departments per book.
         """
         try:
-            # Step 1: Build filters
-            filters = []
-            if bookType:
-                filters.append(BookFollowUpTable.bookType == bookType.strip())
-            if bookStatus:
-                filters.append(BookFollowUpTable.bookStatus == bookStatus.strip().lower())
-
-            # Step 2: Add date filter based on check
-            if check:
-                if not startDate or not endDate:
-                    logger.error("startDate and endDate are required when check is True")
-                    raise HTTPException(status_code=400, detail="startDate and endDate are required when check is True")
-                
-                try:
-                    start_date = datetime.strptime(startDate, '%Y-%m-%d').date()
-                    end_date = datetime.strptime(endDate, '%Y-%m-%d').date()
-                    if start_date > end_date:
-                        logger.error("startDate cannot be after endDate")
-                        raise HTTPException(status_code=400, detail="startDate cannot be after endDate")
-                    
-                    filters.append(BookFollowUpTable.currentDate.isnot(None))
-                    filters.append(BookFollowUpTable.currentDate.between(start_date, end_date))
-                    logger.debug(f"Applying date range filter: {start_date} to {end_date}")
-                except ValueError as e:
-                    logger.error(f"Invalid date format for startDate or endDate: {str(e)}")
-                    raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
-            else:
-                filters.append(BookFollowUpTable.currentDate.is_(None))
-                logger.debug("Applying currentDate IS NULL filter")
-
-            # Step 3: Fetch matching records with primary junction info
-            stmt = (
-                select(
-                    BookFollowUpTable.id,
-                    BookFollowUpTable.bookType,
-                    BookFollowUpTable.bookNo,
-                    BookFollowUpTable.bookDate,
-                    BookFollowUpTable.directoryName,
-                    BookFollowUpTable.junctionID,
-                    BookFollowUpTable.incomingNo,
-                    BookFollowUpTable.incomingDate,
-                    BookFollowUpTable.subject,
-                    BookFollowUpTable.destination,
-                    BookFollowUpTable.bookAction,
-                    BookFollowUpTable.bookStatus,
-                    BookFollowUpTable.notes,
-                    BookFollowUpTable.currentDate,
-                    BookFollowUpTable.userID,
-                    Users.username,
-                    # Primary committee and department from junction
-                    Committee.coID,
-                    Committee.Com,
-                    Department.deID,
-                    Department.departmentName
-                )
-                .outerjoin(Users, BookFollowUpTable.userID == Users.id)
-                .outerjoin(
-                    CommitteeDepartmentsJunction,
-                    BookFollowUpTable.junctionID == CommitteeDepartmentsJunction.id
-                )
-                .outerjoin(Committee, CommitteeDepartmentsJunction.coID == Committee.coID)
-                .outerjoin(Department, CommitteeDepartmentsJunction.deID == Department.deID)
-                .filter(*filters)
-                .order_by(BookFollowUpTable.bookNo)
-            )
+            # Steps 1-3: Filters and statement shared with the streamed formats
+            filters = BookFollowUpService.report_filters(bookType, bookStatus, check, startDate, endDate)
+            stmt = BookFollowUpService.report_stmt(filters)
 
             result = await db.execute(stmt)
             rows = result.fetchall()
@@ -1044,79 +1388,18 @@ class BookFollowUpService:
             # Step 4: Get book IDs for multi-department queries
             book_ids = [row.id for row in rows]
             
-            # Step 5: Get all departments for each book (single committee, multiple departments)
-            dept_map = {}
-            if book_ids:
-                dept_query = select(
-                    BookFollowUpTable.id.label('book_id'),
-                    Department.deID,
-                    Department.departmentName,
-                    Committee.coID,
-                    Committee.Com
-                ).select_from(BookFollowUpTable).join(
-                    BookJunctionBridge, BookFollowUpTable.id == BookJunctionBridge.bookID
-                ).join(
-                    CommitteeDepartmentsJunction, BookJunctionBridge.junctionID == CommitteeDepartmentsJunction.id
-                ).join(
-                    Committee, CommitteeDepartmentsJunction.coID == Committee.coID
-                ).join(
-                    Department, CommitteeDepartmentsJunction.deID == Department.deID
-                ).filter(BookFollowUpTable.id.in_(book_ids))
-                
-                dept_result = await db.execute(dept_query)
-                dept_rows = dept_result.fetchall()
-                
-                for dept_row in dept_rows:
-                    book_id = dept_row.book_id
-                    if book_id not in dept_map:
-                        dept_map[book_id] = []
-                    dept_map[book_id].append({
-                        "deID": dept_row.deID,
-                        "departmentName": dept_row.departmentName,
-                        "coID": dept_row.coID,
-                        "Com": dept_row.Com
-                    })
+            # Step 5: Primary junction and all departments of each book (single committee, multiple departments)
+            primary_map = await reference_cache.resolve_junctions(db, [row.junctionID for row in rows])
+            dept_map = await reference_cache.departments_for_books(db, book_ids)
 
             # Step 6: Format response with multi-department info (REMOVED multi-committee)
             response = []
             for idx, row in enumerate(rows):
-                all_departments = dept_map.get(row.id, [])
-                
-                # Create department summary
-                dept_names = [dept["departmentName"] for dept in all_departments if dept["departmentName"]]
-                department_names = ", ".join(dept_names) if dept_names else row.departmentName
-                
-                response.append({
-                    "serialNo": idx + 1,
-                    "id": row.id,
-                    "bookType": row.bookType,
-                    "bookNo": row.bookNo,
-                    "bookDate": row.bookDate.strftime('%Y-%m-%d') if row.bookDate else None,
-                    "directoryName": row.directoryName,
-                    "incomingNo": row.incomingNo,
-                    "incomingDate": row.incomingDate.strftime('%Y-%m-%d') if row.incomingDate else None,
-                    "subject": row.subject,
-                    "destination": row.destination,
-                    "bookAction": row.bookAction,
-                    "bookStatus": row.bookStatus,
-                    "notes": row.notes,
-                    "currentDate": row.currentDate.strftime('%Y-%m-%d') if row.currentDate else None,
-                    "userID": row.userID,
-                    "username": row.username,
-                    
-                    # Single committee info
-                    "coID": row.coID,
-                    "Com": row.Com,
-                    "deID": str(row.deID) if row.deID else None,
-                    "departmentName": row.departmentName,
-                    
-                    # Multi-department info (for single committee)
-                    "all_departments": all_departments,
-                    "department_names": department_names,
-                    "department_count": len(all_departments),
-                    
-                    "len": len(rows)
-                })
+                record = BookFollowUpService.report_record(
+                    row, idx + 1, primary_map.get(row.junctionID, EMPTY_JUNCTION), dept_map.get(row.id, [])
+                )
+                record["len"] = len(rows)
+                response.append(record)
 
             logger.info(f"Report generated: {len(response)} records")
             return response
@@ -1129,63 +1412,34 @@ class BookFollowUpService:
 
 #This means: if BookFollowUpTable.bookType equals 'خارجي', then return 1 (indicating a match). If not, it returns None by default
     @staticmethod
-    async def get_book_type_counts(db: AsyncSession) -> BookTypeCounts:
+    async def get_dashboard_summary(db: AsyncSession) -> DashboardSummary:
+        """All dashboard counts from the cached snapshot (one grouped query when stale)."""
         try:
-            query = select(
-                func.count(case((BookFollowUpTable.bookType == 'خارجي', 1))).label('External'),  #label is a way to assign a name to a column in the result set
-                func.count(case((BookFollowUpTable.bookType == 'داخلي', 1))).label('Internal'),  #case returns 1 if the condition is met (the bookType matches)
-                func.count(case((BookFollowUpTable.bookType == 'فاكس', 1))).label('Fax')         
-            )
-            result = await db.execute(query)
-            row:BookTypeCounts = result.first()
-            print(f"row get_book_type_counts {row}")
-            return BookTypeCounts(
-                External=row.External or 0, 
-                Internal=row.Internal or 0,
-                Fax=row.Fax or 0
-            )
+            return await dashboard_summary.get(db)
         except Exception as e:
-            print(f"Error in get_book_type_counts: {str(e)}")
-            raise HTTPException(status_code=500, detail="Error retrieving filtered BookTypeCounts")
-        
+            logger.error(f"Error building dashboard summary: {str(e)}", exc_info=True)
+            raise HTTPException(status_code=500, detail="Error retrieving dashboard summary")
+
+
+
+    @staticmethod
+    async def get_book_type_counts(db: AsyncSession) -> BookTypeCounts:
+        summary = await BookFollowUpService.get_dashboard_summary(db)
+        return summary.bookTypes
+
 
 
     @staticmethod
     async def get_book_status_counts(db: AsyncSession) -> BookStatusCounts:
-        try:
-            query = select(
-                func.count(case((BookFollowUpTable.bookStatus == 'منجز', 1))).label('Accomplished'),
-                func.count(case((BookFollowUpTable.bookStatus == 'قيد الانجاز', 1))).label('Pending'),
-                func.count(case((BookFollowUpTable.bookStatus == 'مداولة', 1))).label('Deliberation')
-            )
-            result = await db.execute(query)
-            row = result.first()
-            return BookStatusCounts(
-                Accomplished=row.Accomplished or 0,
-                Pending=row.Pending or 0,
-                Deliberation=row.Deliberation or 0
-            )
-        except Exception as e:
-            print(f"Error in get_book_status_counts: {str(e)}")
-            raise HTTPException(status_code=500, detail="Error retrieving filtered BookStatusCounts")
+        summary = await BookFollowUpService.get_dashboard_summary(db)
+        return summary.bookStatuses
 
 
 
     @staticmethod
     async def get_user_book_counts(db: AsyncSession) -> List[UserBookCount]:
-        try:
-            query = (
-                select(Users.username, func.count(BookFollowUpTable.id).label('bookCount'))
-                .join(Users, BookFollowUpTable.userID == Users.id)
-                .group_by(Users.username)
-                .order_by(func.count(BookFollowUpTable.id).desc())
-            )
-            result = await db.execute(query)
-            rows:UserBookCount = result.fetchall()
-            return [UserBookCount(username=row.username, bookCount=row.bookCount) for row in rows]
-        except Exception as e:
-            print(f"Error in get_user_book_counts: {str(e)}")
-            raise HTTPException(status_code=500, detail="Error retrieving filtered UserBookCount.")   
+        summary = await BookFollowUpService.get_dashboard_summary(db)
+        return summary.users
 
      
 
@@ -1208,28 +1462,20 @@ class BookFollowUpService:
                 .scalar_subquery()
             )
 
-            # Main query with junction support
+            # Main query (committee/department names come from the reference cache)
             base_query = (
                 select(
                     BookFollowUpTable,
                     Users.username,
-                    pdf_count_subquery.label("countOfPDFs"),
-                    Committee.coID,
-                    Committee.Com,
-                    Department.deID,
-                    Department.departmentName
+                    pdf_count_subquery.label("countOfPDFs")
                 )
                 .outerjoin(Users, BookFollowUpTable.userID == Users.id)
-                .outerjoin(
-                    CommitteeDepartmentsJunction,
-                    BookFollowUpTable.junctionID == CommitteeDepartmentsJunction.id
-                )
-                .outerjoin(Committee, CommitteeDepartmentsJunction.coID == Committee.coID)
-                .outerjoin(Department, CommitteeDepartmentsJunction.deID == Department.deID)
             )
 
-            # Exact match query
-            exact_stmt = base_query.where(BookFollowUpTable.subject == decoded_subject)
+            # Exact match query (any Arabic spelling variant of the subject)
+            exact_stmt = base_query.where(
+                BookFollowUpTable.subject.in_(BookFollowUpService._spellings("subject", decoded_subject))
+            )
             result = await db.execute(exact_stmt)
             records = result.all()
             
@@ -1237,21 +1483,25 @@ class BookFollowUpService:
             if not records:
                 logger.info(f"No exact match found, trying fuzzy search for: {decoded_subject}")
                 
-                # Get all subjects for fuzzy matching
-                all_subjects_stmt = select(BookFollowUpTable.subject).distinct()
-                all_subjects_result = await db.execute(all_subjects_stmt)
-                all_subjects = [row[0] for row in all_subjects_result.all() if row[0]]
-                
-                # Find best matches using fuzzy matching
-                best_matches = []
-                for db_subject in all_subjects:
-                    similarity = SequenceMatcher(None, decoded_subject.lower(), db_subject.lower()).ratio()
-                    if similarity > 0.8:  # 80% similarity threshold
-                        best_matches.append((db_subject, similarity))
-                
-                # Sort by similarity and get the best match
-                if best_matches:
+                if autocomplete_index.ready():
+                    # Bigram/length pruning, then the same SequenceMatcher ratio on the survivors
+                    best_matches = autocomplete_index.fuzzy_matches("subject", decoded_subject, 0.8)
+                else:
+                    # Get all subjects for fuzzy matching
+                    all_subjects_stmt = select(BookFollowUpTable.subject).distinct()
+                    all_subjects_result = await db.execute(all_subjects_stmt)
+                    all_subjects = sorted(row[0] for row in all_subjects_result.all() if row[0])
+
+                    # Find best matches using fuzzy matching
+                    best_matches = []
+                    for db_subject in all_subjects:
+                        similarity = SequenceMatcher(None, decoded_subject.lower(), db_subject.lower()).ratio()
+                        if similarity > 0.8:  # 80% similarity threshold
+                            best_matches.append((db_subject, similarity))
                     best_matches.sort(key=lambda x: x[1], reverse=True)
+
+                # Best match first (ties: alphabetical)
+                if best_matches:
                     best_subject = best_matches[0][0]
                     logger.info(f"Found fuzzy match: '{best_subject}' with similarity: {best_matches[0][1]:.2f}")
                     
@@ -1290,45 +1540,23 @@ class BookFollowUpService:
                     detail=f"No record found for subject: {decoded_subject[:100]}..."
                 )
 
-            # Step 4: Process records and get all departments for each book
+            # Step 4: Process records; departments for all matched books in one bridge query
+            book_ids = [record[0].id for record in records]
+            primary_map = await reference_cache.resolve_junctions(db, [record[0].junctionID for record in records])
+            dept_map = await reference_cache.departments_for_books(db, book_ids)
+
             response_array = []
             for record in records:
                 book_followup = record[0]
                 username = record[1]
                 count_of_pdfs = record[2]
-                primary_committee_id = record[3]  # coID
-                primary_committee_name = record[4]  # Com
-                primary_department_id = record[5]  # deID
-                primary_department_name = record[6]  # departmentName
+                primary = primary_map.get(book_followup.junctionID, EMPTY_JUNCTION)
+                primary_committee_id = primary.coID
+                primary_committee_name = primary.Com
+                primary_department_id = primary.deID
+                primary_department_name = primary.departmentName
 
-                # Get ALL departments for this book through bridge records
-                all_departments_query = select(
-                    Department.deID,
-                    Department.departmentName,
-                    Committee.coID,
-                    Committee.Com
-                ).select_from(BookFollowUpTable).join(
-                    BookJunctionBridge, BookFollowUpTable.id == BookJunctionBridge.bookID
-                ).join(
-                    CommitteeDepartmentsJunction, BookJunctionBridge.junctionID == CommitteeDepartmentsJunction.id
-                ).join(
-                    Committee, CommitteeDepartmentsJunction.coID == Committee.coID
-                ).join(
-                    Department, CommitteeDepartmentsJunction.deID == Department.deID
-                ).filter(BookFollowUpTable.id == book_followup.id).order_by(Department.departmentName)
-
-                dept_result = await db.execute(all_departments_query)
-                dept_rows = dept_result.fetchall()
-
-                # Process all departments
-                all_departments = []
-                for dept_row in dept_rows:
-                    all_departments.append({
-                        "deID": dept_row[0],
-                        "departmentName": dept_row[1],
-                        "coID": dept_row[2],
-                        "Com": dept_row[3]
-                    })
+                all_departments = dept_map.get(book_followup.id, [])
 
                 # Create department summary
                 dept_names = [dept["departmentName"] for dept in all_departments if dept["departmentName"]]
@@ -1394,6 +1622,132 @@ class BookFollowUpService:
             raise HTTPException(status_code=500, detail="Internal server error")
 
 
+    @staticmethod
+    async def searchBooks(
+        db: AsyncSession,
+        q: str,
+        page: int = 1,
+        limit: int = 10,
+        bookType: Optional[str] = None,
+        bookStatus: Optional[str] = None,
+        startDate: Optional[str] = None,
+        endDate: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Ranked full-text search over subject, notes, bookAction, directoryName,
+        destination, bookNo and incomingNo (BM25F, see search_index). The index picks
+        the page of book ids; the rows themselves are read from the database and
+        shaped like /getAll rows plus a "score".
+
+        While the index is (re)building for the first time, books matching every
+        query word in any of those columns are returned newest first, without scores.
+        """
+        try:
+            try:
+                start_date = datetime.strptime(startDate, '%Y-%m-%d').date() if startDate else None
+                end_date = datetime.strptime(endDate, '%Y-%m-%d').date() if endDate else None
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+            if start_date and end_date and start_date > end_date:
+                raise HTTPException(status_code=400, detail="startDate cannot be after endDate")
+
+            book_type = bookType.strip() if bookType else None
+            book_status = bookStatus.strip().lower() if bookStatus else None
+            offset = (page - 1) * limit
+
+            columns = (
+                BookFollowUpTable.id,
+                BookFollowUpTable.bookType,
+                BookFollowUpTable.bookNo,
+                BookFollowUpTable.bookDate,
+                BookFollowUpTable.directoryName,
+                BookFollowUpTable.junctionID,
+                BookFollowUpTable.incomingNo,
+                BookFollowUpTable.incomingDate,
+                BookFollowUpTable.subject,
+                BookFollowUpTable.destination,
+                BookFollowUpTable.bookAction,
+                BookFollowUpTable.bookStatus,
+                BookFollowUpTable.notes,
+                BookFollowUpTable.currentDate,
+                BookFollowUpTable.userID,
+                Users.username
+            )
+
+            if search_index.ready():
+                hits, total = search_index.search(
+                    q, offset, limit, book_type, book_status, start_date, end_date
+                )
+                scores = dict(hits)
+                book_rows = []
+                if hits:
+                    stmt = (
+                        select(*columns)
+                        .outerjoin(Users, BookFollowUpTable.userID == Users.id)
+                        .filter(BookFollowUpTable.id.in_(list(scores)))
+                    )
+                    rows_by_id = {row.id: row for row in (await db.execute(stmt)).fetchall()}
+                    # Keep the ranking; ids deleted by another worker meanwhile are skipped
+                    book_rows = [rows_by_id[book_id] for book_id, _ in hits if book_id in rows_by_id]
+            else:
+                filters = []
+                if book_type:
+                    filters.append(BookFollowUpTable.bookType == book_type)
+                if book_status:
+                    filters.append(BookFollowUpTable.bookStatus == book_status)
+                if start_date:
+                    filters.append(BookFollowUpTable.currentDate >= start_date)
+                if end_date:
+                    filters.append(BookFollowUpTable.currentDate <= end_date)
+                for word in q.split()[:5]:
+                    filters.append(or_(*(
+                        getattr(BookFollowUpTable, field).ilike(f"%{word}%") for field in SEARCH_FIELDS
+                    )))
+
+                total = (await db.execute(
+                    select(func.count()).select_from(BookFollowUpTable).filter(*filters)
+                )).scalar()
+                stmt = (
+                    select(*columns)
+                    .outerjoin(Users, BookFollowUpTable.userID == Users.id)
+                    .filter(*filters)
+                    .order_by(BookFollowUpTable.currentDate.desc(), BookFollowUpTable.id.desc())
+                    .offset(offset)
+                    .limit(limit)
+                )
+                book_rows = (await db.execute(stmt)).fetchall()
+                scores = {}
+
+            primary_map = await reference_cache.resolve_junctions(db, [row.junctionID for row in book_rows])
+            dept_map = await reference_cache.departments_for_books(db, [row.id for row in book_rows])
+            pdf_map = await BookFollowUpService._pdfs_by_book_no(db, [row.bookNo for row in book_rows])
+
+            data = []
+            for i, row in enumerate(book_rows):
+                item = BookFollowUpService._format_list_row(
+                    row, offset + i + 1,
+                    primary_map.get(row.junctionID, EMPTY_JUNCTION),
+                    dept_map.get(row.id, []),
+                    pdf_map.get(row.bookNo, [])
+                )
+                item["score"] = round(scores[row.id], 4) if row.id in scores else None
+                data.append(item)
+
+            return {
+                "data": data,
+                "total": total,
+                "page": page,
+                "limit": limit,
+                "totalPages": (total + limit - 1) // limit
+            }
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error in searchBooks: {str(e)}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
     
     @staticmethod
     async def reportBookFollowUpWithStats(
@@ -1607,71 +1961,9 @@ class BookFollowUpService:
         Single committee with multiple departments per book.
         """
         try:
-            # Step 1: Build filters
-            filters = []
-            if bookType:
-                filters.append(BookFollowUpTable.bookType == bookType.strip())
-            if bookStatus:
-                filters.append(BookFollowUpTable.bookStatus == bookStatus.strip().lower())
-
-            # Step 2: Add date filter based on check
-            if check:
-                if not startDate or not endDate:
-                    logger.error("startDate and endDate are required when check is True")
-                    raise HTTPException(status_code=400, detail="startDate and endDate are required when check is True")
-                
-                try:
-                    start_date = datetime.strptime(startDate, '%Y-%m-%d').date()
-                    end_date = datetime.strptime(endDate, '%Y-%m-%d').date()
-                    if start_date > end_date:
-                        logger.error("startDate cannot be after endDate")
-                        raise HTTPException(status_code=400, detail="startDate cannot be after endDate")
-                    
-                    filters.append(BookFollowUpTable.currentDate.isnot(None))
-                    filters.append(BookFollowUpTable.currentDate.between(start_date, end_date))
-                    logger.debug(f"Applying date range filter: {start_date} to {end_date}")
-                except ValueError as e:
-                    logger.error(f"Invalid date format for startDate or endDate: {str(e)}")
-                    raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
-            else:
-                filters.append(BookFollowUpTable.currentDate.is_(None))
-                logger.debug("Applying currentDate IS NULL filter")
-
-            # Step 3: Fetch matching records with primary junction info
-            stmt = (
-                select(
-                    BookFollowUpTable.id,
-                    BookFollowUpTable.bookType,
-                    BookFollowUpTable.bookNo,
-                    BookFollowUpTable.bookDate,
-                    BookFollowUpTable.directoryName,
-                    BookFollowUpTable.junctionID,
-                    BookFollowUpTable.incomingNo,
-                    BookFollowUpTable.incomingDate,
-                    BookFollowUpTable.subject,
-                    BookFollowUpTable.destination,
-                    BookFollowUpTable.bookAction,
-                    BookFollowUpTable.bookStatus,
-                    BookFollowUpTable.notes,
-                    BookFollowUpTable.currentDate,
-                    BookFollowUpTable.userID,
-                    Users.username,
-                    # Primary committee and department from junction
-                    Committee.coID,
-                    Committee.Com,
-                    Department.deID,
-                    Department.departmentName
-                )
-                .outerjoin(Users, BookFollowUpTable.userID == Users.id)
-                .outerjoin(
-                    CommitteeDepartmentsJunction,
-                    BookFollowUpTable.junctionID == CommitteeDepartmentsJunction.id
-                )
-                .outerjoin(Committee, CommitteeDepartmentsJunction.coID == Committee.coID)
-                .outerjoin(Department, CommitteeDepartmentsJunction.deID == Department.deID)
-                .filter(*filters)
-                .order_by(BookFollowUpTable.bookNo)
-            )
+            # Steps 1-3: Filters and statement shared with the streamed formats
+            filters = BookFollowUpService.report_filters(bookType, bookStatus, check, startDate, endDate)
+            stmt = BookFollowUpService.report_stmt(filters)
 
             result = await db.execute(stmt)
             rows = result.fetchall()
@@ -1679,144 +1971,29 @@ class BookFollowUpService:
             # Step 4: Get book IDs for multi-department queries
             book_ids = [row.id for row in rows]
             
-            # Step 5: Get all departments for each book (single committee, multiple departments)
-            dept_map = {}
-            if book_ids:
-                dept_query = select(
-                    BookFollowUpTable.id.label('book_id'),
-                    Department.deID,
-                    Department.departmentName,
-                    Committee.coID,
-                    Committee.Com
-                ).select_from(BookFollowUpTable).join(
-                    BookJunctionBridge, BookFollowUpTable.id == BookJunctionBridge.bookID
-                ).join(
-                    CommitteeDepartmentsJunction, BookJunctionBridge.junctionID == CommitteeDepartmentsJunction.id
-                ).join(
-                    Committee, CommitteeDepartmentsJunction.coID == Committee.coID
-                ).join(
-                    Department, CommitteeDepartmentsJunction.deID == Department.deID
-                ).filter(BookFollowUpTable.id.in_(book_ids))
-                
-                dept_result = await db.execute(dept_query)
-                dept_rows = dept_result.fetchall()
-                
-                for dept_row in dept_rows:
-                    book_id = dept_row.book_id
-                    if book_id not in dept_map:
-                        dept_map[book_id] = []
-                    dept_map[book_id].append({
-                        "deID": dept_row.deID,
-                        "departmentName": dept_row.departmentName,
-                        "coID": dept_row.coID,
-                        "Com": dept_row.Com
-                    })
+            # Step 5: Primary junction and all departments of each book (single committee, multiple departments)
+            primary_map = await reference_cache.resolve_junctions(db, [row.junctionID for row in rows])
+            dept_map = await reference_cache.departments_for_books(db, book_ids)
 
-            # Step 6: Calculate department statistics
-            logger.info("Calculating multi-department statistics...")
-            
-            # Count books per department (a book with 2 departments counts once for each)
-            department_counts = {}
-            for book_id, departments in dept_map.items():
-                for dept in departments:
-                    dept_key = (dept['deID'], dept['departmentName'], dept['Com'])
-                    if dept_key not in department_counts:
-                        department_counts[dept_key] = 0
-                    department_counts[dept_key] += 1
-            
-            # Format department statistics
-            department_stats = [
-                {
-                    "deID": str(dept_key[0]) if dept_key[0] else "unknown",
-                    "departmentName": dept_key[1] or "غير محدد",
-                    "Com": dept_key[2] or "غير محدد",
-                    "count": count
-                }
-                for dept_key, count in sorted(
-                    department_counts.items(),
-                    key=lambda x: x[1],
-                    reverse=True
-                )
-            ]
+            # Step 6: Department / committee statistics
+            stats = ReportStatsCounter()
+            for departments in dept_map.values():
+                stats.add_book(departments)
 
             # Step 7: Format records with multi-department info
-            records = []
-            for idx, row in enumerate(rows):
-                all_departments = dept_map.get(row.id, [])
-                
-                # Create department summary
-                dept_names = [dept["departmentName"] for dept in all_departments if dept["departmentName"]]
-                department_names = ", ".join(dept_names) if dept_names else row.departmentName
-                
-                records.append({
-                    "serialNo": idx + 1,
-                    "id": row.id,
-                    "bookType": row.bookType,
-                    "bookNo": row.bookNo,
-                    "bookDate": row.bookDate.strftime('%Y-%m-%d') if row.bookDate else None,
-                    "directoryName": row.directoryName,
-                    "incomingNo": row.incomingNo,
-                    "incomingDate": row.incomingDate.strftime('%Y-%m-%d') if row.incomingDate else None,
-                    "subject": row.subject,
-                    "destination": row.destination,
-                    "bookAction": row.bookAction,
-                    "bookStatus": row.bookStatus,
-                    "notes": row.notes,
-                    "currentDate": row.currentDate.strftime('%Y-%m-%d') if row.currentDate else None,
-                    "userID": row.userID,
-                    "username": row.username,
-                    
-                    # Single committee info
-                    "coID": row.coID,
-                    "Com": row.Com,
-                    "deID": str(row.deID) if row.deID else None,
-                    "departmentName": row.departmentName,
-                    
-                    # Multi-department info
-                    "all_departments": all_departments,
-                    "department_names": department_names,
-                    "department_count": len(all_departments)
-                })
-
-            # Calculate totals
-            total_records = len(records)
-            total_departments = len(department_stats)
-            
-            # Calculate books per committee (should be one committee now)
-            committee_stats = {}
-            for book_id, departments in dept_map.items():
-                if departments:
-                    com_name = departments[0]['Com']  # All departments have same committee
-                    if com_name:
-                        committee_stats[com_name] = committee_stats.get(com_name, 0) + 1
-
-            committee_breakdown = [
-                {"committeeName": com_name, "count": count}
-                for com_name, count in sorted(
-                    committee_stats.items(),
-                    key=lambda x: x[1],
-                    reverse=True
+            records = [
+                BookFollowUpService.report_record(
+                    row, idx + 1, primary_map.get(row.junctionID, EMPTY_JUNCTION), dept_map.get(row.id, [])
                 )
+                for idx, row in enumerate(rows)
             ]
+            statistics = stats.statistics(len(records), bookType, bookStatus, check, startDate, endDate)
 
-            logger.info(f"Report with stats generated: {total_records} records, {total_departments} departments")
+            logger.info(f"Report with stats generated: {statistics['totalRecords']} records, {statistics['totalDepartments']} departments")
             
             return {
                 "records": records,
-                "statistics": {
-                    "totalRecords": total_records,
-                    "totalDepartments": total_departments,
-                    "totalCommittees": len(committee_breakdown),
-                    "departmentBreakdown": department_stats,
-                    "committeeBreakdown": committee_breakdown,
-                    "filters": {
-                        "bookType": bookType,
-                        "bookStatus": bookStatus,
-                        "dateRangeEnabled": check,
-                        "startDate": startDate if check else None,
-                        "endDate": endDate if check else None
-                    }
-                }
+                "statistics": statistics
             }
 
         except HTTPException:
@@ -1871,32 +2048,56 @@ class BookFollowUpService:
                 except ValueError:
                     raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
 
-            # Get department statistics
-            stats_stmt = (
-                select(
-                    BookFollowUpTable.deID,
-                    Department.departmentName,
-                    Committee.Com,
-                    func.count(BookFollowUpTable.id).label('count')
-                )
-                .outerjoin(Department, BookFollowUpTable.deID == Department.deID)
-                .outerjoin(Committee, Department.coID == Committee.coID)
-                .filter(*filters)
-                .group_by(
-                    BookFollowUpTable.deID, 
-                    Department.departmentName, 
-                    Committee.Com
+            # Default view (no type/status filter, books without currentDate) comes
+            # straight from book_counters; anything else is counted through the bridge table
+            counts = None
+            if not bookType and not bookStatus and not check and not startDate and not endDate:
+                counts = await read_counters(db)
+
+            if counts is not None:
+                await reference_cache.ensure_loaded(db)
+                stats_rows = []
+                for (dim, dim_key), cnt in counts.items():
+                    if dim != "pendingDepartment":
+                        continue
+                    coID, deID = (int(part) for part in dim_key.split(":"))
+                    department = reference_cache.departments.get(deID)
+                    stats_rows.append(SimpleNamespace(
+                        deID=deID,
+                        departmentName=department[1] if department else None,
+                        Com=reference_cache.committees.get(coID),
+                        count=cnt,
+                    ))
+                stats_rows.sort(key=lambda stat_row: -stat_row.count)
+                total_records = counts.get(("pendingTotal", ""), 0)
+            else:
+                stats_stmt = (
+                    select(
+                        CommitteeDepartmentsJunction.deID,
+                        Department.departmentName,
+                        Committee.Com,
+                        func.count(BookFollowUpTable.id.distinct()).label('count')
+                    )
+                    .join(BookJunctionBridge, BookJunctionBridge.bookID == BookFollowUpTable.id)
+                    .join(CommitteeDepartmentsJunction, CommitteeDepartmentsJunction.id == BookJunctionBridge.junctionID)
+                    .outerjoin(Department, CommitteeDepartmentsJunction.deID == Department.deID)
+                    .outerjoin(Committee, CommitteeDepartmentsJunction.coID == Committee.coID)
+                    .filter(*filters)
+                    .group_by(
+                        CommitteeDepartmentsJunction.deID,
+                        Department.departmentName,
+                        Committee.Com
+                    )
+                    .order_by(func.count(BookFollowUpTable.id.distinct()).desc())
                 )
-                .order_by(func.count(BookFollowUpTable.id).desc())
-            )
 
-            stats_result = await db.execute(stats_stmt)
-            stats_rows = stats_result.fetchall()
+                stats_result = await db.execute(stats_stmt)
+                stats_rows = stats_result.fetchall()
 
-            # Get total count
-            total_stmt = select(func.count(BookFollowUpTable.id)).filter(*filters)
-            total_result = await db.execute(total_stmt)
-            total_records = total_result.scalar() or 0
+                # Get total count
+                total_stmt = select(func.count(BookFollowUpTable.id)).filter(*filters)
+                total_result = await db.execute(total_stmt)
+                total_records = total_result.scalar() or 0
 
             department_stats = [
                 {
@@ -1929,6 +2130,110 @@ class BookFollowUpService:
             raise HTTPException(status_code=500, detail="Error retrieving department statistics.")
 
  
+    @staticmethod
+    def department_report_filters(
+        bookType: Optional[str] = None,
+        bookStatus: Optional[str] = None,
+        startDate: Optional[str] = None,
+        endDate: Optional[str] = None,
+        coID: Optional[str] = None,
+        deID: Optional[str] = None
+    ) -> list:
+        """
+        WHERE clauses of /report-with-stats-department (every output format). The date
+        range applies only when both dates are given. Raises HTTPException(400) for bad dates.
+        """
+        filters = []
+        if bookType:
+            filters.append(BookFollowUpTable.bookType == bookType.strip())
+        if bookStatus:
+            filters.append(BookFollowUpTable.bookStatus == bookStatus.strip().lower())
+
+        if startDate and endDate:
+            try:
+                start_date = datetime.strptime(startDate, '%Y-%m-%d').date()
+                end_date = datetime.strptime(endDate, '%Y-%m-%d').date()
+            except ValueError as e:
+                logger.error(f"Invalid date format for startDate or endDate: {str(e)}")
+                raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+            if start_date > end_date:
+                logger.error("startDate cannot be after endDate")
+                raise HTTPException(status_code=400, detail="startDate cannot be after endDate")
+            filters.append(BookFollowUpTable.currentDate.isnot(None))
+            filters.append(BookFollowUpTable.currentDate.between(start_date, end_date))
+            logger.debug(f"Applying date range filter: {start_date} to {end_date}")
+
+        # Apply department filter via junction
+        if deID:
+            filters.append(Department.deID == int(deID.strip()))
+            logger.debug(f"Applying department filter: deID={deID}")
+
+        # Apply committee filter via junction
+        if coID:
+            filters.append(Committee.coID == int(coID.strip()))
+            logger.debug(f"Applying committee filter: coID={coID}")
+        return filters
+
+    @staticmethod
+    def department_report_stmt(filters: list):
+        """Department report rows joined through the primary junction, by currentDate then bookNo."""
+        return (
+            select(
+                BookFollowUpTable.id,
+                BookFollowUpTable.bookType,
+                BookFollowUpTable.bookNo,
+                BookFollowUpTable.bookDate,
+                BookFollowUpTable.directoryName,
+                BookFollowUpTable.incomingNo,
+                BookFollowUpTable.incomingDate,
+                BookFollowUpTable.subject,
+                BookFollowUpTable.destination,
+                BookFollowUpTable.bookAction,
+                BookFollowUpTable.bookStatus,
+                BookFollowUpTable.notes,
+                BookFollowUpTable.currentDate,
+                BookFollowUpTable.userID,
+                Users.username,
+                Department.deID,
+                Department.departmentName,
+                Committee.Com,
+                Committee.coID
+            )
+            .outerjoin(Users, BookFollowUpTable.userID == Users.id)
+            .outerjoin(
+                CommitteeDepartmentsJunction,
+                BookFollowUpTable.junctionID == CommitteeDepartmentsJunction.id
+            )
+            .outerjoin(Committee, CommitteeDepartmentsJunction.coID == Committee.coID)
+            .outerjoin(Department, CommitteeDepartmentsJunction.deID == Department.deID)
+            .filter(*filters)
+            .order_by(BookFollowUpTable.currentDate, BookFollowUpTable.bookNo)
+        )
+
+    @staticmethod
+    def department_report_record(row, serial_no: int) -> Dict[str, Any]:
+        return {
+            "serialNo": serial_no,
+            "id": row.id,
+            "bookType": row.bookType,
+            "bookNo": row.bookNo,
+            "bookDate": row.bookDate.strftime('%Y-%m-%d') if row.bookDate else None,
+            "directoryName": row.directoryName,
+            "incomingNo": row.incomingNo,
+            "incomingDate": row.incomingDate.strftime('%Y-%m-%d') if row.incomingDate else None,
+            "subject": row.subject,
+            "destination": row.destination,
+            "bookAction": row.bookAction,
+            "bookStatus": row.bookStatus,
+            "notes": row.notes,
+            "currentDate": row.currentDate.strftime('%Y-%m-%d') if row.currentDate else None,
+            "userID": row.userID,
+            "username": row.username,
+            "deID": str(row.deID) if row.deID is not None else None,
+            "Com": row.Com,
+            "departmentName": row.departmentName,
+        }
+
     @staticmethod
     async def reportBookFollowUpByDepartment(
         db: AsyncSession,
@@ -1955,73 +2260,9 @@ class BookFollowUpService:
             Dictionary containing records, total, and department/committee info
         """
         try:
-            # Step 1: Build filters
-            filters = []
-            if bookType:
-                filters.append(BookFollowUpTable.bookType == bookType.strip())
-            if bookStatus:
-                filters.append(BookFollowUpTable.bookStatus == bookStatus.strip().lower())
-
-            # Step 2: Add date filter if dates are provided
-            if startDate and endDate:
-                try:
-                    start_date = datetime.strptime(startDate, '%Y-%m-%d').date()
-                    end_date = datetime.strptime(endDate, '%Y-%m-%d').date()
-                    if start_date > end_date:
-                        logger.error("startDate cannot be after endDate")
-                        raise HTTPException(status_code=400, detail="startDate cannot be after endDate")
-                    filters.append(BookFollowUpTable.currentDate.isnot(None))
-                    filters.append(BookFollowUpTable.currentDate.between(start_date, end_date))
-                    logger.debug(f"Applying date range filter: {start_date} to {end_date}")
-                except ValueError as e:
-                    logger.error(f"Invalid date format for startDate or endDate: {str(e)}")
-                    raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
-
-            # Step 3: Build main query joining through junction table
-            stmt = (
-                select(
-                    BookFollowUpTable.id,
-                    BookFollowUpTable.bookType,
-                    BookFollowUpTable.bookNo,
-                    BookFollowUpTable.bookDate,
-                    BookFollowUpTable.directoryName,
-                    BookFollowUpTable.incomingNo,
-                    BookFollowUpTable.incomingDate,
-                    BookFollowUpTable.subject,
-                    BookFollowUpTable.destination,
-                    BookFollowUpTable.bookAction,
-                    BookFollowUpTable.bookStatus,
-                    BookFollowUpTable.notes,
-                    BookFollowUpTable.currentDate,
-                    BookFollowUpTable.userID,
-                    Users.username,
-                    Department.deID,
-                    Department.departmentName,
-                    Committee.Com,
-                    Committee.coID
-                )
-                .outerjoin(Users, BookFollowUpTable.userID == Users.id)
-                .outerjoin(
-                    CommitteeDepartmentsJunction,
-                    BookFollowUpTable.junctionID == CommitteeDepartmentsJunction.id
-                )
-                .outerjoin(Committee, CommitteeDepartmentsJunction.coID == Committee.coID)
-                .outerjoin(Department, CommitteeDepartmentsJunction.deID == Department.deID)
-                .order_by(BookFollowUpTable.currentDate)
-            )
-            
-            # Apply department filter via junction
-            if deID:
-                filters.append(Department.deID == int(deID.strip()))
-                logger.debug(f"Applying department filter: deID={deID}")
-            
-            # Apply committee filter via junction
-            if coID:
-                filters.append(Committee.coID == int(coID.strip()))
-                logger.debug(f"Applying committee filter: coID={coID}")
-            
-            # Apply filters and execute query
-            result = await db.execute(stmt.filter(*filters).order_by(BookFollowUpTable.bookNo))
+            # Steps 1-3: Filters and statement shared with the streamed formats
+            filters = BookFollowUpService.department_report_filters(bookType, bookStatus, startDate, endDate, coID, deID)
+            result = await db.execute(BookFollowUpService.department_report_stmt(filters))
             rows = result.fetchall()
 
             # Step 4: Get Department and Committee info based on filters
@@ -2050,32 +2291,9 @@ class BookFollowUpService:
                     logger.debug(f"Found department info - Com: {com_name}, Department: {dept_name}")
 
             # Step 5: Format records
-            records = []
+            records = [BookFollowUpService.department_report_record(row, i + 1) for i, row in enumerate(rows)]
             total_records = len(rows)
 
-            for i, row in enumerate(rows):
-                records.append({
-                    "serialNo": i + 1,
-                    "id": row.id,
-                    "bookType": row.bookType,
-                    "bookNo": row.bookNo,
-                    "bookDate": row.bookDate.strftime('%Y-%m-%d') if row.bookDate else None,
-                    "directoryName": row.directoryName,
-                    "incomingNo": row.incomingNo,
-                    "incomingDate": row.incomingDate.strftime('%Y-%m-%d') if row.incomingDate else None,
-                    "subject": row.subject,
-                    "destination": row.destination,
-                    "bookAction": row.bookAction,
-                    "bookStatus": row.bookStatus,
-                    "notes": row.notes,
-                    "currentDate": row.currentDate.strftime('%Y-%m-%d') if row.currentDate else None,
-                    "userID": row.userID,
-                    "username": row.username,
-                    "deID": str(row.deID) if row.deID is not None else None,
-                    "Com": row.Com,
-                    "departmentName": row.departmentName,
-                })
-
             logger.info(f"Found {len(records)} records matching filters")
 
             # Step 6: Return structured response with department/committee info
@@ -0,0 +1,96 @@
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy import and_, case, func, or_
+
+from app.models.bookFollowUpTable import BookFollowUpTable
+
+
+# How late a pending book is: days since it came in (incomingDate, else bookDate).
+# The bucket filters are date ranges on the stored columns, computed from today's
+# date in Python, so SQL Server can seek ix_bookFollowUpTable_userID_ageDates
+# instead of evaluating DATEDIFF on every row.
+
+class AgeBucket(NamedTuple):
+    name: str
+    min_days: Optional[int]  # inclusive; None = no lower bound (future dates count as 0 days)
+    max_days: Optional[int]  # inclusive; None = no upper bound
+
+
+AGE_BUCKETS = [
+    AgeBucket("0-7", None, 7),
+    AgeBucket("8-30", 8, 30),
+    AgeBucket("31-90", 31, 90),
+    AgeBucket("90+", 91, None),
+]
+UNKNOWN_BUCKET = "unknown"  # neither incomingDate nor bookDate
+AGE_BUCKET_NAMES = [bucket.name for bucket in AGE_BUCKETS] + [UNKNOWN_BUCKET]
+
+_NAME = r"(0-7|8-30|31-90|90\+|unknown)"
+AGE_BUCKET_PATTERN = f"^{_NAME}(,{_NAME})*$"  # ageBucket=31-90,90+
+LATE_BOOKS_SORT_PATTERN = "^(currentDate|age_desc|age_asc)$"  # age_desc = oldest first
+
+
+def parse_age_buckets(value: Optional[str]) -> List[str]:
+    if not value:
+        return []
+    return list(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+
+
+def age_date(incoming_date: Optional[date], book_date: Optional[date]) -> Optional[date]:
+    return incoming_date or book_date
+
+
+def age_bucket_of(age_days: Optional[int]) -> str:
+    if age_days is None:
+        return UNKNOWN_BUCKET
+    for bucket in AGE_BUCKETS:
+        if bucket.max_days is None or age_days <= bucket.max_days:
+            return bucket.name
+    return AGE_BUCKETS[-1].name
+
+
+def empty_bucket_counts() -> Dict[str, int]:
+    return {name: 0 for name in AGE_BUCKET_NAMES}
+
+
+# ---------- SQL ----------
+
+def age_date_column():
+    """COALESCE(incomingDate, bookDate), for output and ORDER BY only (not sargable)."""
+    return func.coalesce(BookFollowUpTable.incomingDate, BookFollowUpTable.bookDate)
+
+
+def _date_range(column, since: Optional[date], until: Optional[date]):
+    conditions = [column.isnot(None)]
+    if since is not None:
+        conditions.append(column >= since)
+    if until is not None:
+        conditions.append(column <= until)
+    return and_(*conditions)
+
+
+def age_bucket_clause(name: str, today: date):
+    """WHERE clause of one bucket as plain ranges on incomingDate / bookDate."""
+    if name == UNKNOWN_BUCKET:
+        return and_(BookFollowUpTable.incomingDate.is_(None), BookFollowUpTable.bookDate.is_(None))
+    bucket = next(bucket for bucket in AGE_BUCKETS if bucket.name == name)
+    # age >= min_days  <=>  date <= today - min_days ; age <= max_days  <=>  date >= today - max_days
+    since = today - timedelta(days=bucket.max_days) if bucket.max_days is not None else None
+    until = today - timedelta(days=bucket.min_days) if bucket.min_days is not None else None
+    return or_(
+        _date_range(BookFollowUpTable.incomingDate, since, until),
+        and_(BookFollowUpTable.incomingDate.is_(None), _date_range(BookFollowUpTable.bookDate, since, until)),
+    )
+
+
+def age_buckets_clause(names: Iterable[str], today: date):
+    return or_(*(age_bucket_clause(name, today) for name in names))
+
+
+def bucket_count_columns(today: date) -> List:
+    """SUM(CASE WHEN <bucket> THEN 1 ELSE 0 END) per bucket, labelled with the bucket index."""
+    return [
+        func.sum(case((age_bucket_clause(name, today), 1), else_=0)).label(f"bucket_{i}")
+        for i, name in enumerate(AGE_BUCKET_NAMES)
+    ]
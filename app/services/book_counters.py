@@ -0,0 +1,343 @@
+import argparse
+import asyncio
+import logging
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import case, func, select, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.config import settings
+from app.database.database import AsyncSessionLocal
+from app.models.bookFollowUpTable import (
+    BookCounterTable, BookFollowUpTable, BookJunctionBridge, CommitteeDepartmentsJunction,
+)
+from app.services.reference_cache import reference_cache
+
+logger = logging.getLogger(__name__)
+
+
+# book_counters holds one row per (dimension, value) with the number of books, so
+# dashboard reads cost O(groups) instead of a table scan. insert_book and the update
+# methods apply the difference between a book's old and new CounterState in the same
+# transaction (one MERGE). reconcile() recomputes everything from bookFollowUpTable,
+# reports drift and, unless dry_run, corrects it.
+#
+# Off unless BOOK_COUNTERS_ENABLED. Production rollout: create the table (its statement
+# is in SCHEMA_UPGRADES; create_all only runs in DEVELOPMENT mode), reconcile once
+# (python -m app.services.book_counters), then enable the setting.
+
+DIM_KEY_MAX = 100
+INITIALIZED = ("_state", "initialized")  # written by reconcile only: counters are complete
+RECONCILED_AT = ("_state", "reconciledAt")  # unix time of the last reconcile (any process)
+
+CounterKey = Tuple[str, str]
+
+_table_exists: Optional[bool] = None  # checked once per process
+
+
+async def counters_active(db: AsyncSession) -> bool:
+    """BOOK_COUNTERS_ENABLED and the table exists (if not, maintenance stops with a warning)."""
+    global _table_exists
+    if not settings.BOOK_COUNTERS_ENABLED:
+        return False
+    if _table_exists is None:
+        found = (await db.execute(text("SELECT OBJECT_ID(N'book_counters', N'U')"))).scalar()
+        _table_exists = found is not None
+        if not _table_exists:
+            logger.warning(
+                "BOOK_COUNTERS_ENABLED but table book_counters does not exist: counters are not maintained "
+                "(create it from SCHEMA_UPGRADES and restart)"
+            )
+    return _table_exists
+
+
+class CounterState(NamedTuple):
+    """What a book contributes to the counters."""
+    bookType: Optional[str]
+    bookStatus: Optional[str]
+    userID: Optional[str]
+    pending: bool                               # currentDate IS NULL
+    departments: FrozenSet[Tuple[int, int]]     # (coID, deID) of its bridge junctions
+
+
+def _key(value: Any) -> str:
+    return "" if value is None else str(value)[:DIM_KEY_MAX]
+
+
+def department_key(coID: Any, deID: Any) -> str:
+    return f"{coID}:{deID}"
+
+
+def counter_keys(state: Optional[CounterState]) -> List[CounterKey]:
+    if state is None:
+        return []
+    keys = [
+        ("total", ""),
+        ("bookType", _key(state.bookType)),
+        ("bookStatus", _key(state.bookStatus)),
+        ("userID", _key(state.userID)),
+    ]
+    keys += [("committee", _key(coID)) for coID in {coID for coID, _ in state.departments}]
+    keys += [("department", department_key(coID, deID)) for coID, deID in state.departments]
+    if state.pending:
+        keys.append(("pendingTotal", ""))
+        keys += [("pendingDepartment", department_key(coID, deID)) for coID, deID in state.departments]
+    return keys
+
+
+def counter_state(book: BookFollowUpTable, departments: FrozenSet[Tuple[int, int]]) -> CounterState:
+    return CounterState(book.bookType, book.bookStatus, book.userID, book.currentDate is None, departments)
+
+
+async def junction_departments(db: AsyncSession, junction_ids: Iterable[Optional[int]]) -> FrozenSet[Tuple[int, int]]:
+    """(coID, deID) pairs of junction ids (unknown ids are fetched by the reference cache)."""
+    wanted = [jid for jid in junction_ids if jid is not None]
+    await reference_cache.resolve_junctions(db, wanted)
+    return frozenset(reference_cache.junctions[jid] for jid in wanted if jid in reference_cache.junctions)
+
+
+async def stored_counter_state(db: AsyncSession, book: BookFollowUpTable) -> Optional[CounterState]:
+    """State of a book as currently stored (call before changing it); None when counters are off."""
+    if not await counters_active(db):
+        return None
+    junction_ids = (await db.execute(
+        select(BookJunctionBridge.junctionID).where(BookJunctionBridge.bookID == book.id)
+    )).scalars().all()
+    return counter_state(book, await junction_departments(db, junction_ids))
+
+
+# Deltas of one statement are summed per key first: a MERGE may touch each target row once
+# (and keys that differ only in case are the same row under the database collation).
+_MERGE_SQL = """
+MERGE book_counters WITH (HOLDLOCK) AS t
+USING (
+    SELECT dim, dimKey, SUM(delta) AS delta
+    FROM (VALUES {values}) AS v (dim, dimKey, delta)
+    GROUP BY dim, dimKey
+    HAVING SUM(delta) <> 0
+) AS s
+ON t.dim = s.dim AND t.dimKey = s.dimKey
+WHEN MATCHED AND t.cnt + s.delta = 0 THEN DELETE
+WHEN MATCHED THEN UPDATE SET cnt = t.cnt + s.delta
+WHEN NOT MATCHED THEN INSERT (dim, dimKey, cnt) VALUES (s.dim, s.dimKey, s.delta);
+"""
+
+
+async def merge_counter_deltas(db: AsyncSession, deltas: Dict[CounterKey, int]) -> None:
+    """Add deltas to book_counters (no commit: runs in the caller's transaction)."""
+    items = [(key, delta) for key, delta in deltas.items() if delta]
+    if not items:
+        return
+    params: Dict[str, Any] = {}
+    values = []
+    for i, ((dim, dim_key), delta) in enumerate(items):
+        values.append(f"(CAST(:d{i} AS NVARCHAR(20)), CAST(:k{i} AS NVARCHAR({DIM_KEY_MAX})), CAST(:n{i} AS BIGINT))")
+        params.update({f"d{i}": dim, f"k{i}": dim_key, f"n{i}": delta})
+    await db.execute(text(_MERGE_SQL.format(values=", ".join(values))), params)
+
+
+def counter_deltas(before: Optional[CounterState], after: Optional[CounterState]) -> Dict[CounterKey, int]:
+    """Non-zero changes per counter when a book moves from before to after (None = not in the table)."""
+    deltas = Counter(counter_keys(after))
+    deltas.subtract(counter_keys(before))
+    return {key: delta for key, delta in deltas.items() if delta}
+
+
+async def apply_counter_change(
+    db: AsyncSession, before: Optional[CounterState], after: Optional[CounterState]
+) -> None:
+    """Move one book from its old counters to its new ones (None = not in the table)."""
+    if before == after or not await counters_active(db):
+        return
+    await merge_counter_deltas(db, counter_deltas(before, after))
+
+
+# ---------- reads ----------
+
+async def read_counters(db: AsyncSession) -> Optional[Dict[CounterKey, int]]:
+    """All counters, or None while they were never reconciled (or are switched off)."""
+    if not await counters_active(db):
+        return None
+    try:
+        rows = (await db.execute(select(BookCounterTable.dim, BookCounterTable.dimKey, BookCounterTable.cnt))).fetchall()
+    except Exception as e:
+        logger.warning(f"Could not read book_counters: {str(e)}")
+        await db.rollback()
+        return None
+    counts = {(row.dim, row.dimKey): row.cnt for row in rows}
+    if INITIALIZED not in counts:
+        logger.info("book_counters has not been reconciled yet; counting from bookFollowUpTable")
+        return None
+    return counts
+
+
+async def compute_counters(db: AsyncSession) -> Dict[CounterKey, int]:
+    """
+    The counters recomputed from bookFollowUpTable in one scan (GROUPING SETS).
+    The bridge join repeats a book per department, hence COUNT(DISTINCT id).
+    """
+    book = BookFollowUpTable
+    junction = CommitteeDepartmentsJunction
+    base = (
+        select(
+            book.id,
+            book.bookType,
+            book.bookStatus,
+            book.userID,
+            case((book.currentDate.is_(None), 1), else_=0).label("pending"),
+            junction.coID,
+            junction.deID,
+        )
+        .select_from(book)
+        .outerjoin(BookJunctionBridge, BookJunctionBridge.bookID == book.id)
+        .outerjoin(junction, junction.id == BookJunctionBridge.junctionID)
+        .subquery()
+    )
+    c = base.c
+    stmt = (
+        select(
+            func.grouping(c.bookType).label("g_type"),
+            func.grouping(c.bookStatus).label("g_status"),
+            func.grouping(c.userID).label("g_user"),
+            func.grouping(c.pending).label("g_pending"),
+            func.grouping(c.coID).label("g_committee"),
+            func.grouping(c.deID).label("g_department"),
+            c.bookType, c.bookStatus, c.userID, c.pending, c.coID, c.deID,
+            func.count(c.id.distinct()).label("cnt"),
+        )
+        .group_by(func.grouping_sets(
+            tuple_(),
+            tuple_(c.bookType),
+            tuple_(c.bookStatus),
+            tuple_(c.userID),
+            tuple_(c.coID),
+            tuple_(c.coID, c.deID),
+            tuple_(c.pending),
+            tuple_(c.pending, c.coID, c.deID),
+        ))
+    )
+
+    counts: Dict[CounterKey, int] = {}
+    for row in (await db.execute(stmt)).fetchall():
+        if not row.g_type:
+            key = ("bookType", _key(row.bookType))
+        elif not row.g_status:
+            key = ("bookStatus", _key(row.bookStatus))
+        elif not row.g_user:
+            key = ("userID", _key(row.userID))
+        elif not row.g_pending:
+            if not row.pending:
+                continue
+            if row.g_committee:
+                key = ("pendingTotal", "")
+            elif row.coID is None or row.deID is None:
+                continue
+            else:
+                key = ("pendingDepartment", department_key(row.coID, row.deID))
+        elif not row.g_committee:
+            if row.coID is None:
+                continue  # books without departments
+            key = ("committee", _key(row.coID)) if row.g_department else ("department", department_key(row.coID, row.deID))
+        else:
+            key = ("total", "")
+        counts[key] = counts.get(key, 0) + row.cnt
+    return {key: cnt for key, cnt in counts.items() if cnt}
+
+
+# ---------- reconciliation ----------
+
+# Every worker schedules reconcile(); sp_getapplock lets one of them in at a time (the
+# others skip), and RECONCILED_AT makes the next ones skip a run another process just did.
+# (NOCOUNT is set inside sp_executesql, so it does not stick to the pooled connection.)
+_RECONCILE_LOCK_SQL = """
+DECLARE @result INT;
+EXEC sp_executesql
+    N'SET NOCOUNT ON; EXEC @r = sp_getapplock @Resource = N''book_counters_reconcile'',
+        @LockMode = N''Exclusive'', @LockOwner = N''Transaction'', @LockTimeout = 0;',
+    N'@r INT OUTPUT', @r = @result OUTPUT;
+SELECT @result;
+"""
+
+
+async def _reconcile_lock(db: AsyncSession) -> bool:
+    """Exclusive application lock until the transaction ends; False if another process holds it."""
+    return (await db.execute(text(_RECONCILE_LOCK_SQL))).scalar() >= 0
+
+
+async def reconcile(db: AsyncSession, dry_run: bool = False, min_interval_sec: int = 0) -> Dict[str, Any]:
+    """
+    Recompute every counter and compare with book_counters. Unless dry_run, the
+    differences are merged in and committed.
+
+    Both reads and the correction run in one SERIALIZABLE transaction: book writes
+    commit their counter deltas with the book, so a write either happened entirely
+    before the scan (and is in both reads) or waits for the commit. Skipped when
+    another process is reconciling, or did so less than min_interval_sec ago.
+    """
+    report: Dict[str, Any] = {
+        "checkedAt": datetime.now().isoformat(timespec="seconds"),
+        "skipped": None,
+        "initialized": False,
+        "counters": 0,
+        "driftCount": 0,
+        "drift": [],
+        "fixed": False,
+    }
+    await db.connection(execution_options={"isolation_level": "SERIALIZABLE"})
+    try:
+        if not await _reconcile_lock(db):
+            report["skipped"] = "running in another process"
+            return report
+
+        stored = (await db.execute(select(BookCounterTable.dim, BookCounterTable.dimKey, BookCounterTable.cnt))).fetchall()
+        stored_counts = {(row.dim, row.dimKey): row.cnt for row in stored}
+        initialized = stored_counts.pop(INITIALIZED, None) is not None
+        reconciled_at = stored_counts.pop(RECONCILED_AT, 0)
+        now = int(time.time())
+        if min_interval_sec and initialized and now - reconciled_at < min_interval_sec:
+            report["skipped"] = "reconciled recently"
+            return report
+
+        actual = await compute_counters(db)
+        drift = []
+        corrections: Dict[CounterKey, int] = {}
+        for key in sorted(set(actual) | set(stored_counts)):
+            have, want = stored_counts.get(key, 0), actual.get(key, 0)
+            if have != want:
+                drift.append({"dim": key[0], "dimKey": key[1], "stored": have, "actual": want})
+                corrections[key] = want - have
+
+        if not dry_run:
+            if not initialized:
+                corrections[INITIALIZED] = 1
+            corrections[RECONCILED_AT] = now - reconciled_at
+            await merge_counter_deltas(db, corrections)
+            await db.commit()
+    finally:
+        await db.rollback()  # no-op after the commit; releases the lock otherwise
+
+    if drift:
+        logger.warning(f"book_counters drift: {len(drift)} of {len(actual)} counters{'' if dry_run else ' corrected'}")
+    report.update(initialized=initialized, counters=len(actual), driftCount=len(drift), drift=drift, fixed=not dry_run)
+    return report
+
+
+if __name__ == "__main__":
+    # python -m app.services.book_counters [--dry-run]
+    parser = argparse.ArgumentParser(description="Recompute book_counters and report (and fix) drift")
+    parser.add_argument("--dry-run", action="store_true", help="only report the differences")
+    args = parser.parse_args()
+
+    async def _main():
+        async with AsyncSessionLocal() as db:
+            return await reconcile(db, dry_run=args.dry_run)
+
+    report = asyncio.run(_main())
+    if report["skipped"]:
+        raise SystemExit(f"Skipped: {report['skipped']}")
+    for item in report["drift"]:
+        print(f"{item['dim']}[{item['dimKey']}]: stored {item['stored']}, actual {item['actual']}")
+    print(f"{report['driftCount']} of {report['counters']} counters drifted ({'fixed' if report['fixed'] else 'dry run'})")
@@ -0,0 +1,102 @@
+import logging
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.models.bookFollowUpTable import BookFollowUpTable
+
+logger = logging.getLogger(__name__)
+
+
+class BookEvent(NamedTuple):
+    """A committed change to one bookFollowUpTable row."""
+    kind: str                 # "insert" | "update" | "delete"
+    book_id: Optional[int]
+    old: Dict[str, Any]       # column values before the change (empty for insert; may be partial)
+    new: Dict[str, Any]       # column values after the change (empty for delete)
+
+
+BOOK_COLUMNS = [column.key for column in BookFollowUpTable.__table__.columns]
+
+_subscribers: List[Callable[[List[BookEvent]], None]] = []
+
+
+def subscribe(handler: Callable[[List[BookEvent]], None]) -> None:
+    """
+    Register an in-process handler for committed book changes. Handlers run on the
+    event loop thread right after COMMIT, so they must be quick and must not do I/O
+    (kick off a task if they need to).
+    """
+    if handler not in _subscribers:
+        _subscribers.append(handler)
+
+
+def publish(events: List[BookEvent]) -> None:
+    for handler in list(_subscribers):
+        try:
+            handler(events)
+        except Exception as e:
+            logger.error(f"Book event handler {getattr(handler, '__name__', handler)} failed: {str(e)}", exc_info=True)
+
+
+def call_after_commit(session: Session, callback: Callable[[], None]) -> None:
+    """
+    Run callback once the session's transaction commits; a rollback drops it. For
+    process-wide caches that must not learn about rows before they exist for others.
+    Pass AsyncSession.sync_session for an async session.
+    """
+    session.info.setdefault("after_commit", []).append(callback)
+
+
+def _values(book: BookFollowUpTable) -> Dict[str, Any]:
+    return {key: getattr(book, key) for key in BOOK_COLUMNS}
+
+
+def _old_values(book: BookFollowUpTable) -> Dict[str, Any]:
+    """Values before the flush; columns whose previous value was never loaded are left out."""
+    state = inspect(book)
+    old = {}
+    for key in BOOK_COLUMNS:
+        history = state.attrs[key].history
+        if history.deleted:
+            old[key] = history.deleted[0]
+        elif history.unchanged:
+            old[key] = history.unchanged[0]
+    return old
+
+
+# Changes are collected per flush (ids are known by then) and only published once the
+# transaction commits; a rollback drops them. Every write path goes through the ORM,
+# so this covers insert_book, both update methods and anything added later.
+
+@event.listens_for(Session, "after_flush")
+def _collect_book_changes(session: Session, flush_context) -> None:
+    pending = session.info.setdefault("book_events", [])
+    for obj in session.new:
+        if isinstance(obj, BookFollowUpTable):
+            pending.append(BookEvent("insert", obj.id, {}, _values(obj)))
+    for obj in session.dirty:
+        if isinstance(obj, BookFollowUpTable) and session.is_modified(obj, include_collections=False):
+            pending.append(BookEvent("update", obj.id, _old_values(obj), _values(obj)))
+    for obj in session.deleted:
+        if isinstance(obj, BookFollowUpTable):
+            pending.append(BookEvent("delete", obj.id, _old_values(obj), {}))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_book_changes(session: Session) -> None:
+    events = session.info.pop("book_events", None)
+    if events:
+        publish(events)
+    for callback in session.info.pop("after_commit", ()):
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"After-commit callback {getattr(callback, '__name__', callback)} failed: {str(e)}", exc_info=True)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_book_changes(session: Session) -> None:
+    session.info.pop("book_events", None)
+    session.info.pop("after_commit", None)
@@ -0,0 +1,69 @@
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.config import settings
+from app.helper.ttl_cache import TTLCache
+from app.services.book_events import subscribe
+
+logger = logging.getLogger(__name__)
+
+
+# Total counts for the paginated listings, keyed by (listing, normalized filters).
+# Cleared whenever a book insert/update/delete is committed (book_events).
+count_cache = TTLCache(max_size=512, ttl_sec=settings.COUNT_CACHE_TTL_SEC, name="count_cache")
+
+INCLUDE_TOTAL_PATTERN = "^(false|approximate|exact)$"
+
+
+def count_cache_key(listing: str, filters: Dict[str, Any]) -> Tuple:
+    """Order-independent key that ignores unset filters."""
+    return (listing,) + tuple(sorted((k, v) for k, v in filters.items() if v not in (None, "")))
+
+
+def invalidate_counts(events=None) -> None:
+    count_cache.clear()
+
+
+subscribe(invalidate_counts)
+
+
+def cached_total(include_total: str, key: Tuple) -> Optional[int]:
+    """Cached total acceptable for the given includeTotal mode, or None."""
+    if include_total == "false":
+        return None
+    if include_total == "approximate":
+        return count_cache.get(key, max_age=settings.COUNT_CACHE_APPROX_MAX_AGE_SEC)
+    return count_cache.get(key)
+
+
+def store_total(key: Tuple, total: int) -> None:
+    count_cache.set(key, total)
+
+
+async def resolve_total(
+    db: AsyncSession,
+    include_total: str,
+    key: Tuple,
+    count_stmt,
+) -> Optional[int]:
+    """
+    Return the total for a listing according to includeTotal:
+        false       -> None, the count is skipped entirely
+        approximate -> cached value even if older than the TTL, else exact
+        exact       -> cached value within the TTL, else COUNT query
+    The listings count distinct bookNo values, so table row counts from the
+    catalog (sys.partitions) are no estimate of them and are not used.
+    """
+    if include_total == "false":
+        return None
+
+    cached = cached_total(include_total, key)
+    if cached is not None:
+        return cached
+
+    result = await db.execute(count_stmt)
+    total = result.scalar() or 0
+    store_total(key, total)
+    return total
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.config import settings
+from app.helper.metrics import cache_hit
+from app.models.bookFollowUpTable import (
+    BookStatusCounts, BookTypeCounts, CommitteeBookCount, DashboardSummary, DepartmentBookCount, UserBookCount,
+)
+from app.models.users import Users
+from app.services.book_counters import compute_counters, read_counters
+from app.services.book_events import subscribe
+from app.services.reference_cache import reference_cache
+
+logger = logging.getLogger(__name__)
+
+
+# Labels behind the fixed fields of BookTypeCounts / BookStatusCounts
+BOOK_TYPE_LABELS = {"External": "خارجي", "Internal": "داخلي", "Fax": "فاكس"}
+BOOK_STATUS_LABELS = {"Accomplished": "منجز", "Pending": "قيد الانجاز", "Deliberation": "مداولة"}
+
+
+async def _usernames(db: AsyncSession, user_ids: List[str]) -> Dict[str, str]:
+    ids = [int(user_id) for user_id in user_ids if user_id.isdigit()]
+    if not ids:
+        return {}
+    rows = (await db.execute(select(Users.id, Users.username).where(Users.id.in_(ids)))).fetchall()
+    return {str(row.id): row.username for row in rows if row.username is not None}
+
+
+async def build_summary(db: AsyncSession) -> DashboardSummary:
+    """
+    From book_counters (O(groups)); until those are reconciled, from the same
+    counts computed in one grouped scan of bookFollowUpTable.
+    """
+    counts = await read_counters(db)
+    if counts is None:
+        counts = await compute_counters(db)
+    await reference_cache.ensure_loaded(db)
+
+    by_dim: Dict[str, Dict[str, int]] = {}
+    for (dim, dim_key), cnt in counts.items():
+        by_dim.setdefault(dim, {})[dim_key] = cnt
+    by_type = by_dim.get("bookType", {})
+    by_status = by_dim.get("bookStatus", {})
+
+    # Per username, as before (books whose user does not exist are not listed)
+    by_user = by_dim.get("userID", {})
+    usernames = await _usernames(db, list(by_user))
+    user_counts: Dict[str, int] = {}
+    for user_id, cnt in by_user.items():
+        if user_id in usernames:
+            user_counts[usernames[user_id]] = user_counts.get(usernames[user_id], 0) + cnt
+    users = [UserBookCount(username=name, bookCount=cnt) for name, cnt in user_counts.items()]
+
+    committees = [
+        CommitteeBookCount(coID=int(coID), Com=reference_cache.committees.get(int(coID)), bookCount=cnt)
+        for coID, cnt in by_dim.get("committee", {}).items()
+    ]
+    departments = []
+    for pair, cnt in by_dim.get("department", {}).items():
+        coID, deID = (int(part) for part in pair.split(":"))
+        department = reference_cache.departments.get(deID)
+        departments.append(DepartmentBookCount(
+            coID=coID,
+            Com=reference_cache.committees.get(coID),
+            deID=deID,
+            departmentName=department[1] if department else None,
+            bookCount=cnt,
+        ))
+
+    users.sort(key=lambda item: (-item.bookCount, item.username))
+    committees.sort(key=lambda item: (-item.bookCount, item.coID))
+    departments.sort(key=lambda item: (-item.bookCount, item.coID, item.deID))
+    return DashboardSummary(
+        totalBooks=by_dim.get("total", {}).get("", 0),
+        bookTypes=BookTypeCounts(**{field: by_type.get(label, 0) for field, label in BOOK_TYPE_LABELS.items()}),
+        bookStatuses=BookStatusCounts(**{field: by_status.get(label, 0) for field, label in BOOK_STATUS_LABELS.items()}),
+        bookTypeBreakdown=by_type,
+        bookStatusBreakdown=by_status,
+        users=users,
+        committees=committees,
+        departments=departments,
+        generatedAt=datetime.now(),
+    )
+
+
+class DashboardSummaryCache:
+    """
+    The last DashboardSummary of this process. Committed book changes drop it
+    (book_events), DASHBOARD_SUMMARY_TTL_SEC bounds how long changes made by other
+    workers can go unseen, and concurrent requests after a drop share one rebuild.
+    """
+
+    def __init__(self):
+        self._summary: Optional[DashboardSummary] = None
+        self._built_at = 0.0
+        self._generation = 0
+        self._lock: Optional[asyncio.Lock] = None
+
+    def invalidate(self, events=None) -> None:
+        self._generation += 1
+        self._summary = None
+
+    def _fresh(self) -> Optional[DashboardSummary]:
+        if self._summary is not None and time.monotonic() - self._built_at <= settings.DASHBOARD_SUMMARY_TTL_SEC:
+            return self._summary
+        return None
+
+    async def get(self, db: AsyncSession) -> DashboardSummary:
+        summary = self._fresh()
+        cache_hit("dashboard_summary", summary is not None)
+        if summary is not None:
+            return summary
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            summary = self._fresh()  # built by the request we waited for
+            if summary is not None:
+                return summary
+
+            generation = self._generation
+            summary = await build_summary(db)
+            # A write committed while we were querying: serve the result once, don't keep it
+            if generation == self._generation:
+                self._summary = summary
+                self._built_at = time.monotonic()
+            logger.debug(f"Dashboard summary rebuilt: {summary.totalBooks} books")
+            return summary
+
+
+dashboard_summary = DashboardSummaryCache()
+subscribe(dashboard_summary.invalidate)
@@ -0,0 +1,128 @@
+import math
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Set, Tuple
+
+
+def _bigrams(text: str) -> Counter:
+    return Counter(text[i:i + 2] for i in range(len(text) - 1))
+
+
+def _min_matches(total_len: int, threshold: float) -> int:
+    """Smallest M with 2M / total_len > threshold (SequenceMatcher.ratio())."""
+    return math.floor(threshold * total_len / 2) + 1
+
+
+class FuzzyIndex:
+    """
+    Candidate pruning for "best SequenceMatcher(None, query.lower(), value.lower()).ratio()
+    above a threshold" over a set of distinct values. Only necessary conditions are used
+    to discard values, and the survivors are scored with the exact ratio, so the result
+    is the same as scoring every value.
+
+    With T = len(query) + len(value) and M matched characters, ratio = 2M / T, so:
+    - length: M <= min(len) bounds len(value) to a window around len(query);
+    - bigrams: SequenceMatcher's matching blocks are never adjacent in both strings,
+      so there are at most T - 2M + 1 blocks and the strings share at least
+      M - blocks >= 3M - T - 1 bigrams (counted with multiplicity).
+    Bigrams rather than trigrams: with a 0.8 threshold the trigram bound (M - 2 * blocks)
+    is <= 0 for most lengths and would not prune anything.
+    """
+
+    def __init__(self):
+        self._values: List[Optional[str]] = []     # value id -> value (None once removed)
+        self._lowered: List[Optional[str]] = []
+        self._ids: Dict[str, int] = {}
+        self._by_length: Dict[int, Set[int]] = {}
+        self._postings: Dict[str, Dict[int, int]] = {}  # bigram -> {value id: occurrences}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, value: str) -> None:
+        if not value or value in self._ids:
+            return
+        value_id = len(self._values)
+        lowered = value.lower()
+        self._values.append(value)
+        self._lowered.append(lowered)
+        self._ids[value] = value_id
+        self._by_length.setdefault(len(lowered), set()).add(value_id)
+        for gram, occurrences in _bigrams(lowered).items():
+            self._postings.setdefault(gram, {})[value_id] = occurrences
+
+    def remove(self, value: str) -> None:
+        value_id = self._ids.pop(value, None)
+        if value_id is None:
+            return
+        lowered = self._lowered[value_id]
+        self._values[value_id] = None
+        self._lowered[value_id] = None
+        self._by_length[len(lowered)].discard(value_id)
+        for gram in _bigrams(lowered):
+            postings = self._postings.get(gram)
+            if postings is not None:
+                postings.pop(value_id, None)
+                if not postings:
+                    del self._postings[gram]
+
+    def _candidates(self, query: str, threshold: float) -> Set[int]:
+        query_len = len(query)
+        # len(value) window from 2 * min(len) / T > threshold
+        lengths = [
+            length for length in self._by_length
+            if 2 * min(query_len, length) > threshold * (query_len + length)
+        ]
+        if not lengths:
+            return set()
+
+        required = {length: 3 * _min_matches(query_len + length, threshold) - (query_len + length) - 1
+                    for length in lengths}
+        least_required = min(required.values())
+
+        if least_required <= 0:
+            # Bigrams cannot rule anything out for some lengths: take those buckets whole
+            candidates = set()
+            for length in lengths:
+                candidates |= self._by_length[length]
+            return candidates
+
+        # Prefix filter: a value sharing >= k of the query's n bigram occurrences must
+        # contain one of any n - k + 1 of them; probe with the rarest ones.
+        query_grams = _bigrams(query)
+        occurrences = sorted(
+            (gram for gram, count in query_grams.items() for _ in range(count)),
+            key=lambda gram: len(self._postings.get(gram, ())),
+        )
+        probe = set(occurrences[:len(occurrences) - least_required + 1])
+        wanted_lengths = set(lengths)
+
+        candidates = set()
+        for gram in probe:
+            for value_id in self._postings.get(gram, ()):
+                if value_id in candidates:
+                    continue
+                lowered = self._lowered[value_id]
+                if len(lowered) not in wanted_lengths:
+                    continue
+                shared = sum(
+                    min(count, self._postings.get(other, {}).get(value_id, 0))
+                    for other, count in query_grams.items()
+                )
+                if shared >= required[len(lowered)]:
+                    candidates.add(value_id)
+        return candidates
+
+    def matches(self, query: str, threshold: float = 0.8) -> List[Tuple[str, float]]:
+        """All values with ratio > threshold, best first (ties alphabetical)."""
+        lowered_query = query.lower()
+        results = []
+        for value_id in self._candidates(lowered_query, threshold):
+            matcher = SequenceMatcher(None, lowered_query, self._lowered[value_id])
+            if matcher.real_quick_ratio() <= threshold or matcher.quick_ratio() <= threshold:
+                continue
+            similarity = matcher.ratio()
+            if similarity > threshold:
+                results.append((self._values[value_id], similarity))
+        results.sort(key=lambda item: (-item[1], item[0]))
+        return results
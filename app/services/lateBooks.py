@@ -1,12 +1,17 @@
 from fastapi import HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import Date, select, func, cast
-from datetime import datetime, timedelta, timezone
-from typing import Dict, Any
-from app.models.architecture.committees import Committee
-from app.models.architecture.department import Department
-from app.models.bookFollowUpTable import BookFollowUpTable, BookJunctionBridge, CommitteeDepartmentsJunction
+from sqlalchemy import Date, case, select, cast, true
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional
+from app.models.bookFollowUpTable import BookFollowUpTable
 from app.models.users import Users
+from app.services.reference_cache import EMPTY_JUNCTION, reference_cache
+from app.services.late_books_snapshot import late_books_snapshot
+from app.helper.metrics import cache_hit
+from app.services.book_aging import (
+    AGE_BUCKET_NAMES, age_bucket_of, age_buckets_clause, age_date_column, bucket_count_columns,
+    empty_bucket_counts, parse_age_buckets,
+)
 
 import logging
 
@@ -21,23 +26,50 @@ if not logger.handlers:  # Avoid duplicate handlers
 
 class LateBookFollowUpService:
 
+    @staticmethod
+    def _age_order(columns, sort: str) -> list:
+        """ORDER BY for sort=currentDate | age_desc (oldest first) | age_asc; columns: table or subquery .c"""
+        if sort == "age_desc":
+            return [case((columns.ageDate.is_(None), 1), else_=0), columns.ageDate.asc(), columns.id.desc()]
+        if sort == "age_asc":
+            return [columns.ageDate.desc(), columns.id.desc()]
+        return [columns.currentDate.desc(), columns.id.desc()]
+
     @staticmethod
     async def getLateBooks(
         db: AsyncSession,
         page: int = 1,
         limit: int = 10,
         userID: int = None,
+        includeTotal: str = "exact",
+        ageBucket: Optional[str] = None,
+        sort: str = "currentDate",
     ) -> Dict[str, Any]:
         """
         Retrieve late books (status 'قيد الانجاز') with pagination filtered by userID.
         Updated for new multi-department schema with junctions and bridges.
+        Each book carries ageDays/ageBucket (days since incomingDate, else bookDate);
+        ageBucket="31-90,90+" keeps only those buckets and ageBuckets holds the count of
+        every bucket for the user. The counts come with the page in one statement, so
+        includeTotal only decides whether total/totalPages or hasMore are returned.
         """
         try:
-            logger.info(f"Getting late books for userID: {userID}, page: {page}, limit: {limit}")
+            logger.info(f"Getting late books for userID: {userID}, page: {page}, limit: {limit}, ageBucket: {ageBucket}, sort: {sort}")
             
             # Validate userID
             if not userID:
                 raise HTTPException(status_code=400, detail="userID is required")
+            buckets = parse_age_buckets(ageBucket)
+
+            snapshot_ready = late_books_snapshot.ready()
+            cache_hit("late_books_snapshot", snapshot_ready)
+            if snapshot_ready:
+                return await LateBookFollowUpService._late_books_from_snapshot(
+                    db, page, limit, userID, includeTotal, buckets, sort
+                )
+
+            today = date.today()
+            offset = (page - 1) * limit
 
             # Base filter conditions
             base_filters = [
@@ -45,30 +77,14 @@ class LateBookFollowUpService:
                 BookFollowUpTable.userID == userID
             ]
 
-            # Step 1: Count total records WITH userID filter applied
-            count_stmt = select(func.count(BookFollowUpTable.id)).filter(*base_filters)
-            count_result = await db.execute(count_stmt)
-            total = count_result.scalar() or 0
-            
-            logger.info(f"Total late books for userID {userID}: {total}")
-
-            # Step 2: Calculate offset and validate page
-            offset = (page - 1) * limit
-            total_pages = (total + limit - 1) // limit if total > 0 else 1
-            
-            # Validate page number
-            if page > total_pages and total > 0:
-                logger.warning(f"Page {page} exceeds total pages {total_pages}")
-                return {
-                    "data": [],
-                    "total": total,
-                    "page": page,
-                    "limit": limit,
-                    "totalPages": total_pages
-                }
+            # Step 1: Bucket counts over all of the user's late books (CTE) ...
+            bucket_counts = select(*bucket_count_columns(today)).where(*base_filters).cte("bucket_counts")
 
-            # Step 3: Build query for paginated data with primary junction info
-            query = select(
+            # Step 2: ... and the requested page; bucket filters are plain date ranges (index friendly)
+            page_filters = list(base_filters)
+            if buckets:
+                page_filters.append(age_buckets_clause(buckets, today))
+            page_query = select(
                 BookFollowUpTable.id,
                 BookFollowUpTable.bookType,
                 BookFollowUpTable.bookNo,
@@ -85,67 +101,35 @@ class LateBookFollowUpService:
                 BookFollowUpTable.currentDate,
                 BookFollowUpTable.userID,
                 Users.username,
-                # Get primary department and committee from junction
-                Department.deID,
-                Department.departmentName,
-                Committee.coID,
-                Committee.Com
+                age_date_column().label("ageDate")
             ).outerjoin(
                 Users, BookFollowUpTable.userID == Users.id
-            ).outerjoin(
-                # Join through junctionID instead of direct deID
-                CommitteeDepartmentsJunction, 
-                BookFollowUpTable.junctionID == CommitteeDepartmentsJunction.id
-            ).outerjoin(
-                Department, CommitteeDepartmentsJunction.deID == Department.deID
-            ).outerjoin(
-                Committee, CommitteeDepartmentsJunction.coID == Committee.coID
             ).filter(
-                *base_filters
-            ).order_by(
-                BookFollowUpTable.currentDate.desc()
-            ).offset(offset).limit(limit)
+                *page_filters
+            )
+            page_query = page_query.order_by(
+                *LateBookFollowUpService._age_order(page_query.selected_columns, sort)
+            ).offset(offset).limit(limit).subquery("page")
 
-            # Execute main query
-            result = await db.execute(query)
-            late_books = result.fetchall()
+            # Step 3: One round trip; the LEFT JOIN keeps the counts when the page is empty
+            query = (
+                select(bucket_counts, page_query)
+                .select_from(bucket_counts.outerjoin(page_query, true()))
+                .order_by(*LateBookFollowUpService._age_order(page_query.c, sort))
+            )
+            rows = (await db.execute(query)).fetchall()
 
-            # Step 4: Get ALL departments for each book (optional - for complete multi-department view)
-            book_ids = [book.id for book in late_books]
-            dept_map = {}
-            
-            if book_ids:
-                # Query to get all departments for each late book
-                all_departments_stmt = (
-                    select(
-                        BookFollowUpTable.id.label('book_id'),
-                        Department.deID,
-                        Department.departmentName,
-                        Committee.coID,
-                        Committee.Com
-                    )
-                    .select_from(BookFollowUpTable)
-                    .join(BookJunctionBridge, BookFollowUpTable.id == BookJunctionBridge.bookID)
-                    .join(CommitteeDepartmentsJunction, BookJunctionBridge.junctionID == CommitteeDepartmentsJunction.id)
-                    .join(Committee, CommitteeDepartmentsJunction.coID == Committee.coID)
-                    .join(Department, CommitteeDepartmentsJunction.deID == Department.deID)
-                    .filter(BookFollowUpTable.id.in_(book_ids))
-                    .order_by(BookFollowUpTable.id, Department.departmentName)
-                )
-                
-                dept_result = await db.execute(all_departments_stmt)
-                dept_rows = dept_result.fetchall()
-                
-                # Group departments by book_id
-                for dept in dept_rows:
-                    if dept.book_id not in dept_map:
-                        dept_map[dept.book_id] = []
-                    dept_map[dept.book_id].append({
-                        "deID": dept.deID,
-                        "departmentName": dept.departmentName,
-                        "coID": dept.coID,
-                        "Com": dept.Com
-                    })
+            counts = empty_bucket_counts()
+            if rows:
+                counts = {name: getattr(rows[0], f"bucket_{i}") or 0 for i, name in enumerate(AGE_BUCKET_NAMES)}
+            late_books = [row for row in rows if row.id is not None]
+            total = sum(counts[name] for name in (buckets or AGE_BUCKET_NAMES))
+            total_pages = (total + limit - 1) // limit if total > 0 else 1
+            logger.info(f"Total late books for userID {userID}: {total} ({counts})")
+
+            # Step 4: Primary junction and ALL departments of each book (bridge table + cache)
+            primary_map = await reference_cache.resolve_junctions(db, [book.junctionID for book in late_books])
+            dept_map = await reference_cache.departments_for_books(db, [book.id for book in late_books])
 
             logger.info(f"Retrieved {len(late_books)} records for page {page}")
 
@@ -153,7 +137,9 @@ class LateBookFollowUpService:
             data = []
             for i, book in enumerate(late_books):
                 all_departments = dept_map.get(book.id, [])
+                primary = primary_map.get(book.junctionID, EMPTY_JUNCTION)
                 dept_names = [dept["departmentName"] for dept in all_departments if dept["departmentName"]]
+                age_days = (today - book.ageDate).days if book.ageDate else None
                 
                 data.append({   
                     "serialNo": offset + i + 1,
@@ -171,14 +157,16 @@ class LateBookFollowUpService:
                     "bookStatus": book.bookStatus,
                     "notes": book.notes,
                     "currentDate": book.currentDate.strftime('%Y-%m-%d') if book.currentDate else None,
+                    "ageDays": age_days,
+                    "ageBucket": age_bucket_of(age_days),
                     "userID": book.userID,
                     "username": book.username,
                     
                     # Primary department info (from junctionID)
-                    "deID": book.deID,
-                    "departmentName": book.departmentName,
-                    "coID": book.coID,
-                    "Com": book.Com,
+                    "deID": primary.deID,
+                    "departmentName": primary.departmentName,
+                    "coID": primary.coID,
+                    "Com": primary.Com,
                     
                     # All departments for this book
                     "all_departments": all_departments,
@@ -189,14 +177,9 @@ class LateBookFollowUpService:
                 })
 
             # Step 6: Response with proper pagination info
-            response = {
-                "data": data,
-                "total": total,
-                "page": page,
-                "limit": limit,
-                "totalPages": total_pages
-            }
-            
+            response = LateBookFollowUpService._late_books_response(
+                data, total, page, limit, includeTotal, counts
+            )
             logger.info(f"Response: {len(data)} records, Total: {total}, Page: {page}/{total_pages}")
             return response
             
@@ -206,6 +189,33 @@ class LateBookFollowUpService:
             logger.error(f"Error fetching late books: {str(e)}", exc_info=True)
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+    @staticmethod
+    def _late_books_response(
+        data: List[Dict[str, Any]], total: int, page: int, limit: int, includeTotal: str, counts: Dict[str, int]
+    ) -> Dict[str, Any]:
+        response = {
+            "data": data,
+            "total": total,
+            "page": page,
+            "limit": limit,
+            "totalPages": (total + limit - 1) // limit if total > 0 else 1,
+            "ageBuckets": counts
+        }
+        if includeTotal == "false":
+            response.update(total=None, totalPages=None, hasMore=page * limit < total)
+        return response
+
+    @staticmethod
+    async def _late_books_from_snapshot(
+        db: AsyncSession, page: int, limit: int, userID: int, includeTotal: str, buckets: List[str], sort: str
+    ) -> Dict[str, Any]:
+        """Same response as the database path, paged from the in-memory snapshot."""
+        offset = (page - 1) * limit
+        data, total, counts = await late_books_snapshot.page(db, userID, offset, limit, buckets, sort)
+        response = LateBookFollowUpService._late_books_response(data, total, page, limit, includeTotal, counts)
+        logger.info(f"Late books from snapshot: {len(data)} records, Total: {total}, Page: {page}/{response['totalPages']}")
+        return response
+
 
 
     # # Alternative simplified version if you only need primary department
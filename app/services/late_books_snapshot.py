@@ -0,0 +1,276 @@
+import bisect
+import logging
+import time
+from datetime import date, datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.config import settings
+from app.database.database import AsyncSessionLocal
+from app.models.bookFollowUpTable import BookFollowUpTable, BookJunctionBridge
+from app.models.users import Users
+from app.services.book_aging import age_bucket_of, age_date, empty_bucket_counts
+from app.services.book_events import BookEvent, subscribe
+from app.services.reference_cache import EMPTY_JUNCTION, reference_cache
+
+logger = logging.getLogger(__name__)
+
+
+PENDING_STATUS = "قيد الانجاز"
+
+LATE_BOOK_COLUMNS = [
+    "id", "bookType", "bookNo", "bookDate", "directoryName", "junctionID", "incomingNo", "incomingDate",
+    "subject", "destination", "bookAction", "bookStatus", "notes", "currentDate", "userID",
+]
+_DATE_COLUMNS = ("bookDate", "incomingDate", "currentDate")
+
+
+class LateBook(NamedTuple):
+    values: Dict[str, Any]            # LATE_BOOK_COLUMNS
+    junction_ids: Optional[List[int]]  # bridge junctions; None = not known yet (changed by a write)
+
+
+def _as_date(value: Any) -> Optional[date]:
+    # Update paths may assign 'YYYY-MM-DD' strings to date columns
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        try:
+            return date.fromisoformat(value[:10])
+        except ValueError:
+            return None
+    return value
+
+
+def _sort_key(values: Dict[str, Any]) -> Tuple:
+    """ORDER BY currentDate DESC (NULLs last, as SQL Server does), id DESC."""
+    current = values["currentDate"]
+    return (current is None, -(current.toordinal() if current else 0), -values["id"])
+
+
+def _is_pending(values: Dict[str, Any]) -> bool:
+    status = values.get("bookStatus")
+    return status is not None and status.rstrip() == PENDING_STATUS
+
+
+class LateBooksSnapshot:
+    """
+    Pending ('قيد الانجاز') books per user, kept in memory so /lateBooks pages are
+    served without touching bookFollowUpTable. The scheduler (app.services.scheduler)
+    reloads it every LATE_BOOKS_REFRESH_SEC; committed writes update it in between
+    through book_events. Departments of books changed by a write are looked up again
+    when they are first shown. book_events is per process: with several workers, a
+    write handled by another worker is picked up by the next reload only.
+    """
+
+    def __init__(self):
+        self.books: Dict[int, LateBook] = {}
+        self.by_user: Dict[str, List[Tuple[Tuple, int]]] = {}  # userID -> sorted [(sort key, book id)]
+        self.usernames: Dict[str, Optional[str]] = {}
+        self.loaded = False
+        self.loaded_at = 0.0
+        self._buffer: Optional[List[List[BookEvent]]] = None  # events to replay after a reload
+
+    # ---------- maintenance ----------
+
+    def _add(self, values: Dict[str, Any], junction_ids: Optional[List[int]]) -> None:
+        values = {key: values.get(key) for key in LATE_BOOK_COLUMNS}
+        for key in _DATE_COLUMNS:
+            values[key] = _as_date(values[key])
+        user_key = str(values["userID"]) if values["userID"] is not None else None
+        values["userID"] = user_key
+        self.books[values["id"]] = LateBook(values, junction_ids)
+        if user_key is not None:
+            bisect.insort(self.by_user.setdefault(user_key, []), (_sort_key(values), values["id"]))
+
+    def _remove(self, book_id: int) -> None:
+        book = self.books.pop(book_id, None)
+        if book is None or book.values["userID"] is None:
+            return
+        entries = self.by_user.get(book.values["userID"], [])
+        entry = (_sort_key(book.values), book_id)
+        i = bisect.bisect_left(entries, entry)
+        if i < len(entries) and entries[i] == entry:
+            entries.pop(i)
+        if not entries:
+            self.by_user.pop(book.values["userID"], None)
+
+    def _apply(self, events: List[BookEvent]) -> None:
+        for event in events:
+            if event.book_id is None:
+                continue
+            self._remove(event.book_id)
+            if event.kind != "delete" and _is_pending(event.new):
+                self._add(event.new, None)
+
+    def departments_changed(self, book_id: int) -> None:
+        """Bridge rows of a book were replaced (publishes no book event): look them up again."""
+        book = self.books.get(book_id)
+        if book is not None:
+            self.books[book_id] = book._replace(junction_ids=None)
+
+    def apply_events(self, events: List[BookEvent]) -> None:
+        if self._buffer is not None:
+            self._buffer.append(events)
+        if self.loaded:
+            self._apply(events)
+
+    async def load(self, db: AsyncSession) -> Dict[str, int]:
+        """Reload every pending book from the database and swap the result in."""
+        self._buffer = []
+        try:
+            columns = [getattr(BookFollowUpTable, column) for column in LATE_BOOK_COLUMNS]
+            rows = (await db.execute(
+                select(*columns).where(BookFollowUpTable.bookStatus == PENDING_STATUS)
+            )).fetchall()
+            bridge_rows = (await db.execute(
+                select(BookJunctionBridge.bookID, BookJunctionBridge.junctionID)
+                .join(BookFollowUpTable, BookFollowUpTable.id == BookJunctionBridge.bookID)
+                .where(BookFollowUpTable.bookStatus == PENDING_STATUS)
+            )).fetchall()
+            user_rows = (await db.execute(select(Users.id, Users.username))).fetchall()
+            buffered = self._buffer
+        finally:
+            self._buffer = None
+
+        junctions: Dict[int, List[int]] = {}
+        for row in bridge_rows:
+            junctions.setdefault(row.bookID, []).append(row.junctionID)
+
+        fresh = LateBooksSnapshot()
+        for row in rows:
+            fresh._add(dict(row._mapping), junctions.get(row.id, []))
+        for events in buffered:
+            fresh._apply(events)
+
+        self.books, self.by_user = fresh.books, fresh.by_user
+        self.usernames = {str(row.id): row.username for row in user_rows}
+        self.loaded = True
+        self.loaded_at = time.monotonic()
+        stats = {"books": len(self.books), "users": len(self.by_user)}
+        logger.info(f"Late books snapshot loaded: {stats}")
+        return stats
+
+    async def refresh(self) -> None:
+        """Scheduler job: reload with a fresh session."""
+        try:
+            async with AsyncSessionLocal() as session:
+                await self.load(session)
+        except Exception as e:
+            logger.error(f"Late books snapshot refresh failed: {str(e)}")
+
+    def ready(self) -> bool:
+        """Loaded, and refreshed recently enough (i.e. the scheduler is running)."""
+        max_age = settings.LATE_BOOKS_SNAPSHOT_MAX_AGE_SEC
+        return self.loaded and (not max_age or time.monotonic() - self.loaded_at <= max_age)
+
+    # ---------- reads ----------
+
+    def count(self, userID: Any) -> int:
+        return len(self.by_user.get(str(userID), []))
+
+    async def page(
+        self, db: AsyncSession, userID: Any, offset: int, limit: int,
+        buckets: Optional[List[str]] = None, sort: str = "currentDate",
+    ) -> Tuple[List[Dict[str, Any]], int, Dict[str, int]]:
+        """
+        One page of a user's pending books as /lateBooks records, the number of books
+        in the selected age buckets and the count of every bucket (see book_aging).
+        """
+        user_key = str(userID)
+        today = date.today()
+        counts = empty_bucket_counts()
+        selected = []
+        for _, book_id in self.by_user.get(user_key, []):
+            values = self.books[book_id].values
+            since = age_date(values["incomingDate"], values["bookDate"])
+            bucket = age_bucket_of((today - since).days if since else None)
+            counts[bucket] += 1
+            if not buckets or bucket in buckets:
+                selected.append((since, book_id))
+        total = len(selected)
+
+        if sort == "age_desc":  # oldest first, unknown age last, then id DESC (list is already id DESC within a date)
+            selected.sort(key=lambda item: (item[0] is None, item[0].toordinal() if item[0] else 0, -item[1]))
+        elif sort == "age_asc":  # newest first, NULLs last (SQL Server sorts NULL lowest)
+            selected.sort(key=lambda item: (item[0] is None, -(item[0].toordinal() if item[0] else 0), -item[1]))
+        books = [self.books[book_id] for _, book_id in selected[offset:offset + limit]]
+
+        unknown = [book.values["id"] for book in books if book.junction_ids is None]
+        if unknown:
+            rows = (await db.execute(
+                select(BookJunctionBridge.bookID, BookJunctionBridge.junctionID)
+                .where(BookJunctionBridge.bookID.in_(unknown))
+            )).fetchall()
+            found: Dict[int, List[int]] = {book_id: [] for book_id in unknown}
+            for row in rows:
+                found[row.bookID].append(row.junctionID)
+            for i, book in enumerate(books):
+                if book.junction_ids is None and book.values["id"] in self.books:
+                    books[i] = self.books[book.values["id"]] = book._replace(junction_ids=found[book.values["id"]])
+
+        if user_key not in self.usernames and user_key.isdigit():
+            user = (await db.execute(select(Users.username).where(Users.id == int(user_key)))).first()
+            self.usernames[user_key] = user.username if user else None
+
+        junction_ids = [book.values["junctionID"] for book in books]
+        for book in books:
+            junction_ids.extend(book.junction_ids or [])
+        refs = await reference_cache.resolve_junctions(db, junction_ids)
+
+        records = []
+        for i, book in enumerate(books):
+            values = book.values
+            since = age_date(values["incomingDate"], values["bookDate"])
+            age_days = (today - since).days if since else None
+            primary = refs.get(values["junctionID"], EMPTY_JUNCTION)
+            all_departments = []
+            for junction_id in book.junction_ids or []:
+                ref = refs.get(junction_id, EMPTY_JUNCTION)
+                if ref.coID is None or ref.deID is None:
+                    continue
+                all_departments.append({
+                    "deID": ref.deID,
+                    "departmentName": ref.departmentName,
+                    "coID": ref.coID,
+                    "Com": ref.Com
+                })
+            all_departments.sort(key=lambda dept: dept["departmentName"] or "")
+            dept_names = [dept["departmentName"] for dept in all_departments if dept["departmentName"]]
+
+            records.append({
+                "serialNo": offset + i + 1,
+                "id": values["id"],
+                "bookType": values["bookType"],
+                "bookNo": values["bookNo"],
+                "bookDate": values["bookDate"].strftime('%Y-%m-%d') if values["bookDate"] else None,
+                "directoryName": values["directoryName"],
+                "junctionID": values["junctionID"],
+                "incomingNo": values["incomingNo"],
+                "incomingDate": values["incomingDate"].strftime('%Y-%m-%d') if values["incomingDate"] else None,
+                "subject": values["subject"],
+                "destination": values["destination"],
+                "bookAction": values["bookAction"],
+                "bookStatus": values["bookStatus"],
+                "notes": values["notes"],
+                "currentDate": values["currentDate"].strftime('%Y-%m-%d') if values["currentDate"] else None,
+                "ageDays": age_days,
+                "ageBucket": age_bucket_of(age_days),
+                "userID": values["userID"],
+                "username": self.usernames.get(user_key),
+                "deID": primary.deID,
+                "departmentName": primary.departmentName,
+                "coID": primary.coID,
+                "Com": primary.Com,
+                "all_departments": all_departments,
+                "department_names": ", ".join(dept_names),
+                "department_count": len(all_departments),
+                "pdfFiles": []
+            })
+        return records, total, counts
+
+
+late_books_snapshot = LateBooksSnapshot()
+subscribe(late_books_snapshot.apply_events)
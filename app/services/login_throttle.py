@@ -0,0 +1,61 @@
+import logging
+from typing import Optional
+
+from fastapi import HTTPException
+
+from app.database.config import settings
+from app.helper import metrics
+from app.helper.rate_limit import MemoryRateLimitStore, RateLimitStore, retry_after_header
+
+logger = logging.getLogger(__name__)
+
+
+class LoginThrottle:
+    """
+    Sliding-window limits on /auth/login attempts, per username and per client IP,
+    checked before the user lookup and the bcrypt verification. A successful login
+    clears the username's window (its IP window keeps counting).
+    """
+
+    def __init__(self, store: Optional[RateLimitStore] = None):
+        self.store = store or MemoryRateLimitStore(max_keys=settings.LOGIN_THROTTLE_MAX_KEYS)
+        self.rejected = 0
+
+    def use_store(self, store: RateLimitStore) -> None:
+        """Swap in a shared store (all workers then count attempts together)."""
+        self.store = store
+
+    @staticmethod
+    def _user_key(username: Optional[str]) -> str:
+        return f"login:user:{(username or '').strip().lower()}"
+
+    @staticmethod
+    def _ip_key(client_ip: Optional[str]) -> str:
+        return f"login:ip:{client_ip or 'unknown'}"
+
+    async def check(self, username: Optional[str], client_ip: Optional[str]) -> None:
+        """Count one attempt; 429 with Retry-After once either window is full."""
+        window = settings.LOGIN_THROTTLE_WINDOW_SEC
+        limits = (
+            (self._ip_key(client_ip), settings.LOGIN_THROTTLE_IP_LIMIT),
+            (self._user_key(username), settings.LOGIN_THROTTLE_USER_LIMIT),
+        )
+        for key, limit in limits:
+            if not limit:
+                continue
+            retry_after = await self.store.hit(key, limit, window)
+            if retry_after is not None:
+                self.rejected += 1
+                metrics.login_throttled.inc()
+                logger.warning(f"Login throttled ({key}), retry in {retry_after:.0f}s")
+                raise HTTPException(
+                    status_code=429,
+                    detail="Too many login attempts, please try again later",
+                    headers={"Retry-After": retry_after_header(retry_after)}
+                )
+
+    async def succeeded(self, username: Optional[str]) -> None:
+        await self.store.reset(self._user_key(username))
+
+
+login_throttle = LoginThrottle()
@@ -0,0 +1,51 @@
+import logging
+import os
+from typing import NamedTuple, Optional
+
+import anyio
+
+from app.database.config import settings
+from app.helper.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class PdfLocation(NamedTuple):
+    path: str
+    sha256: Optional[str]
+    fileName: Optional[str]
+    stat_result: os.stat_result  # size / mtime used for Content-Length, ETag, Last-Modified
+
+
+# pdf_id -> PdfLocation for GET /pdf/file/{pdf_id}. A PDFTable row never changes after
+# insert, so entries are only dropped on delete (this worker), on LRU eviction, or
+# after PDF_PATH_CACHE_TTL_SEC (covers deletes made by other workers).
+pdf_path_cache = TTLCache(
+    max_size=settings.PDF_PATH_CACHE_SIZE,
+    ttl_sec=settings.PDF_PATH_CACHE_TTL_SEC,
+    name="pdf_path_cache",
+)
+
+
+def lookup_pdf(pdf_id: int) -> Optional[PdfLocation]:
+    return pdf_path_cache.get(pdf_id)
+
+
+async def remember_pdf(
+    pdf_id: int, path: str, sha256: Optional[str] = None, file_name: Optional[str] = None
+) -> Optional[PdfLocation]:
+    """Stat the file (off the event loop) and cache its location. None if it cannot be read."""
+    try:
+        stat_result = await anyio.to_thread.run_sync(os.stat, path)
+    except OSError as e:
+        logger.warning(f"Cannot stat PDF {pdf_id} at {path}: {str(e)}")
+        pdf_path_cache.pop(pdf_id)
+        return None
+
+    location = PdfLocation(path, sha256, file_name, stat_result)
+    pdf_path_cache.set(pdf_id, location)
+    return location
+
+
+def forget_pdf(pdf_id: int) -> None:
+    pdf_path_cache.pop(pdf_id)
@@ -4,9 +4,13 @@ import os
 from fastapi import HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func,delete
+from app.database.database import AsyncSessionLocal
 from app.helper.save_pdf import async_delayed_delete
 from app.models.PDFTable import PDFTable, PDFCreate
+from app.services.pdf_path_cache import forget_pdf, remember_pdf
+from app.services.pdf_text import forget_pdf_text, schedule_pdf_text_extraction
 from pathlib import Path
+from typing import Optional
 from app.database.config import settings
 import asyncio
 
@@ -37,15 +41,28 @@ class PDFService:
         return len(records)
 
     @staticmethod
-    async def insert_pdf(db: AsyncSession, pdf: PDFCreate) -> PDFTable:
+    async def insert_pdf(db: AsyncSession, pdf: PDFCreate, commit: bool = True) -> PDFTable:
         """
         Inserts a new PDF record into the database.
+        With commit=False the record is only flushed into the caller's transaction;
+        the caller commits and then calls pdf_committed().
         """
         new_pdf = PDFTable(**pdf.model_dump())
         db.add(new_pdf)
+        if not commit:
+            await db.flush()
+            return new_pdf
         await db.commit()
         await db.refresh(new_pdf)
+        await PDFService.pdf_committed(new_pdf)
         return new_pdf
+
+    @staticmethod
+    async def pdf_committed(new_pdf: PDFTable) -> None:
+        """Cache the location and start text extraction of a committed PDF record."""
+        if new_pdf.pdf:
+            await remember_pdf(new_pdf.id, new_pdf.pdf, new_pdf.sha256, new_pdf.fileName)
+            schedule_pdf_text_extraction(new_pdf.id)  # background; does not delay the upload
     
 
 
@@ -102,12 +119,22 @@ class PDFService:
             delete_stmt = delete(PDFTable).filter(PDFTable.id == id)
             await db.execute(delete_stmt)
             await db.commit()
+            forget_pdf(id)
+            await forget_pdf_text(db, id)
             logger.debug(f"Deleted PDFTable record with ID: {id}")
 
+            # Content-addressed files can be shared by several records: keep the file
+            # until the last record pointing at it is gone
+            if await PDFService._file_referenced(db, pdf_record.pdf, pdf_record.sha256):
+                logger.debug(f"PDF file still referenced by other records, keeping: {pdf_path}")
+                return True
+
             # Step 5: Delete the file from the filesystem
             if os.path.exists(pdf_path):
                 # os.remove(pdf_path)
-                asyncio.create_task(async_delayed_delete(pdf_path, delay_sec=3))
+                asyncio.create_task(
+                    PDFService._delayed_delete_unreferenced(pdf_path, pdf_record.pdf, pdf_record.sha256, delay_sec=3)
+                )
                 logger.debug(f"Deleted PDF file from filesystem: {pdf_path}")
             else:
                 logger.warning(f"PDF file not found on filesystem: {pdf_path}")
@@ -123,6 +150,37 @@ class PDFService:
             await db.rollback()
             return False
 
+    @staticmethod
+    async def _file_referenced(db: AsyncSession, stored_path: str, sha256: Optional[str]) -> bool:
+        """
+        True if a PDFTable record still points at the file. Shared (content-addressed)
+        files always have a sha256, so the lookup goes through the sha256 index; records
+        without one predate content addressing and own their file.
+        """
+        if not sha256:
+            return False
+        result = await db.execute(
+            select(func.count()).select_from(PDFTable)
+            .where(PDFTable.sha256 == sha256, PDFTable.pdf == stored_path)
+        )
+        return result.scalar_one() > 0
+
+    @staticmethod
+    async def _delayed_delete_unreferenced(
+        pdf_path: str, stored_path: str, sha256: Optional[str], delay_sec: int = 3
+    ) -> None:
+        """async_delayed_delete, unless an upload of the same content references the file again meanwhile."""
+        await asyncio.sleep(delay_sec)
+        try:
+            async with AsyncSessionLocal() as session:
+                if await PDFService._file_referenced(session, stored_path, sha256):
+                    logger.debug(f"PDF file referenced again before deletion, keeping: {pdf_path}")
+                    return
+        except Exception as e:
+            logger.error(f"Could not re-check references of {pdf_path}, keeping it: {str(e)}")
+            return
+        await async_delayed_delete(pdf_path, delay_sec=0)
+
     @staticmethod
     def is_safe_path(base_path: str, path: str) -> bool:
      
@@ -0,0 +1,163 @@
+import argparse
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Optional, Set
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.config import settings
+from app.database.database import AsyncSessionLocal
+from app.helper.pdf_text import ExtractedText, extract_pdf_text_async, extraction_available
+from app.models.PDFTable import PDFTable, PDFTextTable
+from app.services.search_index import search_index
+
+logger = logging.getLogger(__name__)
+
+
+# Background extraction of the PDF text layer. insert_pdf only schedules the work,
+# so uploads return as before; the parsing itself runs in the worker processes of
+# app.helper.pdf_text and the result is stored in PDFTextTable and indexed for /search.
+
+_pending: Set[asyncio.Task] = set()  # strong references until the tasks finish
+_slots: Optional[asyncio.Semaphore] = None
+
+
+def _get_slots() -> asyncio.Semaphore:
+    # One extraction per worker process at a time; the rest wait here, not in the pool
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(settings.PDF_TEXT_WORKERS)
+    return _slots
+
+
+async def _store_text(db: AsyncSession, pdf: PDFTable, result: ExtractedText) -> PDFTextTable:
+    row = await db.get(PDFTextTable, pdf.id)
+    if row is None:
+        row = PDFTextTable(pdfID=pdf.id)
+        db.add(row)
+    row.bookID = pdf.bookID
+    row.sha256 = pdf.sha256
+    row.status = result.status
+    row.pageCount = result.page_count
+    row.text = result.text or None
+    row.error = result.error
+    row.extractedAt = datetime.now()
+    await db.commit()
+    return row
+
+
+async def _reusable_text(db: AsyncSession, sha256: Optional[str]) -> Optional[ExtractedText]:
+    """Text already extracted from an identical file (same content hash)."""
+    if not sha256:
+        return None
+    result = await db.execute(
+        select(PDFTextTable.status, PDFTextTable.text, PDFTextTable.pageCount)
+        .where(PDFTextTable.sha256 == sha256, PDFTextTable.status.in_(("done", "empty")))
+        .limit(1)
+    )
+    row = result.first()
+    if row is None:
+        return None
+    return ExtractedText(row.status, row.text or "", row.pageCount or 0)
+
+
+async def extract_and_store(pdf_id: int) -> Optional[str]:
+    """Extract, store and index the text of one PDFTable row. Returns the status."""
+    async with _get_slots():
+        async with AsyncSessionLocal() as db:
+            pdf = await db.get(PDFTable, pdf_id)
+            if pdf is None or not pdf.pdf:
+                return None
+
+            result = await _reusable_text(db, pdf.sha256)
+            if result is None:
+                result = await extract_pdf_text_async(pdf.pdf)
+            if result.status == "failed":
+                logger.warning(f"PDF text extraction failed for {pdf_id}: {result.error}")
+
+            row = await _store_text(db, pdf, result)
+            search_index.apply_pdf_text(pdf_id, row.bookID, row.text if row.status == "done" else None)
+            return row.status
+
+
+def schedule_pdf_text_extraction(pdf_id: int) -> None:
+    """Fire-and-forget extraction after a PDF was inserted (needs a running loop)."""
+    if not extraction_available():
+        return
+
+    async def _run():
+        try:
+            await extract_and_store(pdf_id)
+        except Exception as e:
+            logger.error(f"PDF text extraction for {pdf_id} failed: {str(e)}", exc_info=True)
+
+    task = asyncio.create_task(_run())
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
+
+
+async def forget_pdf_text(db: AsyncSession, pdf_id: int) -> None:
+    """Drop the stored text of a deleted PDF (commits). Never raises: a leftover row only wastes space."""
+    search_index.apply_pdf_text(pdf_id, None, None)
+    try:
+        await db.execute(delete(PDFTextTable).where(PDFTextTable.pdfID == pdf_id))
+        await db.commit()
+    except Exception as e:
+        logger.warning(f"Could not delete the extracted text of PDF {pdf_id}: {str(e)}")
+        await db.rollback()
+
+
+# ---------- backfill of the existing archive ----------
+
+async def backfill(batch_size: int = 100, retry_failed: bool = False) -> Dict[str, int]:
+    """
+    Extract every PDF that has no PDFTextTable row yet (and, with retry_failed, the
+    failed ones again), PDF_TEXT_WORKERS at a time. Each PDF is committed on its own,
+    so an interrupted run simply continues where it stopped when started again.
+    """
+    if not extraction_available():
+        raise RuntimeError("pypdf is not installed")
+
+    totals: Dict[str, int] = {}
+    last_id = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            stmt = (
+                select(PDFTable.id)
+                .outerjoin(PDFTextTable, PDFTextTable.pdfID == PDFTable.id)
+                .where(PDFTable.id > last_id, PDFTable.pdf.isnot(None))
+                .order_by(PDFTable.id)
+                .limit(batch_size)
+            )
+            if retry_failed:
+                stmt = stmt.where((PDFTextTable.pdfID.is_(None)) | (PDFTextTable.status == "failed"))
+            else:
+                stmt = stmt.where(PDFTextTable.pdfID.is_(None))
+            pdf_ids = (await db.execute(stmt)).scalars().all()
+        if not pdf_ids:
+            break
+
+        statuses = await asyncio.gather(*(extract_and_store(pdf_id) for pdf_id in pdf_ids), return_exceptions=True)
+        for pdf_id, status in zip(pdf_ids, statuses):
+            if isinstance(status, Exception):
+                logger.error(f"PDF {pdf_id}: {str(status)}")
+                status = "error"
+            totals[status or "missing"] = totals.get(status or "missing", 0) + 1
+        last_id = pdf_ids[-1]
+        print(f"Processed up to PDF id {last_id}: {totals}")
+
+    return totals
+
+
+if __name__ == "__main__":
+    # python -m app.services.pdf_text [--batch-size 100] [--workers 4] [--retry-failed]
+    parser = argparse.ArgumentParser(description="Extract text from stored PDFs that have none yet")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=settings.PDF_TEXT_WORKERS)
+    parser.add_argument("--retry-failed", action="store_true")
+    args = parser.parse_args()
+
+    settings.PDF_TEXT_WORKERS = args.workers
+    print(f"Backfill done: {asyncio.run(backfill(args.batch_size, args.retry_failed))}")
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.database import AsyncSessionLocal
+from app.helper.metrics import cache_hit
+from app.models.architecture.committees import Committee
+from app.models.architecture.department import Department
+from app.models.bookFollowUpTable import BookJunctionBridge, CommitteeDepartmentsJunction
+
+logger = logging.getLogger(__name__)
+
+
+class JunctionRef(NamedTuple):
+    """Committee/department names behind a junctionID (None when the row is missing)."""
+    coID: Optional[int]
+    Com: Optional[str]
+    deID: Optional[int]
+    departmentName: Optional[str]
+
+
+EMPTY_JUNCTION = JunctionRef(None, None, None, None)
+
+
+class ReferenceCache:
+    """
+    Process-local copy of the small reference tables: committees, departments and
+    committee_departments_junction. Loaded at startup (lifespan) so book queries can
+    select only bookFollowUpTable columns and resolve names in memory.
+
+    Junction ids that are not in the cache yet (e.g. created by another worker) are
+    fetched from the database on demand, so a stale cache never returns wrong data.
+    """
+
+    def __init__(self):
+        self.committees: Dict[int, Optional[str]] = {}
+        self.departments: Dict[int, Tuple[Optional[int], Optional[str]]] = {}  # deID -> (coID, departmentName)
+        self.junctions: Dict[int, Tuple[int, int]] = {}  # junctionID -> (coID, deID)
+        self.loaded = False
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def load(self, db: AsyncSession) -> Dict[str, int]:
+        """(Re)load all three tables and swap them in at once."""
+        committee_rows = (await db.execute(select(Committee.coID, Committee.Com))).fetchall()
+        department_rows = (await db.execute(
+            select(Department.deID, Department.coID, Department.departmentName)
+        )).fetchall()
+        junction_rows = (await db.execute(
+            select(CommitteeDepartmentsJunction.id, CommitteeDepartmentsJunction.coID, CommitteeDepartmentsJunction.deID)
+        )).fetchall()
+
+        self.committees = {row.coID: row.Com for row in committee_rows}
+        self.departments = {row.deID: (row.coID, row.departmentName) for row in department_rows}
+        self.junctions = {row.id: (row.coID, row.deID) for row in junction_rows}
+        self.loaded = True
+
+        stats = {
+            "committees": len(self.committees),
+            "departments": len(self.departments),
+            "junctions": len(self.junctions),
+        }
+        logger.info(f"Reference cache loaded: {stats}")
+        return stats
+
+    async def ensure_loaded(self, db: AsyncSession) -> None:
+        if not self.loaded:
+            await self.load(db)
+
+    def refresh_in_background(self) -> None:
+        """Reload with a fresh session without blocking the caller."""
+        if self._refresh_task and not self._refresh_task.done():
+            return
+
+        async def _refresh():
+            try:
+                async with AsyncSessionLocal() as session:
+                    await self.load(session)
+            except Exception as e:
+                logger.error(f"Reference cache refresh failed: {str(e)}")
+
+        self._refresh_task = asyncio.create_task(_refresh())
+
+    def add_junction(self, junction_id: int, coID: int, deID: int) -> None:
+        """Called after commit for junctions created by get_or_create_junction(s)."""
+        self.junctions[junction_id] = (coID, deID)
+        if coID not in self.committees or deID not in self.departments:
+            # New committee/department rows we have never seen: reload everything
+            self.refresh_in_background()
+
+    def _ref(self, junction_id: Optional[int]) -> Optional[JunctionRef]:
+        pair = self.junctions.get(junction_id) if junction_id is not None else None
+        if pair is None:
+            return None
+        coID, deID = pair
+        department = self.departments.get(deID)
+        return JunctionRef(
+            coID if coID in self.committees else None,
+            self.committees.get(coID),
+            deID if department is not None else None,
+            department[1] if department is not None else None,
+        )
+
+    async def resolve_junctions(self, db: AsyncSession, junction_ids: Iterable[Optional[int]]) -> Dict[int, JunctionRef]:
+        """
+        Map junction ids to JunctionRef, loading unknown ids from the database.
+        Unknown ids that do not exist at all map to EMPTY_JUNCTION (like the outer joins did).
+        """
+        wanted = {jid for jid in junction_ids if jid is not None}
+        missing = [jid for jid in wanted if jid not in self.junctions]
+        cache_hit("reference_junctions", not missing)
+        if missing:
+            rows = (await db.execute(
+                select(CommitteeDepartmentsJunction.id, CommitteeDepartmentsJunction.coID, CommitteeDepartmentsJunction.deID)
+                .where(CommitteeDepartmentsJunction.id.in_(missing))
+            )).fetchall()
+            for row in rows:
+                self.junctions[row.id] = (row.coID, row.deID)
+            if any(row.coID not in self.committees or row.deID not in self.departments for row in rows):
+                # A committee/department we have not seen yet: reload synchronously once
+                await self.load(db)
+
+        return {jid: self._ref(jid) or EMPTY_JUNCTION for jid in wanted}
+
+    async def departments_for_books(self, db: AsyncSession, book_ids: List[int]) -> Dict[int, List[dict]]:
+        """
+        All departments of each book through book_junction_bridge, ordered by departmentName.
+        Only the bridge table is queried; names come from the cache. Bridges whose
+        committee or department row is missing are skipped (same as the inner joins).
+        """
+        if not book_ids:
+            return {}
+
+        bridge_rows = (await db.execute(
+            select(BookJunctionBridge.bookID, BookJunctionBridge.junctionID)
+            .where(BookJunctionBridge.bookID.in_(book_ids))
+        )).fetchall()
+        refs = await self.resolve_junctions(db, (row.junctionID for row in bridge_rows))
+
+        dept_map: Dict[int, List[dict]] = {}
+        for row in bridge_rows:
+            ref = refs.get(row.junctionID, EMPTY_JUNCTION)
+            if ref.coID is None or ref.deID is None:
+                continue
+            dept_map.setdefault(row.bookID, []).append({
+                "deID": ref.deID,
+                "departmentName": ref.departmentName,
+                "coID": ref.coID,
+                "Com": ref.Com
+            })
+        for departments in dept_map.values():
+            departments.sort(key=lambda dept: dept["departmentName"] or "")
+        return dept_map
+
+    def list_committees(self) -> List[Tuple[int, Optional[str]]]:
+        return sorted(self.committees.items())
+
+    def departments_of_committee(self, coID: int) -> List[Tuple[int, Optional[str]]]:
+        return sorted(
+            (deID, name) for deID, (dept_coID, name) in self.departments.items() if dept_coID == coID
+        )
+
+
+reference_cache = ReferenceCache()
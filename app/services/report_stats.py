@@ -0,0 +1,62 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class ReportStatsCounter:
+    """
+    Department / committee breakdown of /report-with-stats, fed one book at a time
+    so the JSON response and the streamed formats compute it the same way.
+    A book with 2 departments counts once for each; committees count books.
+    """
+
+    def __init__(self):
+        self.department_counts: Dict[Tuple[Any, Any, Any], int] = {}
+        self.committee_counts: Dict[str, int] = {}
+        self.books = 0  # add_book calls
+
+    def add_book(self, departments: List[dict]) -> None:
+        self.books += 1
+        for dept in departments:
+            dept_key = (dept['deID'], dept['departmentName'], dept['Com'])
+            self.department_counts[dept_key] = self.department_counts.get(dept_key, 0) + 1
+
+        if departments:
+            com_name = departments[0]['Com']  # All departments have same committee
+            if com_name:
+                self.committee_counts[com_name] = self.committee_counts.get(com_name, 0) + 1
+
+    def statistics(
+        self,
+        total_records: int,
+        bookType: Optional[str],
+        bookStatus: Optional[str],
+        check: Optional[bool],
+        startDate: Optional[str],
+        endDate: Optional[str],
+    ) -> Dict[str, Any]:
+        department_stats = [
+            {
+                "deID": str(dept_key[0]) if dept_key[0] else "unknown",
+                "departmentName": dept_key[1] or "غير محدد",
+                "Com": dept_key[2] or "غير محدد",
+                "count": count
+            }
+            for dept_key, count in sorted(self.department_counts.items(), key=lambda x: x[1], reverse=True)
+        ]
+        committee_breakdown = [
+            {"committeeName": com_name, "count": count}
+            for com_name, count in sorted(self.committee_counts.items(), key=lambda x: x[1], reverse=True)
+        ]
+        return {
+            "totalRecords": total_records,
+            "totalDepartments": len(department_stats),
+            "totalCommittees": len(committee_breakdown),
+            "departmentBreakdown": department_stats,
+            "committeeBreakdown": committee_breakdown,
+            "filters": {
+                "bookType": bookType,
+                "bookStatus": bookStatus,
+                "dateRangeEnabled": check,
+                "startDate": startDate if check else None,
+                "endDate": endDate if check else None
+            }
+        }
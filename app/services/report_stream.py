@@ -0,0 +1,150 @@
+import csv
+import io
+import json
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence
+
+from fastapi.responses import StreamingResponse
+
+from app.database.config import settings
+from app.database.database import AsyncSessionLocal
+from app.services.bookFollowUp import BookFollowUpService
+from app.services.reference_cache import EMPTY_JUNCTION, reference_cache
+from app.services.report_stats import ReportStatsCounter
+
+logger = logging.getLogger(__name__)
+
+
+# format= values of the report endpoints; json keeps the existing response model
+REPORT_FORMAT_PATTERN = "^(json|ndjson|csv)$"
+
+REPORT_CSV_COLUMNS = [
+    "serialNo", "id", "bookType", "bookNo", "bookDate", "directoryName", "incomingNo", "incomingDate",
+    "subject", "destination", "bookAction", "bookStatus", "notes", "currentDate", "userID", "username",
+    "coID", "Com", "deID", "departmentName", "department_names", "department_count",
+]
+DEPARTMENT_REPORT_CSV_COLUMNS = [
+    "serialNo", "id", "bookType", "bookNo", "bookDate", "directoryName", "incomingNo", "incomingDate",
+    "subject", "destination", "bookAction", "bookStatus", "notes", "currentDate", "userID", "username",
+    "deID", "Com", "departmentName",
+]
+
+# Excel exports: (record key, Arabic header), right to left
+REPORT_XLSX_COLUMNS = [
+    ("serialNo", "ت"),
+    ("bookNo", "رقم الكتاب"),
+    ("bookDate", "تاريخ الكتاب"),
+    ("bookType", "نوع الكتاب"),
+    ("directoryName", "اسم الدائرة"),
+    ("incomingNo", "رقم الوارد"),
+    ("incomingDate", "تاريخ الوارد"),
+    ("subject", "الموضوع"),
+    ("destination", "الجهة"),
+    ("bookAction", "الإجراء"),
+    ("bookStatus", "حالة الكتاب"),
+    ("notes", "الملاحظات"),
+    ("Com", "اللجنة"),
+    ("department_names", "الأقسام"),
+    ("username", "المستخدم"),
+    ("currentDate", "تاريخ الإدخال"),
+]
+DEPARTMENT_REPORT_XLSX_COLUMNS = [
+    (key, title) if key != "department_names" else ("departmentName", "القسم")
+    for key, title in REPORT_XLSX_COLUMNS
+]
+
+
+# Rows come from a server-side cursor (stream + yield_per) in batches of
+# REPORT_STREAM_BATCH_SIZE; departments are resolved per batch, so memory does not
+# grow with the report size. The generators open their own session because the
+# request's session is closed before a StreamingResponse body runs.
+
+async def report_batches(filters: list, stats: Optional[ReportStatsCounter] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+    """/report records (same shape as the JSON response, without "len"), batch by batch."""
+    async with AsyncSessionLocal() as db:
+        stmt = BookFollowUpService.report_stmt(filters).execution_options(yield_per=settings.REPORT_STREAM_BATCH_SIZE)
+        result = await db.stream(stmt)
+        serial_no = 0
+        async for rows in result.partitions():
+            primary_map = await reference_cache.resolve_junctions(db, [row.junctionID for row in rows])
+            dept_map = await reference_cache.departments_for_books(db, [row.id for row in rows])
+            records = []
+            for row in rows:
+                serial_no += 1
+                departments = dept_map.get(row.id, [])
+                if stats is not None:
+                    stats.add_book(departments)
+                records.append(BookFollowUpService.report_record(
+                    row, serial_no, primary_map.get(row.junctionID, EMPTY_JUNCTION), departments
+                ))
+            yield records
+
+
+async def department_report_batches(filters: list) -> AsyncIterator[List[Dict[str, Any]]]:
+    """/report-with-stats-department records, batch by batch."""
+    async with AsyncSessionLocal() as db:
+        stmt = BookFollowUpService.department_report_stmt(filters).execution_options(
+            yield_per=settings.REPORT_STREAM_BATCH_SIZE
+        )
+        result = await db.stream(stmt)
+        serial_no = 0
+        async for rows in result.partitions():
+            records = []
+            for row in rows:
+                serial_no += 1
+                records.append(BookFollowUpService.department_report_record(row, serial_no))
+            yield records
+
+
+def _json_line(value: Any) -> bytes:
+    return (json.dumps(value, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+
+async def ndjson_lines(
+    batches: AsyncIterator[List[Dict[str, Any]]],
+    trailer: Optional[Callable[[], Dict[str, Any]]] = None,
+) -> AsyncIterator[bytes]:
+    """One JSON object per line; trailer() (e.g. statistics) becomes the last line."""
+    async for records in batches:
+        yield b"".join(_json_line(record) for record in records)
+    if trailer is not None:
+        yield _json_line(trailer())
+
+
+async def csv_lines(batches: AsyncIterator[List[Dict[str, Any]]], columns: Sequence[str]) -> AsyncIterator[bytes]:
+    """CSV with a header row; UTF-8 with BOM so Excel shows Arabic text correctly."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    yield ("﻿" + buffer.getvalue()).encode("utf-8")
+    async for records in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(records)
+        yield buffer.getvalue().encode("utf-8")
+
+
+async def _logged(lines: AsyncIterator[bytes], name: str) -> AsyncIterator[bytes]:
+    # Headers are already sent once streaming starts: all we can do is log and cut the body short
+    try:
+        async for chunk in lines:
+            yield chunk
+    except Exception as e:
+        logger.error(f"Error while streaming {name}: {str(e)}", exc_info=True)
+        raise
+
+
+def report_stream_response(
+    format: str,
+    batches: AsyncIterator[List[Dict[str, Any]]],
+    columns: Sequence[str],
+    name: str,
+    trailer: Optional[Callable[[], Dict[str, Any]]] = None,
+) -> StreamingResponse:
+    if format == "csv":
+        return StreamingResponse(
+            _logged(csv_lines(batches, columns), name),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": f'attachment; filename="{name}.csv"'},
+        )
+    return StreamingResponse(_logged(ndjson_lines(batches, trailer), name), media_type="application/x-ndjson")
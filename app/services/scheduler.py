@@ -0,0 +1,52 @@
+import logging
+from datetime import datetime
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from app.database.config import settings
+from app.database.database import AsyncSessionLocal
+from app.services.book_counters import reconcile
+from app.services.dashboard_summary import dashboard_summary
+from app.services.late_books_snapshot import late_books_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+# Periodic background jobs of this worker process, started and stopped in the
+# FastAPI lifespan. Jobs run on the event loop (AsyncIOScheduler) and must not block it.
+
+async def reconcile_book_counters() -> None:
+    # Every worker has this job; one of them runs it per interval (see reconcile)
+    min_interval_sec = settings.BOOK_COUNTERS_RECONCILE_HOURS * 3600 // 2
+    try:
+        async with AsyncSessionLocal() as session:
+            report = await reconcile(session, min_interval_sec=min_interval_sec)
+        if report["skipped"]:
+            logger.debug(f"book_counters reconciliation skipped: {report['skipped']}")
+        elif report["driftCount"]:
+            dashboard_summary.invalidate()
+    except Exception as e:
+        logger.error(f"Scheduled book_counters reconciliation failed: {str(e)}")
+
+
+def create_scheduler() -> AsyncIOScheduler:
+    scheduler = AsyncIOScheduler()
+    scheduler.add_job(
+        late_books_snapshot.refresh,
+        "interval",
+        seconds=settings.LATE_BOOKS_REFRESH_SEC,
+        id="late_books_snapshot",
+        next_run_time=datetime.now(),  # load right away, then every interval
+        max_instances=1,
+        coalesce=True,
+    )
+    if settings.BOOK_COUNTERS_ENABLED and settings.BOOK_COUNTERS_RECONCILE_HOURS:
+        scheduler.add_job(
+            reconcile_book_counters,
+            "interval",
+            hours=settings.BOOK_COUNTERS_RECONCILE_HOURS,
+            id="book_counters_reconcile",
+            max_instances=1,
+            coalesce=True,
+        )
+    return scheduler
@@ -0,0 +1,403 @@
+import asyncio
+import heapq
+import logging
+import math
+import re
+import time
+from collections import Counter
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import anyio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.config import settings
+from app.database.database import AsyncSessionLocal
+from app.helper.arabic import normalize_arabic
+from app.models.PDFTable import PDFTextTable
+from app.models.bookFollowUpTable import BookFollowUpTable
+from app.services.book_events import BookEvent, subscribe
+
+logger = logging.getLogger(__name__)
+
+
+# Indexed columns and their BM25F weights: identifiers count most, then the subject,
+# then the sender/recipient, then free text.
+SEARCH_FIELDS: Dict[str, float] = {
+    "bookNo": 4.0,
+    "incomingNo": 4.0,
+    "subject": 3.0,
+    "directoryName": 2.0,
+    "destination": 2.0,
+    "bookAction": 1.0,
+    "notes": 1.0,
+}
+
+# Extracted text of the book's PDFs (PDFTextTable), indexed as one more field
+PDF_TEXT_FIELD = "pdfText"
+FIELD_WEIGHTS: Dict[str, float] = {**SEARCH_FIELDS, PDF_TEXT_FIELD: 0.5}
+
+# BM25 parameters: term frequency saturation and per-field length normalization
+BM25_K1 = 1.2
+BM25_B: Dict[str, float] = {"bookNo": 0.0, "incomingNo": 0.0}  # other fields: 0.75
+DEFAULT_B = 0.75
+
+_WORD = re.compile(r"\w+")
+# Attached article / conjunction + article ("ال", "وال", "بال", "كال", "فال", "لل")
+_ARTICLE = re.compile(r"^(?:[وفبك]?ال|لل)(?=..)")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Normalized (see normalize_arabic), case-folded words with the definite article removed."""
+    if not text:
+        return []
+    return [_ARTICLE.sub("", word) for word in _WORD.findall(normalize_arabic(text).casefold())]
+
+
+class SearchDoc(NamedTuple):
+    """What the index keeps per book: field lengths for BM25 and the filterable columns."""
+    lengths: Dict[str, int]
+    terms: Tuple[str, ...]          # distinct terms, to remove the postings again
+    bookType: Optional[str]
+    bookStatus: Optional[str]
+    currentDate: Optional[date]
+
+
+class PdfTextDoc(NamedTuple):
+    """One PDF's contribution to its book's pdfText field."""
+    book_id: int
+    term_counts: Tuple[Tuple[str, int], ...]
+    length: int
+
+
+class SearchIndex:
+    """
+    In-memory inverted index over SEARCH_FIELDS of bookFollowUpTable, plus the
+    extracted text of each book's PDFs, with BM25F ranking. Built at startup (in
+    the background), kept current from committed book events and PDF text
+    extraction of this worker, and rebuilt from the database on demand or once it
+    is older than SEARCH_INDEX_MAX_AGE_SEC. Only ids and scores come out of it;
+    rows are read from the database for the page being served.
+    """
+
+    def __init__(self):
+        self.docs: Dict[int, SearchDoc] = {}
+        # field -> term -> {book id: tf}: one int -> int entry per (field, term, book)
+        self.postings: Dict[str, Dict[str, Dict[int, int]]] = {field: {} for field in FIELD_WEIGHTS}
+        self.total_lengths: Counter = Counter()                    # field -> sum of lengths
+        self.pdf_docs: Dict[int, PdfTextDoc] = {}                  # pdf id -> its pdfText postings
+        self.pdf_lengths: Counter = Counter()                      # book id -> pdfText length
+        self.loaded = False
+        self.loaded_at = 0.0
+        self._buffer: Optional[List[Callable[[], None]]] = None  # changes to replay after a rebuild
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    # ---------- maintenance ----------
+
+    def add(self, book_id: int, values: Dict[str, Any]) -> None:
+        self.remove(book_id)
+        lengths = {}
+        terms = set()
+        for field in SEARCH_FIELDS:
+            tokens = tokenize(values.get(field))
+            if not tokens:
+                continue
+            lengths[field] = len(tokens)
+            self.total_lengths[field] += len(tokens)
+            field_postings = self.postings[field]
+            for term, tf in Counter(tokens).items():
+                field_postings.setdefault(term, {})[book_id] = tf
+                terms.add(term)
+
+        book_status = values.get("bookStatus")
+        self.docs[book_id] = SearchDoc(
+            lengths,
+            tuple(terms),
+            values.get("bookType"),
+            book_status.strip().lower() if book_status else None,
+            values.get("currentDate"),
+        )
+
+    def remove(self, book_id: int) -> None:
+        """Drop the book's own fields (its PDF text stays until remove_pdf_text)."""
+        doc = self.docs.pop(book_id, None)
+        if doc is None:
+            return
+        for field, length in doc.lengths.items():
+            self.total_lengths[field] -= length
+            for term in doc.terms:
+                self._drop_posting(field, term, book_id)
+
+    def _drop_posting(self, field: str, term: str, book_id: int) -> None:
+        postings = self.postings[field].get(term)
+        if postings is None:
+            return
+        postings.pop(book_id, None)
+        if not postings:
+            del self.postings[field][term]
+
+    @staticmethod
+    def pdf_text_doc(book_id: Optional[int], text: Optional[str]) -> Optional[PdfTextDoc]:
+        tokens = tokenize(text)
+        if book_id is None or not tokens:
+            return None
+        return PdfTextDoc(book_id, tuple(Counter(tokens).items()), len(tokens))
+
+    def add_pdf_text(self, pdf_id: int, book_id: Optional[int], text: Optional[str]) -> None:
+        self.add_pdf_doc(pdf_id, self.pdf_text_doc(book_id, text))
+
+    def add_pdf_doc(self, pdf_id: int, pdf_doc: Optional[PdfTextDoc]) -> None:
+        self.remove_pdf_text(pdf_id)
+        if pdf_doc is None:
+            return
+        book_id = pdf_doc.book_id
+        pdf_postings = self.postings[PDF_TEXT_FIELD]
+        for term, tf in pdf_doc.term_counts:
+            postings = pdf_postings.setdefault(term, {})
+            postings[book_id] = postings.get(book_id, 0) + tf
+        self.pdf_docs[pdf_id] = pdf_doc
+        self.pdf_lengths[book_id] += pdf_doc.length
+        self.total_lengths[PDF_TEXT_FIELD] += pdf_doc.length
+
+    def remove_pdf_text(self, pdf_id: int) -> None:
+        pdf_doc = self.pdf_docs.pop(pdf_id, None)
+        if pdf_doc is None:
+            return
+        book_id = pdf_doc.book_id
+        pdf_postings = self.postings[PDF_TEXT_FIELD]
+        for term, tf in pdf_doc.term_counts:
+            remaining = pdf_postings.get(term, {}).get(book_id, 0) - tf
+            if remaining > 0:
+                pdf_postings[term][book_id] = remaining
+            else:
+                self._drop_posting(PDF_TEXT_FIELD, term, book_id)
+        self.pdf_lengths[book_id] -= pdf_doc.length
+        if self.pdf_lengths[book_id] <= 0:
+            del self.pdf_lengths[book_id]
+        self.total_lengths[PDF_TEXT_FIELD] -= pdf_doc.length
+
+    def _pdf_ids_of_book(self, book_id: int) -> List[int]:
+        return [pdf_id for pdf_id, pdf_doc in self.pdf_docs.items() if pdf_doc.book_id == book_id]
+
+    def _apply(self, events: Iterable[BookEvent]) -> None:
+        for book_event in events:
+            if book_event.book_id is None:
+                continue
+            if book_event.kind == "delete":
+                self.remove(book_event.book_id)
+                for pdf_id in self._pdf_ids_of_book(book_event.book_id):
+                    self.remove_pdf_text(pdf_id)
+            else:
+                self.add(book_event.book_id, book_event.new)
+
+    def _change(self, apply: Callable[[], None]) -> None:
+        if self._buffer is not None:
+            self._buffer.append(apply)
+        if self.loaded:
+            apply()
+
+    def apply_events(self, events: List[BookEvent]) -> None:
+        self._change(lambda: self._apply(events))
+
+    def apply_pdf_text(self, pdf_id: int, book_id: Optional[int], text: Optional[str]) -> None:
+        """Index (or, with text=None, drop) the extracted text of one PDF."""
+        if text is None:
+            self._change(lambda: self.remove_pdf_text(pdf_id))
+        else:
+            self._change(lambda: self.add_pdf_text(pdf_id, book_id, text))
+
+    @staticmethod
+    def _build(rows: List[Any], pdf_docs: Dict[int, Optional[PdfTextDoc]]) -> "SearchIndex":
+        index = SearchIndex()
+        for row in rows:
+            index.add(row.id, row._mapping)
+        for pdf_id, pdf_doc in pdf_docs.items():
+            index.add_pdf_doc(pdf_id, pdf_doc)
+        return index
+
+    @staticmethod
+    def _pdf_text_docs(text_rows: List[Any]) -> Dict[int, Optional[PdfTextDoc]]:
+        return {row.pdfID: SearchIndex.pdf_text_doc(row.bookID, row.text) for row in text_rows}
+
+    async def _load_pdf_docs(self, db: AsyncSession) -> Dict[int, Optional[PdfTextDoc]]:
+        """
+        Term counts of every extracted PDF. Texts already in this index are reused;
+        only the others (first load, or extracted by another worker) are read, in
+        batches of PDF_TEXT_LOAD_BATCH and tokenized off the event loop.
+        """
+        known = dict(self.pdf_docs)
+        listed = (await db.execute(
+            select(PDFTextTable.pdfID, PDFTextTable.bookID).where(PDFTextTable.status == "done")
+        )).fetchall()
+        pdf_docs: Dict[int, Optional[PdfTextDoc]] = {}
+        missing = []
+        for row in listed:
+            pdf_doc = known.get(row.pdfID)
+            if pdf_doc is not None and pdf_doc.book_id == row.bookID:
+                pdf_docs[row.pdfID] = pdf_doc
+            else:
+                missing.append(row.pdfID)
+
+        batch_size = settings.PDF_TEXT_LOAD_BATCH
+        for start in range(0, len(missing), batch_size):
+            text_rows = (await db.execute(
+                select(PDFTextTable.pdfID, PDFTextTable.bookID, PDFTextTable.text)
+                .where(PDFTextTable.pdfID.in_(missing[start:start + batch_size]))
+            )).fetchall()
+            pdf_docs.update(await anyio.to_thread.run_sync(SearchIndex._pdf_text_docs, text_rows))
+        return pdf_docs
+
+    async def load(self, db: AsyncSession) -> Dict[str, int]:
+        """Rebuild from the database and swap the new index in."""
+        self._buffer = []  # changes committed while we read/build are replayed on the new index
+        try:
+            columns = [getattr(BookFollowUpTable, field) for field in SEARCH_FIELDS]
+            rows = (await db.execute(
+                select(
+                    BookFollowUpTable.id,
+                    BookFollowUpTable.bookType,
+                    BookFollowUpTable.bookStatus,
+                    BookFollowUpTable.currentDate,
+                    *columns,
+                )
+            )).fetchall()
+            try:
+                pdf_docs = await self._load_pdf_docs(db)
+            except Exception as e:
+                # e.g. PDFTextTable not created yet: index the books without PDF text
+                logger.warning(f"Search index: PDF text not loaded: {str(e)}")
+                await db.rollback()
+                pdf_docs = {}
+            # Tokenizing every book takes a while; keep the event loop free meanwhile
+            built = await anyio.to_thread.run_sync(SearchIndex._build, rows, pdf_docs)
+            buffered = self._buffer
+        finally:
+            self._buffer = None
+
+        self.docs, self.postings, self.total_lengths = built.docs, built.postings, built.total_lengths
+        self.pdf_docs, self.pdf_lengths = built.pdf_docs, built.pdf_lengths
+        for apply in buffered:
+            apply()
+        self.loaded = True
+        self.loaded_at = time.monotonic()
+
+        terms = set().union(*self.postings.values())
+        stats = {"books": len(self.docs), "pdfTexts": len(self.pdf_docs), "terms": len(terms)}
+        logger.info(f"Search index loaded: {stats}")
+        return stats
+
+    def refresh_in_background(self) -> None:
+        if self._refresh_task and not self._refresh_task.done():
+            return
+
+        async def _refresh():
+            try:
+                async with AsyncSessionLocal() as session:
+                    await self.load(session)
+            except Exception as e:
+                logger.error(f"Search index refresh failed: {str(e)}")
+
+        self._refresh_task = asyncio.create_task(_refresh())
+
+    def ready(self) -> bool:
+        """True if the index can answer; schedules a (re)build when missing or stale."""
+        if not self.loaded:
+            self.refresh_in_background()
+            return False
+        max_age = settings.SEARCH_INDEX_MAX_AGE_SEC
+        if max_age and time.monotonic() - self.loaded_at > max_age:
+            self.refresh_in_background()
+        return True
+
+    # ---------- querying ----------
+
+    def _matches_filters(
+        self,
+        doc: SearchDoc,
+        bookType: Optional[str],
+        bookStatus: Optional[str],
+        start_date: Optional[date],
+        end_date: Optional[date],
+    ) -> bool:
+        if bookType and doc.bookType != bookType:
+            return False
+        if bookStatus and doc.bookStatus != bookStatus:
+            return False
+        if start_date or end_date:
+            if doc.currentDate is None:
+                return False
+            if start_date and doc.currentDate < start_date:
+                return False
+            if end_date and doc.currentDate > end_date:
+                return False
+        return True
+
+    def search(
+        self,
+        query: str,
+        offset: int = 0,
+        limit: int = 10,
+        bookType: Optional[str] = None,
+        bookStatus: Optional[str] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+    ) -> Tuple[List[Tuple[int, float]], int]:
+        """
+        BM25F over the query terms; like the database fallback, a book must match
+        every term (each one in any field):
+            score = sum over terms of idf(t) * tf' / (k1 + tf')
+            tf'   = sum over fields of weight_f * tf_f / (1 - b_f + b_f * len_f / avglen_f)
+        Returns ([(book id, score)] for the requested page, total number of matches).
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        doc_count = len(self.docs)
+        if not terms or not doc_count:
+            return [], 0
+
+        # Books containing each term (in any field); the rarest term narrows the candidates first
+        term_fields = []
+        for term in terms:
+            fields = [(field, postings[term]) for field, postings in self.postings.items() if term in postings]
+            if not fields:
+                return [], 0
+            books = set().union(*(postings for _, postings in fields))
+            term_fields.append((len(books), books, fields))
+        term_fields.sort(key=lambda item: item[0])
+        candidates = {book_id for book_id in term_fields[0][1] if book_id in self.docs}  # PDF text may belong to unindexed books
+        for _, books, _ in term_fields[1:]:
+            candidates &= books
+            if not candidates:
+                return [], 0
+
+        avg_lengths = {field: (self.total_lengths[field] / doc_count) or 1.0 for field in FIELD_WEIGHTS}
+        scores: Dict[int, float] = dict.fromkeys(candidates, 0.0)
+        for df, _, fields in term_fields:
+            idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            weighted_tfs: Dict[int, float] = dict.fromkeys(candidates, 0.0)
+            for field, postings in fields:
+                b = BM25_B.get(field, DEFAULT_B)
+                weight = FIELD_WEIGHTS[field]
+                avg_length = avg_lengths[field]
+                for book_id in candidates:
+                    tf = postings.get(book_id)
+                    if tf is None:
+                        continue
+                    length = self.pdf_lengths[book_id] if field == PDF_TEXT_FIELD else self.docs[book_id].lengths[field]
+                    weighted_tfs[book_id] += weight * tf / (1 - b + b * length / avg_length)
+            for book_id, weighted_tf in weighted_tfs.items():
+                scores[book_id] += idf * weighted_tf / (BM25_K1 + weighted_tf)
+
+        if bookType or bookStatus or start_date or end_date:
+            scores = {
+                book_id: score for book_id, score in scores.items()
+                if self._matches_filters(self.docs[book_id], bookType, bookStatus, start_date, end_date)
+            }
+
+        # Ties: newest book first
+        top = heapq.nsmallest(offset + limit, scores.items(), key=lambda item: (-item[1], -item[0]))
+        return top[offset:], len(scores)
+
+
+search_index = SearchIndex()
+subscribe(search_index.apply_events)
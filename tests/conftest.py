@@ -0,0 +1,21 @@
+import os
+import tempfile
+
+# Settings requires these; the tests never connect to the database.
+_TEST_ROOT = os.path.join(tempfile.gettempdir(), "bookfollowup-test")
+
+for name, value in {
+    "DATABASE_SERVER": "localhost",
+    "DATABASE_NAME": "test",
+    "DATABASE_USER": "test",
+    "DATABASE_PASSWORD": "test",
+    "PDF_UPLOAD_PATH": os.path.join(_TEST_ROOT, "upload"),
+    "PDF_SOURCE_PATH": os.path.join(_TEST_ROOT, "source"),
+    "MODE": "TEST",
+    "JWT_SECRET": "test-secret",
+}.items():
+    os.environ.setdefault(name, value)
+
+# Settings.validate_paths requires existing directories
+for name in ("PDF_UPLOAD_PATH", "PDF_SOURCE_PATH"):
+    os.makedirs(os.environ[name], exist_ok=True)
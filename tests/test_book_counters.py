@@ -0,0 +1,70 @@
+from app.services.book_counters import CounterState, counter_deltas, counter_keys, department_key
+
+BEFORE = CounterState("External", "Open", "7", True, frozenset({(1, 10), (1, 11)}))
+
+
+def test_no_state_has_no_keys():
+    assert counter_keys(None) == []
+
+
+def test_insert_counts_every_dimension():
+    deltas = counter_deltas(None, BEFORE)
+    assert deltas == {
+        ("total", ""): 1,
+        ("bookType", "External"): 1,
+        ("bookStatus", "Open"): 1,
+        ("userID", "7"): 1,
+        ("committee", "1"): 1,
+        ("department", department_key(1, 10)): 1,
+        ("department", department_key(1, 11)): 1,
+        ("pendingTotal", ""): 1,
+        ("pendingDepartment", department_key(1, 10)): 1,
+        ("pendingDepartment", department_key(1, 11)): 1,
+    }
+
+
+def test_unchanged_book_has_no_deltas():
+    assert counter_deltas(BEFORE, BEFORE) == {}
+
+
+def test_type_change_moves_one_book():
+    after = BEFORE._replace(bookType="Internal")
+    assert counter_deltas(BEFORE, after) == {("bookType", "External"): -1, ("bookType", "Internal"): 1}
+
+
+def test_status_change_moves_one_book():
+    after = BEFORE._replace(bookStatus="Closed")
+    assert counter_deltas(BEFORE, after) == {("bookStatus", "Open"): -1, ("bookStatus", "Closed"): 1}
+
+
+def test_department_change_keeps_committee():
+    after = BEFORE._replace(departments=frozenset({(1, 10), (1, 12)}))
+    assert counter_deltas(BEFORE, after) == {
+        ("department", department_key(1, 11)): -1,
+        ("department", department_key(1, 12)): 1,
+        ("pendingDepartment", department_key(1, 11)): -1,
+        ("pendingDepartment", department_key(1, 12)): 1,
+    }
+
+
+def test_department_moves_to_other_committee():
+    after = BEFORE._replace(departments=frozenset({(2, 20)}))
+    deltas = counter_deltas(BEFORE, after)
+    assert deltas[("committee", "1")] == -1
+    assert deltas[("committee", "2")] == 1
+    assert deltas[("department", department_key(2, 20))] == 1
+    assert deltas[("pendingDepartment", department_key(1, 10))] == -1
+    assert ("total", "") not in deltas
+
+
+def test_answered_book_leaves_pending_counters():
+    after = BEFORE._replace(pending=False)
+    assert counter_deltas(BEFORE, after) == {
+        ("pendingTotal", ""): -1,
+        ("pendingDepartment", department_key(1, 10)): -1,
+        ("pendingDepartment", department_key(1, 11)): -1,
+    }
+
+
+def test_delete_removes_every_key():
+    assert counter_deltas(BEFORE, None) == {key: -1 for key in counter_keys(BEFORE)}
@@ -0,0 +1,35 @@
+from app.services.search_index import SearchIndex
+
+
+def _index() -> SearchIndex:
+    index = SearchIndex()
+    index.add(1, {"bookNo": "100", "subject": "طلب صيانة الحاسبات"})
+    index.add(2, {"bookNo": "200", "subject": "صيانة المولدة"})
+    index.add(3, {"bookNo": "300", "subject": "اجتماع اللجنة", "notes": "صيانه دورية للحاسبات"})
+    return index
+
+
+def test_every_term_must_match():
+    hits, total = _index().search("صيانة حاسبات")
+    assert total == 2
+    assert {book_id for book_id, _ in hits} == {1, 3}
+
+
+def test_unknown_term_matches_nothing():
+    assert _index().search("صيانة غير_موجود") == ([], 0)
+
+
+def test_pdf_text_counts_as_a_field():
+    index = _index()
+    index.add_pdf_text(10, 2, "generator invoice")
+    assert [book_id for book_id, _ in index.search("مولدة generator")[0]] == [2]
+    index.remove_pdf_text(10)
+    assert index.search("generator") == ([], 0)
+    assert index.postings["pdfText"] == {}
+
+
+def test_remove_drops_postings():
+    index = _index()
+    index.remove(2)
+    assert "مولده" not in index.postings["subject"]
+    assert index.search("صيانة")[1] == 2